@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks and correctness oracle for ResponseAdapter.
+
+Builds a corpus of synthetic fal.ai response shapes (images, video, audio,
+nested data.result, large transcriptions, multi-image lists plus seeded
+fuzzed shapes), checks ResponseAdapter against an independent reference
+implementation of the extraction priority order, then times the hot paths.
+
+Usage:
+    python bench_adapter.py [--check-only] [--seed N] [--fuzz N]
+                            [--json <out.json>] [--compare <baseline.json>]
+
+Examples:
+    python bench_adapter.py                         # Check oracle, run benchmarks
+    python bench_adapter.py --check-only --fuzz 5000  # Correctness only
+    python bench_adapter.py --json before.json      # Save numbers
+    python bench_adapter.py --compare before.json   # Compare against saved run
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from lib.adapter import ResponseAdapter
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def _cdn(name: str) -> str:
+    return f"https://v3.fal.media/files/bench/{name}"
+
+
+def _transcription(words: int) -> Dict[str, Any]:
+    """Scribe-style transcription payload with per-word timestamps (no URLs)"""
+    items = []
+    t = 0.0
+    for i in range(words):
+        items.append({
+            "text": f"word{i}",
+            "start": round(t, 3),
+            "end": round(t + 0.31, 3),
+            "type": "word",
+            "speaker_id": f"speaker_{i % 3}",
+            "logprob": -0.01 * (i % 7),
+        })
+        t += 0.35
+    return {
+        "text": " ".join(item["text"] for item in items),
+        "language_code": "eng",
+        "language_probability": 0.99,
+        "words": items,
+    }
+
+
+def build_corpus() -> List[Dict[str, Any]]:
+    """Hand-written response shapes seen from fal.ai endpoints"""
+    return [
+        {"name": "image", "endpoint_id": "bench/image",
+         "response": {"images": [{"url": _cdn("a.png"), "width": 1024, "height": 1024,
+                                  "content_type": "image/png"}],
+                      "timings": {"inference": 1.2}, "seed": 42,
+                      "has_nsfw_concepts": [False], "prompt": "a cat"}},
+        {"name": "multi_image", "endpoint_id": "bench/multi-image",
+         "response": {"images": [{"url": _cdn(f"m{i}.png"), "width": 512, "height": 512}
+                                 for i in range(16)],
+                      "seed": 7, "prompt": "grid"}},
+        {"name": "video", "endpoint_id": "bench/video",
+         "response": {"video": {"url": _cdn("v.mp4"), "content_type": "video/mp4",
+                                "file_size": 12345678}, "seed": 1}},
+        {"name": "audio", "endpoint_id": "bench/audio",
+         "response": {"audio": {"url": _cdn("a.wav"), "content_type": "audio/wav"},
+                      "duration": 3.2}},
+        {"name": "inline_image", "endpoint_id": "bench/inline",
+         "response": {"images": [{"url": "data:image/png;base64," + "iVBORw0KGgo" * 2000,
+                                  "content_type": "image/png"}], "seed": 3}},
+        {"name": "nested_data_result", "endpoint_id": "bench/nested",
+         "response": {"data": {"result": {"url": _cdn("r.png")}, "status": "ok"}}},
+        {"name": "late_generic", "endpoint_id": "bench/late-generic",
+         "response": {"metadata": {"request": "x"}, "file": {"url": _cdn("f.bin")}}},
+        {"name": "deep_unknown", "endpoint_id": "bench/deep-unknown",
+         "response": {"meta": {"a": 1, "b": [1, 2, 3]},
+                      "payload": {"items": [{"kind": "thumb"},
+                                            {"asset": {"href": _cdn("deep.png")}}]}}},
+        {"name": "transcription_5k", "endpoint_id": "bench/asr",
+         "response": _transcription(5000)},
+        {"name": "transcription_5k_tail_url", "endpoint_id": "bench/asr-url",
+         "response": dict(_transcription(5000), srt={"href": _cdn("t.srt")})},
+    ]
+
+
+_FUZZ_KEYS = ["images", "image", "video", "audio", "data", "result", "output",
+              "url", "file", "meta", "payload", "items", "asset", "href", "extra"]
+
+
+def _fuzz_value(rng: random.Random, depth: int) -> Any:
+    roll = rng.random()
+    if depth <= 0 or roll < 0.3:
+        choice = rng.random()
+        if choice < 0.15:
+            return _cdn(f"z{rng.randrange(10 ** 6)}.png")
+        if choice < 0.2:
+            return "http:/not-a-url"
+        if choice < 0.25:
+            return "data:image/png;base64,iVBORw0KGgo="
+        if choice < 0.5:
+            return rng.randrange(1000)
+        if choice < 0.6:
+            return None
+        return f"text-{rng.randrange(1000)}"
+    if roll < 0.65:
+        return {rng.choice(_FUZZ_KEYS): _fuzz_value(rng, depth - 1)
+                for _ in range(rng.randint(0, 4))}
+    return [_fuzz_value(rng, depth - 1) for _ in range(rng.randint(0, 4))]
+
+
+def build_fuzz_corpus(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Seeded random response shapes that stress key order and nesting"""
+    rng = random.Random(seed)
+    cases = []
+    for i in range(count):
+        response = _fuzz_value(rng, 5)
+        if not isinstance(response, dict):
+            response = {"output": response}
+        cases.append({"name": f"fuzz_{i}", "endpoint_id": f"fuzz/{i}", "response": response})
+    return cases
+
+
+# ---------------------------------------------------------------------------
+# Oracle
+# ---------------------------------------------------------------------------
+
+def _is_result_url(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(("http://", "https://", "data:"))
+
+
+def oracle_by_path(data: Any, path: str) -> Optional[str]:
+    """Reference dot/bracket path lookup, written independently of the adapter"""
+    current = data
+    for segment in path.split("."):
+        name, _, rest = segment.partition("[")
+        steps: List[Any] = [name] if name else []
+        while rest:
+            index, _, rest = rest.partition("]")
+            steps.append(int(index))
+            rest = rest.lstrip("[")
+        for step in steps:
+            if isinstance(step, int):
+                if not isinstance(current, list) or step >= len(current):
+                    return None
+            elif not isinstance(current, dict) or step not in current:
+                return None
+            current = current[step]
+    return current if _is_result_url(current) else None
+
+
+def oracle_first_url(data: Any) -> Tuple[Optional[str], Optional[str]]:
+    """Reference depth-first scan in dict insertion order and list order"""
+    stack: List[Tuple[str, Any]] = [("", data)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, str):
+            if _is_result_url(value):
+                return path or None, value
+        elif isinstance(value, dict):
+            children = [(f"{path}.{k}" if path else k, v) for k, v in value.items()]
+            stack.extend(reversed(children))
+        elif isinstance(value, list):
+            children = [(f"{path}[{i}]" if path else f"[{i}]", v) for i, v in enumerate(value)]
+            stack.extend(reversed(children))
+    return None, None
+
+
+def oracle_extract(response: Any, learned_path: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Expected (path, url): learned path, then COMMON_PATTERNS in order, then first URL"""
+    if learned_path:
+        url = oracle_by_path(response, learned_path)
+        if url:
+            return learned_path, url
+    for pattern in ResponseAdapter.COMMON_PATTERNS:
+        url = oracle_by_path(response, pattern)
+        if url:
+            return pattern, url
+    return oracle_first_url(response)
+
+
+def check_corpus(cases: List[Dict[str, Any]], workdir: str) -> List[str]:
+    """Compare ResponseAdapter against the oracle, returning failure messages"""
+    failures = []
+    patterns_file = str(Path(workdir) / "check_patterns.yaml")
+
+    for case in cases:
+        name, endpoint_id, response = case["name"], case["endpoint_id"], case["response"]
+        adapter = ResponseAdapter(patterns_file=patterns_file)
+        adapter.patterns = {}
+        expected_path, expected_url = oracle_extract(response)
+
+        found = adapter._find_first_url_with_path(response)
+        if found != oracle_first_url(response):
+            failures.append(f"{name}: _find_first_url_with_path -> {found!r}")
+
+        for pattern in ResponseAdapter.COMMON_PATTERNS:
+            if adapter._extract_by_path(response, pattern) != oracle_by_path(response, pattern):
+                failures.append(f"{name}: _extract_by_path({pattern!r}) disagrees")
+
+        # Repeat past the promotion threshold so the learned path is exercised too
+        for attempt in range(ResponseAdapter.CONFIDENCE_THRESHOLD + 1):
+            url = adapter.extract_result(response, endpoint_id)
+            if url != expected_url:
+                failures.append(f"{name}: extract_result attempt {attempt} -> {url!r}, "
+                                f"expected {expected_url!r}")
+                break
+
+        if expected_url and expected_path:
+            learned = adapter.patterns.get(endpoint_id, {}).get("learned_path")
+            if learned != expected_path:
+                failures.append(f"{name}: learned {learned!r}, expected {expected_path!r}")
+
+    return failures
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def _measure(func: Callable[[], Any], min_time: float, rounds: int) -> Dict[str, float]:
+    """Calibrate an inner loop to ~min_time, then time several rounds (seconds per call)"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def run_benchmarks(cases: List[Dict[str, Any]], workdir: str,
+                   min_time: float, rounds: int) -> Dict[str, Dict[str, float]]:
+    """Time adapter hot paths over the corpus"""
+    results: Dict[str, Dict[str, float]] = {}
+    base = Path(workdir)
+
+    for case in cases:
+        name, endpoint_id, response = case["name"], case["endpoint_id"], case["response"]
+
+        # Cold: no learned pattern, priority scan from the top
+        cold = ResponseAdapter(patterns_file=str(base / f"cold_{name}.yaml"))
+        cold.patterns = {}
+
+        def extract_cold():
+            cold.patterns.pop(endpoint_id, None)
+            cold.extract_result(response, endpoint_id)
+
+        results[f"extract_result[cold,{name}]"] = _measure(extract_cold, min_time, rounds)
+
+        # Warm: learned pattern already promoted
+        warm = ResponseAdapter(patterns_file=str(base / f"warm_{name}.yaml"))
+        for _ in range(ResponseAdapter.CONFIDENCE_THRESHOLD + 1):
+            warm.extract_result(response, endpoint_id)
+        results[f"extract_result[warm,{name}]"] = _measure(
+            lambda: warm.extract_result(response, endpoint_id), min_time, rounds)
+
+        results[f"_find_first_url_with_path[{name}]"] = _measure(
+            lambda: cold._find_first_url_with_path(response), min_time, rounds)
+
+    image = cases[0]["response"]
+    probe = ResponseAdapter(patterns_file=str(base / "probe.yaml"))
+    results["_extract_by_path[hit,images[0].url]"] = _measure(
+        lambda: probe._extract_by_path(image, "images[0].url"), min_time, rounds)
+    results["_extract_by_path[miss,data.result.url]"] = _measure(
+        lambda: probe._extract_by_path(image, "data.result.url"), min_time, rounds)
+    results["_extract_by_path[all COMMON_PATTERNS miss]"] = _measure(
+        lambda: [probe._extract_by_path({}, p) for p in ResponseAdapter.COMMON_PATTERNS],
+        min_time, rounds)
+
+    # Learning/promotion including YAML persistence
+    video = cases[2]["response"]
+    counter = [0]
+
+    def promote():
+        counter[0] += 1
+        learner = ResponseAdapter(patterns_file=str(base / "learn.yaml"))
+        learner.patterns = {}
+        for _ in range(ResponseAdapter.CONFIDENCE_THRESHOLD):
+            learner.extract_result(video, f"bench/learn-{counter[0]}")
+
+    results["learning[promote incl. _save_patterns]"] = _measure(promote, min_time, rounds)
+
+    persisted = ResponseAdapter(patterns_file=str(base / "persist.yaml"))
+    persisted.patterns = {f"bench/model-{i}": {"success_count": 10, "fail_count": 0,
+                                               "learned_path": "images[0].url",
+                                               "confidence": "high"} for i in range(200)}
+    results["_save_patterns[200 endpoints]"] = _measure(persisted._save_patterns, min_time, rounds)
+    results["_load_patterns[200 endpoints]"] = _measure(persisted._load_patterns, min_time, rounds)
+
+    return results
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def print_report(results: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Any]] = None):
+    """Print a table of results, with deltas against a baseline run if given"""
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        line = f"{name:<{width}}  min {_format_time(stats['min'])}  median {_format_time(stats['median'])}"
+        if baseline and name in baseline:
+            before = baseline[name]["median"]
+            if before:
+                line += f"  ({(stats['median'] - before) / before * 100:+.1f}% vs baseline)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ResponseAdapter micro-benchmarks')
+    parser.add_argument('--check-only', action='store_true', help='Only run the correctness oracle')
+    parser.add_argument('--seed', type=int, default=1234, help='Fuzz corpus seed')
+    parser.add_argument('--fuzz', type=int, default=500, help='Number of fuzzed shapes to check')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Target seconds per round')
+    parser.add_argument('--rounds', type=int, default=5, help='Timed rounds per benchmark')
+    parser.add_argument('--json', dest='json_out', help='Write results to JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file from a previous --json run')
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+
+    with tempfile.TemporaryDirectory(prefix="fal-bench-") as workdir:
+        failures = check_corpus(corpus + build_fuzz_corpus(args.fuzz, args.seed), workdir)
+        if failures:
+            for failure in failures[:50]:
+                print(f"✗ {failure}", file=sys.stderr)
+            print(f"✗ Oracle mismatch in {len(failures)} checks", file=sys.stderr)
+            sys.exit(1)
+        print(f"✓ Oracle agrees on {len(corpus) + args.fuzz} response shapes")
+
+        if args.check_only:
+            return
+
+        results = run_benchmarks(corpus, workdir, args.min_time, args.rounds)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    print_report(results, baseline)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
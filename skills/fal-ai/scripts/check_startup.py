@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Enforce the CLI start-up import budget using `python -X importtime`.
+
+Each probe runs in a fresh interpreter. A probe fails if it imports a
+module that must stay deferred (yaml, urllib.request, logging.handlers,
+tempfile, ...) or if its total import time exceeds the budget. Only
+imports made after `site` finishes count: interpreter start-up and the
+environment's .pth hooks are not the CLI's cost.
+
+Usage:
+    python check_startup.py [--budget-ms N] [--repeat N] [--verbose]
+
+Examples:
+    python check_startup.py                 # Check with default budget
+    python check_startup.py --budget-ms 40  # Tighter budget
+    python check_startup.py --verbose       # Show the slowest imports per probe
+"""
+
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# Modules only needed once a command actually runs (parsing YAML, HTTP,
+# writing files or logs); importing any of them at start-up is a regression.
+DEFERRED_MODULES = [
+    "yaml",
+    "urllib.request",
+    "http.client",
+    "ssl",
+    "logging.handlers",
+    "tempfile",
+    "lib.adapter",
+    "lib.discovery",
+    "lib.http_utils",
+    "fal_client",
+]
+
+# (label, argv after the interpreter, modules that must not be imported)
+PROBES: List[Tuple[str, List[str], List[str]]] = [
+    ("fal_api.py --help", ["fal_api.py", "--help"], DEFERRED_MODULES),
+    ("import fal_api", ["-c", "import fal_api"], DEFERRED_MODULES),
+    ("import lib.api_client", ["-c", "import lib.api_client"], DEFERRED_MODULES),
+    ("import lib.discovery", ["-c", "import lib.discovery"],
+     [m for m in DEFERRED_MODULES if m != "lib.discovery"]),
+]
+
+
+def run_probe(argv: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Run one probe and return {module: (self_us, cumulative_us)} for imports after site"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        cwd=SCRIPT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # header row
+        rows.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+
+    # A module's row is printed once it finishes importing, so everything up to
+    # the top-level "site" row was imported during interpreter start-up
+    names = [name for name, _, _ in rows]
+    start = names.index("site") + 1 if "site" in names else 0
+    return {name: (self_us, cumulative_us) for name, self_us, cumulative_us in rows[start:]}
+
+
+def total_import_us(modules: Dict[str, Tuple[int, int]]) -> int:
+    """Sum self time of every imported module (the interpreter-wide import cost)"""
+    return sum(self_us for self_us, _ in modules.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check CLI start-up import budget')
+    parser.add_argument('--budget-ms', type=float, default=60.0,
+        help='Maximum total import time per probe in milliseconds')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='Runs per probe; the fastest is compared to the budget')
+    parser.add_argument('--verbose', action='store_true', help='Show slowest imports')
+    args = parser.parse_args()
+
+    failed = False
+    for label, argv, forbidden in PROBES:
+        runs = [run_probe(argv) for _ in range(max(1, args.repeat))]
+        best = min(runs, key=total_import_us)
+        total_ms = total_import_us(best) / 1000.0
+
+        leaked = [m for m in forbidden if m in best]
+        status = "✓"
+        if leaked or total_ms > args.budget_ms:
+            status = "✗"
+            failed = True
+
+        print(f"{status} {label}: {total_ms:.1f} ms imports (budget {args.budget_ms:.0f} ms)")
+        if leaked:
+            print(f"    deferred modules imported at start-up: {', '.join(leaked)}")
+        if args.verbose:
+            slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:10]
+            for name, (self_us, cumulative_us) in slowest:
+                print(f"    {self_us / 1000:7.2f} ms self  {cumulative_us / 1000:7.2f} ms cum  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,135 @@ fal.ai API CLI wrapper
 Handles model execution and discovery
 """
 
+import os
 import sys
 import json
 import argparse
-from lib.api_client import FalAPIClient
-from lib.discovery import ModelDiscovery
-from lib.adapter import ResponseAdapter
+
+
+def _response_adapter():
+    """Build a ResponseAdapter, importing it (and yaml) only when a result needs extracting"""
+    from lib.adapter import ResponseAdapter
+    return ResponseAdapter()
+
+def _event_stream(args, endpoint_id):
+    """NDJSON progress event stream when --stream is set, else None"""
+    if not getattr(args, 'stream', False):
+        return None
+    from lib.events import NDJSONEventStream
+    return NDJSONEventStream(model=endpoint_id)
+
+def _save_download(args, output):
+    """
+    With --download DIR, save the result file there and add its local path to output.
+    Inline (data URI) results are always decoded to a file (DIR or the current directory)
+    so the base64 payload never ends up in the JSON output.
+    """
+    url = output.get("url")
+    inline = isinstance(url, str) and url.startswith("data:")
+    if not url or not (inline or getattr(args, 'download', None)):
+        return
+    from lib.download import download_to_dir
+
+    saved = download_to_dir(url, getattr(args, 'download', None) or '.')
+    output.update({"path": saved["path"], "size": saved["size"], "sha256": saved["sha256"]})
+    if inline:
+        output["url"] = None
+        output["inline"] = True
+
+def _apply_inline(args, input_data):
+    """--inline asks fal for a sync-mode result returned as a data URI (no CDN fetch)"""
+    if getattr(args, 'inline', False):
+        input_data["sync_mode"] = True
+
+def _validate(args, endpoint_id, input_data, **kwargs):
+    """Reject input that breaks the endpoint's models.yaml params spec before any upload or submit"""
+    if getattr(args, 'no_validate', False):
+        return
+    from lib.tracing import span
+    from lib.validation import validate_input
+    with span("validate", **{"fal.endpoint": endpoint_id}):
+        validate_input(endpoint_id, input_data, **kwargs)
+
+def _resolve_local_files(client, input_data):
+    """Local paths given as --image-url/--audio-url/--video-url: inline small files, upload large ones"""
+    from lib.local_inputs import resolve_local_inputs
+    from lib.tracing import span
+    with span("inputs.resolve"):
+        return resolve_local_inputs(client, input_data)
+
+def _add_job_options(parser, worker=False):
+    parser.add_argument('--no-validate', action='store_true',
+        help='Skip local input checks against models.yaml params')
+    if worker:
+        parser.add_argument('--timeout', type=float, metavar='SECONDS',
+            help='Give up on each job after this many seconds, cancelling it (a job file\'s "timeout" wins)')
+        parser.add_argument('--deadline', metavar='TIME',
+            help='Stop claiming jobs at this time and exit once running jobs finish (ISO 8601 or epoch seconds)')
+    else:
+        parser.add_argument('--timeout', type=float, metavar='SECONDS',
+            help='Give up after this many seconds, cancelling any fal job still queued or running')
+        parser.add_argument('--deadline', metavar='TIME',
+            help='Give up at this time (ISO 8601, e.g. 2025-01-31T18:00:00Z, or epoch seconds)')
+    parser.add_argument('--lane', choices=['interactive', 'bulk'],
+        help='Scheduling lane when FAL_MAX_IN_FLIGHT limits jobs in flight (default: FAL_LANE, then bulk)')
+    parser.add_argument('--tenant',
+        help='Fair-share group for scheduling (default: FAL_TENANT, then default)')
+
+def _parse_deadline(value):
+    """Epoch seconds from an ISO 8601 timestamp (local time if no offset) or a number"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid --deadline: {value} (use ISO 8601 or epoch seconds)")
+
+def _command_deadline(args):
+    """Earliest of --deadline and now + --timeout, or None; applies to the whole command"""
+    import time
+
+    if args.command == 'worker':
+        return None  # The worker applies --timeout per job and --deadline to claiming
+    limits = []
+    if getattr(args, 'timeout', None) is not None:
+        limits.append(time.time() + args.timeout)
+    if getattr(args, 'deadline', None):
+        limits.append(_parse_deadline(args.deadline))
+    return min(limits) if limits else None
+
+def _add_output_options(parser, inline=False):
+    parser.add_argument('--download', metavar='DIR',
+        help='Also save the result file into DIR (parallel, resumable, verified)')
+    if inline:
+        parser.add_argument('--inline', action='store_true',
+            help='Return the result inline (sync mode) and decode it straight to a file; for small outputs')
+
+def _fail(message, stream=None):
+    """Report a handler failure (as an event when streaming) and exit"""
+    if stream:
+        stream.failed(message)
+    else:
+        print(json.dumps({"error": message}), file=sys.stderr)
+    sys.exit(1)
 
 def handle_run(args, client):
     """Handle run command"""
     endpoint_id = args.endpoint_id
     input_data = json.loads(args.input_json)
 
-    result = client.run_model(endpoint_id, input_data)
+    _validate(args, endpoint_id, input_data)
+
+    stream = _event_stream(args, endpoint_id)
+    result = client.run_model(endpoint_id, input_data, on_event=stream.on_status if stream else None)
+
+    if stream:
+        stream.completed(result=result)
+        return
+
     print(json.dumps(result, indent=2))
 
 def handle_generate(args, client):
@@ -28,18 +144,21 @@ def handle_generate(args, client):
         "prompt": args.prompt,
         "image_size": args.size,
         "num_inference_steps": args.steps,
-        "guidance_scale": args.guidance,
-        "num_images": 1
+        "guidance_scale": args.guidance
     }
 
     # Remove None values
     input_data = {k: v for k, v in input_data.items() if v is not None}
 
+    _validate(args, endpoint_id, input_data)
+
+    _apply_inline(args, input_data)
+
     # Execute via API client
     result = client.run_model(endpoint_id, input_data)
 
     # Extract URL with adapter
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     url = adapter.extract_result(result, endpoint_id)
 
     if not url:
@@ -53,22 +172,32 @@ def handle_generate(args, client):
         "prompt": input_data.get("prompt")
     }
 
+    _save_download(args, output)
+
     print(json.dumps(output))
 
 def handle_discover(args, discovery):
-    """Handle discover command"""
+    """Handle discover command - stream models as NDJSON, page by page"""
     if args.category:
-        models = discovery.discover_by_category(args.category)
+        pages = discovery.discover_by_category(args.category)
     else:
-        models = discovery.discover_all_models()
+        pages = discovery.discover_all_models()
+
+    fields = [f.strip() for f in args.fields.split(',') if f.strip()] if args.fields else None
+    if fields:
+        from lib.discovery import project
 
-    print(json.dumps(models, indent=2))
+    for page in pages:
+        lines = [json.dumps(project(model, fields) if fields else model) for model in page]
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
 
 def handle_refresh(args, discovery):
     """Handle refresh command"""
     print("Refreshing model cache...")
-    models = discovery.discover_all_models(force_refresh=True)
-    print(f"Refreshed cache with {len(models)} models")
+    count = sum(len(page) for page in discovery.discover_all_models(force_refresh=True))
+    print(f"Refreshed cache with {count} models")
 
 def handle_validate(args, client):
     """Handle validate command"""
@@ -109,16 +238,19 @@ def handle_video(args, client):
     if args.negative_prompt:
         input_data["negative_prompt"] = args.negative_prompt
 
+    _validate(args, endpoint_id, input_data)
+
     logger.info("⏳ Submitting video generation via queue system")
-    result = client.run_model(endpoint_id, input_data)
+    stream = _event_stream(args, endpoint_id)
+    input_data = _resolve_local_files(client, input_data)
+    result = client.run_model(endpoint_id, input_data, on_event=stream.on_status if stream else None)
 
     # Extract URL with adapter
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     video_url = adapter.extract_result(result, endpoint_id)
 
     if not video_url:
-        print(json.dumps({"error": "Could not extract video URL from response"}), file=sys.stderr)
-        sys.exit(1)
+        _fail("Could not extract video URL from response", stream)
 
     logger.info("✅ Video generated")
 
@@ -130,6 +262,12 @@ def handle_video(args, client):
         "aspect_ratio": args.aspect_ratio
     }
 
+    _save_download(args, output)
+
+    if stream:
+        stream.completed(**output)
+        return
+
     print(json.dumps(output))
 
 def handle_video_edit(args, client):
@@ -146,9 +284,12 @@ def handle_video_edit(args, client):
     if args.prompt:
         input_data["prompt"] = args.prompt
 
+    _validate(args, endpoint_id, input_data)
+
+    input_data = _resolve_local_files(client, input_data)
     result = client.run_model(endpoint_id, input_data)
 
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     video_url = adapter.extract_result(result, endpoint_id)
 
     if not video_url:
@@ -166,8 +307,13 @@ def handle_tts(args, client):
     """Handle text-to-speech generation"""
     endpoint_id = args.model
 
+    text = args.text
+    if args.text_file:
+        with open(args.text_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+
     input_data = {
-        "text": args.text
+        "text": text
     }
 
     if args.voice:
@@ -181,9 +327,32 @@ def handle_tts(args, client):
     if args.similarity_boost is not None:
         input_data["similarity_boost"] = args.similarity_boost
 
+    _validate(args, endpoint_id, input_data)
+
+    _apply_inline(args, input_data)
+
+    if args.output:
+        # Long-text mode: synthesize sentence chunks in parallel, stitch into one file
+        from lib.long_tts import synthesize_long_text
+
+        output = synthesize_long_text(
+            client,
+            endpoint_id,
+            text,
+            input_data,
+            args.output,
+            max_chars=args.max_chars,
+            max_concurrency=args.max_concurrency,
+            crossfade_ms=args.crossfade_ms,
+            adapter=_response_adapter()
+        )
+        output["model"] = endpoint_id
+        print(json.dumps(output))
+        return
+
     result = client.run_model(endpoint_id, input_data)
 
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     audio_url = adapter.extract_result(result, endpoint_id)
 
     if not audio_url:
@@ -193,9 +362,11 @@ def handle_tts(args, client):
     output = {
         "url": audio_url,
         "model": endpoint_id,
-        "text": args.text
+        "text": text
     }
 
+    _save_download(args, output)
+
     print(json.dumps(output))
 
 def handle_music(args, client):
@@ -215,9 +386,13 @@ def handle_music(args, client):
     if hasattr(args, 'lyrics') and args.lyrics is not None:
         input_data["lyrics_prompt"] = args.lyrics
 
+    _validate(args, endpoint_id, input_data)
+
+    _apply_inline(args, input_data)
+
     result = client.run_model(endpoint_id, input_data)
 
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     audio_url = adapter.extract_result(result, endpoint_id)
 
     if not audio_url:
@@ -230,6 +405,8 @@ def handle_music(args, client):
         "prompt": args.prompt
     }
 
+    _save_download(args, output)
+
     print(json.dumps(output))
 
 def handle_avatar(args, client):
@@ -248,30 +425,39 @@ def handle_avatar(args, client):
         input_data["prompt"] = args.prompt
     if args.sound_volume is not None:
         input_data["sound_volume"] = args.sound_volume
+    if args.resolution:
+        input_data["resolution"] = args.resolution
 
-    result = client.run_model(endpoint_id, input_data)
+    _validate(args, endpoint_id, input_data)
+
+    stream = _event_stream(args, endpoint_id)
+    input_data = _resolve_local_files(client, input_data)
+    result = client.run_model(endpoint_id, input_data, on_event=stream.on_status if stream else None)
 
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     video_url = adapter.extract_result(result, endpoint_id)
 
     if not video_url:
-        print(json.dumps({"error": "Could not extract video URL from response"}), file=sys.stderr)
-        sys.exit(1)
+        _fail("Could not extract video URL from response", stream)
 
     output = {
         "url": video_url,
         "model": endpoint_id
     }
 
+    _save_download(args, output)
+
+    if stream:
+        stream.completed(**output)
+        return
+
     print(json.dumps(output))
 
 def handle_transcribe(args, client):
     """Handle speech-to-text transcription"""
     endpoint_id = args.model
 
-    input_data = {
-        "audio_url": args.audio_url
-    }
+    input_data = {}
 
     if args.language:
         input_data["language"] = args.language
@@ -280,7 +466,31 @@ def handle_transcribe(args, client):
     if args.num_speakers is not None:
         input_data["num_speakers"] = args.num_speakers
 
-    result = client.run_model(endpoint_id, input_data)
+    _validate(args, endpoint_id, {**input_data, "audio_url": args.audio_url or args.audio_file})
+
+    if args.audio_file:
+        # Long-audio mode: split locally, transcribe chunks in parallel, merge
+        from lib.long_audio import transcribe_long_audio
+
+        result = transcribe_long_audio(
+            client,
+            args.audio_file,
+            endpoint_id,
+            input_data,
+            window=args.chunk_seconds,
+            overlap=args.overlap,
+            mode=args.split,
+            max_concurrency=args.max_concurrency,
+            pcm_format={
+                "sample_rate": args.sample_rate,
+                "channels": args.channels,
+                "sample_width": args.sample_width
+            }
+        )
+    else:
+        input_data["audio_url"] = args.audio_url
+        input_data = _resolve_local_files(client, input_data)
+        result = client.run_model(endpoint_id, input_data)
 
     output = {
         "model": endpoint_id,
@@ -318,11 +528,16 @@ def handle_edit(args, client):
     elif 'restyle' in endpoint_id:
         input_data["style"] = args.style
 
+    _validate(args, endpoint_id, input_data)
+
+    _apply_inline(args, input_data)
+
     # Editing is fast (<10s), use blocking mode
+    input_data = _resolve_local_files(client, input_data)
     result = client.run_model(endpoint_id, input_data)
 
     # Extract URL with adapter
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     image_url = adapter.extract_result(result, endpoint_id)
 
     if not image_url:
@@ -336,6 +551,8 @@ def handle_edit(args, client):
         "operation": args.operation if hasattr(args, 'operation') else None
     }
 
+    _save_download(args, output)
+
     print(json.dumps(output))
 
 def handle_upscale(args, client):
@@ -360,16 +577,58 @@ def handle_upscale(args, client):
     if hasattr(args, 'creativity') and args.creativity is not None:
         input_data["creativity"] = args.creativity
 
+    _validate(args, endpoint_id, input_data)
+
+    _apply_inline(args, input_data)
+
+    if args.tile_size:
+        # Tiled mode: upscale overlapping tiles in parallel, stitch locally
+        from lib.tiled_upscale import upscale_tiled
+
+        if not (args.image_file or args.image_url):
+            _fail("Tiled upscaling needs --image-file or --image-url")
+
+        import tempfile
+
+        with tempfile.TemporaryDirectory(prefix="fal-upscale-src-") as download_dir:
+            source = args.image_file
+            if not source and not args.image_url.startswith(('http://', 'https://', 'data:')):
+                source = args.image_url
+            if not source:
+                from lib.download import download_file
+
+                source = os.path.join(download_dir, "source")
+                download_file(args.image_url, source)
+
+            name = os.path.splitext(os.path.basename((args.image_file or args.image_url).split('?')[0]))[0]
+            output_path = args.output or f"{name or 'upscaled'}_x{args.scale}.png"
+            output = upscale_tiled(
+                client,
+                endpoint_id,
+                source,
+                output_path,
+                input_data,
+                args.scale,
+                tile_size=args.tile_size,
+                overlap=args.tile_overlap,
+                max_concurrency=args.max_concurrency,
+                adapter=_response_adapter()
+            )
+        output.update({"model": endpoint_id, "scale": args.scale, "type": "image"})
+        print(json.dumps(output))
+        return
+
     logger.info("⏳ Submitting upscale via queue system")
-    result = client.run_model(endpoint_id, input_data)
+    stream = _event_stream(args, endpoint_id)
+    input_data = _resolve_local_files(client, input_data)
+    result = client.run_model(endpoint_id, input_data, on_event=stream.on_status if stream else None)
 
     # Extract URL with adapter
-    adapter = ResponseAdapter()
+    adapter = _response_adapter()
     result_url = adapter.extract_result(result, endpoint_id)
 
     if not result_url:
-        print(json.dumps({"error": "Could not extract URL from response"}), file=sys.stderr)
-        sys.exit(1)
+        _fail("Could not extract URL from response", stream)
 
     # Return structured result
     output = {
@@ -379,16 +638,256 @@ def handle_upscale(args, client):
         "type": "video" if args.video_url else "image"
     }
 
+    _save_download(args, output)
+
+    if stream:
+        stream.completed(**output)
+        return
+
     print(json.dumps(output))
 
+def handle_pipeline(args, client):
+    """
+    Handle pipeline command - run a DAG of steps from a YAML spec
+    Independent branches run concurrently; completed steps are checkpointed
+    """
+    from lib.pipeline import Pipeline, load_spec
+
+    spec = load_spec(args.spec)
+
+    checkpoint = None
+    if not args.no_checkpoint:
+        checkpoint = args.checkpoint or f"{args.spec}.checkpoint.json"
+        if args.restart and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    pipeline = Pipeline(
+        spec,
+        client,
+        checkpoint_path=checkpoint,
+        max_concurrency=args.max_concurrency,
+        adapter=_response_adapter()
+    )
+    if not args.no_validate:
+        pipeline.validate_inputs()
+    output = pipeline.run()
+    output["checkpoint"] = checkpoint
+
+    print(json.dumps(output, indent=2))
+
+    if not output["ok"]:
+        sys.exit(1)
+
+def handle_loadtest(args):
+    """
+    Handle loadtest command - open-loop load against a local stand-in
+    Arrivals follow the target rate regardless of completions
+    """
+    from lib.loadtest import (
+        LoadGenerator, StandInServer, find_saturation, parse_mix, stand_in_client
+    )
+
+    mix = parse_mix(args.mix)
+    rates = [float(r) for r in args.rate.split(",") if r.strip()]
+
+    def run_at(rate, target_url, rejections=None):
+        generator = LoadGenerator(
+            stand_in_client(target_url, timeout=args.request_timeout),
+            mix,
+            concurrency=args.concurrency,
+            window=args.window,
+            drain_timeout=args.drain_timeout,
+            seed=args.seed,
+            rejections=rejections,
+            fetch=not args.no_fetch,
+            retries=args.retries,
+            backoff=args.backoff
+        )
+        return generator.run(rate, args.duration, args.arrival)
+
+    runs = []
+    for rate in rates:
+        if args.target_url:
+            runs.append(run_at(rate, args.target_url))
+            continue
+        # A fresh stand-in per rate, so no backlog carries over between rates
+        with StandInServer(
+            capacity=args.capacity,
+            queue_limit=args.queue_limit,
+            file_slots=args.file_slots,
+            error_rate=args.error_rate,
+            service_scale=args.service_scale,
+            seed=args.seed
+        ) as server:
+            runs.append(run_at(rate, server.url, server.rejections))
+
+    output = {
+        "mix": dict(mix),
+        "concurrency": args.concurrency,
+        "saturation_rate": find_saturation(runs),
+        "runs": runs
+    }
+
+    print(json.dumps(output, indent=2))
+
+def handle_download(args):
+    """Handle download command - save result URLs to disk (parallel ranges, resumable)"""
+    from lib.download import download_file, download_to_dir
+
+    if args.output and len(args.urls) > 1:
+        _fail("--output takes a single URL; use --dir for several")
+    if args.sha256 and len(args.urls) > 1:
+        _fail("--sha256 takes a single URL")
+
+    results = []
+    for url in args.urls:
+        options = {"connections": args.connections, "sha256": args.sha256, "expected_size": args.size}
+        if args.output:
+            results.append(download_file(url, args.output, **options))
+        else:
+            results.append(download_to_dir(url, args.dir, **options))
+
+    print(json.dumps(results[0] if len(results) == 1 else results, indent=2))
+
+def handle_worker(args, client):
+    """
+    Handle worker command - run job files dropped into a spool directory
+    Jobs are claimed by atomic rename and run concurrently; prints one JSON line per finished job
+    """
+    import signal
+    from lib.spool import SpoolWorker
+
+    worker = SpoolWorker(
+        client,
+        args.spool,
+        output_dir=args.output,
+        concurrency=args.concurrency,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        poll_interval=args.poll,
+        download=not args.no_download,
+        validate=not args.no_validate,
+        adapter=_response_adapter(),
+        on_finish=lambda event: print(json.dumps(event), flush=True),
+        timeout=args.timeout,
+        deadline=_parse_deadline(args.deadline) if args.deadline else None
+    )
+    # Finish the jobs in flight, then exit
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        counts = worker.run(once=args.once)
+    except KeyboardInterrupt:
+        worker.stop()
+        counts = worker.counts
+    print(json.dumps({"summary": counts}))
+
+def handle_batch(args, client):
+    """
+    Handle batch command - run a JSONL manifest from a shared SQLite job table
+    Start the same command on several processes or hosts to split the work through leases
+    """
+    import signal
+    from lib.batch import BatchWorker, JobTable, read_manifest
+
+    table = JobTable(args.db or f"{args.manifest}.db")
+    if args.status:
+        print(json.dumps(table.counts(), indent=2))
+        return
+
+    jobs = list(read_manifest(args.manifest))
+    if not args.no_validate:
+        for job_id, endpoint_id, input_data in jobs:
+            try:
+                _validate(args, endpoint_id, input_data)
+            except ValueError as e:
+                raise ValueError(f"Job {job_id}: {e}")
+    added = table.load(iter(jobs))
+    if added:
+        print(json.dumps({"loaded": added}), flush=True)
+
+    worker = BatchWorker(
+        client,
+        table,
+        concurrency=args.concurrency,
+        lease=args.lease,
+        max_attempts=args.max_attempts,
+        poll_interval=args.poll,
+        adapter=_response_adapter(),
+        on_finish=lambda event: print(json.dumps(event), flush=True)
+    )
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    counts = worker.run()
+    print(json.dumps({"summary": counts}))
+    if counts["failed"]:
+        sys.exit(1)
+
+def handle_cancel(args, client):
+    """Handle cancel command - cancel a queued or running request"""
+    client.cancel(args.endpoint_id, args.request_id)
+    print(json.dumps({"endpoint_id": args.endpoint_id, "request_id": args.request_id, "cancelled": True}))
+
+def handle_route(args):
+    """Handle route command - map request text to a command, default model and parameters (no API calls)"""
+    import time
+    from lib.router import route
+
+    texts = sys.stdin if args.text == '-' else [args.text]
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        started = time.perf_counter_ns()
+        result = route(text)
+        result["route_us"] = round((time.perf_counter_ns() - started) / 1000, 1)
+        if args.text == '-':
+            result["request"] = text
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+# Subcommand dispatch tables, grouped by what each handler needs constructed
+CLIENT_COMMANDS = {
+    'run': handle_run,
+    'generate': handle_generate,
+    'video': handle_video,
+    'video-edit': handle_video_edit,
+    'tts': handle_tts,
+    'music': handle_music,
+    'avatar': handle_avatar,
+    'transcribe': handle_transcribe,
+    'edit': handle_edit,
+    'upscale': handle_upscale,
+    'validate': handle_validate,
+    'pipeline': handle_pipeline,
+    'cancel': handle_cancel,
+    'worker': handle_worker,
+    'batch': handle_batch,
+}
+
+DISCOVERY_COMMANDS = {
+    'discover': handle_discover,
+    'refresh': handle_refresh,
+}
+
+LOCAL_COMMANDS = {
+    'loadtest': handle_loadtest,
+    'download': handle_download,
+    'route': handle_route,
+}
+
 def main():
-    parser = argparse.ArgumentParser(description='fal.ai API CLI wrapper')
+    parser = argparse.ArgumentParser(
+        description='fal.ai API CLI wrapper',
+        epilog='Add --profile[=DIR] (or set FAL_PROFILE=1|DIR) to any command to write cProfile stats and '
+               'wall/CPU flame-graph stacks for the whole run into DIR (default: ./fal-profile)'
+    )
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
     # Run command
     run_parser = subparsers.add_parser('run', help='Execute a model with raw JSON input')
     run_parser.add_argument('endpoint_id', help='Model endpoint ID (e.g., fal-ai/flux/dev)')
     run_parser.add_argument('input_json', help='JSON input data')
+    run_parser.add_argument('--stream', action='store_true',
+        help='Emit NDJSON progress events (queued, in_progress, completed) on stdout')
+    _add_job_options(run_parser)
 
     # Generate command
     generate_parser = subparsers.add_parser('generate', help='Generate image with simplified interface')
@@ -397,10 +896,14 @@ def main():
     generate_parser.add_argument('--size', default='square_hd', help='Image size (default: square_hd)')
     generate_parser.add_argument('--steps', type=int, help='Number of inference steps')
     generate_parser.add_argument('--guidance', type=float, help='Guidance scale')
+    _add_output_options(generate_parser, inline=True)
+    _add_job_options(generate_parser)
 
     # Discover command
-    discover_parser = subparsers.add_parser('discover', help='Discover available models')
+    discover_parser = subparsers.add_parser('discover', help='Discover available models (NDJSON, one model per line)')
     discover_parser.add_argument('category', nargs='?', help='Model category to filter by')
+    discover_parser.add_argument('--fields',
+        help='Comma-separated fields to keep per model; dotted names reach nested ones (e.g. endpoint_id,metadata.category)')
 
     # Refresh command
     refresh_parser = subparsers.add_parser('refresh', help='Refresh model cache')
@@ -412,61 +915,103 @@ def main():
     video_parser = subparsers.add_parser('video', help='Video generation (text-to-video or image-to-video)')
     video_parser.add_argument('--model', required=True, help='Model endpoint ID')
     video_parser.add_argument('--prompt', help='Text prompt for text-to-video')
-    video_parser.add_argument('--image-url', help='Image URL for image-to-video')
-    video_parser.add_argument('--video-url', help='Video URL for video-to-video')
-    video_parser.add_argument('--first-frame-url', help='First frame image URL')
-    video_parser.add_argument('--last-frame-url', help='Last frame image URL')
+    video_parser.add_argument('--image-url', help='Image URL or local file for image-to-video')
+    video_parser.add_argument('--video-url', help='Video URL or local file for video-to-video')
+    video_parser.add_argument('--first-frame-url', help='First frame image URL or local file')
+    video_parser.add_argument('--last-frame-url', help='Last frame image URL or local file')
     video_parser.add_argument('--duration', type=int, default=None, choices=[5, 10], help='Video duration in seconds')
     video_parser.add_argument('--aspect-ratio', default=None,
         choices=['16:9', '9:16', '1:1', '4:3', '3:4'], help='Video aspect ratio')
     video_parser.add_argument('--negative-prompt', help='What to avoid in the video')
+    video_parser.add_argument('--stream', action='store_true',
+        help='Emit NDJSON progress events (queued, in_progress, completed) on stdout')
+    _add_output_options(video_parser)
+    _add_job_options(video_parser)
 
     # Video edit command
     video_edit_parser = subparsers.add_parser('video-edit', help='Video editing (video-to-video or effects)')
     video_edit_parser.add_argument('--model', required=True, help='Model endpoint ID')
-    video_edit_parser.add_argument('--video-url', required=True, help='Video URL to edit')
+    video_edit_parser.add_argument('--video-url', required=True, help='Video URL or local file to edit')
     video_edit_parser.add_argument('--prompt', help='Editing instruction prompt')
+    _add_job_options(video_edit_parser)
 
     # TTS command
     tts_parser = subparsers.add_parser('tts', help='Text-to-speech generation')
     tts_parser.add_argument('--model', required=True, help='Model endpoint ID')
-    tts_parser.add_argument('--text', required=True, help='Text to speak')
+    tts_text = tts_parser.add_mutually_exclusive_group(required=True)
+    tts_text.add_argument('--text', help='Text to speak')
+    tts_text.add_argument('--text-file', help='Read the text to speak from a file')
     tts_parser.add_argument('--voice', help='Voice name or ID')
     tts_parser.add_argument('--speed', type=float, help='Speech speed')
     tts_parser.add_argument('--language', help='Language code or name')
     tts_parser.add_argument('--stability', type=float, help='Voice stability (model-specific)')
     tts_parser.add_argument('--similarity-boost', type=float, help='Voice similarity boost (model-specific)')
+    tts_parser.add_argument('--output',
+        help='Write audio to this file; long text is split into sentence chunks synthesized in parallel')
+    tts_parser.add_argument('--max-chars', type=int,
+        help='Characters per chunk with --output (default: per-model limit)')
+    tts_parser.add_argument('--max-concurrency', type=int, default=4,
+        help='Chunks synthesized at once with --output (default: 4)')
+    tts_parser.add_argument('--crossfade-ms', type=float, default=30,
+        help='Crossfade between WAV chunks in milliseconds (default: 30)')
+    _add_output_options(tts_parser, inline=True)
+    _add_job_options(tts_parser)
 
     # Music command
     music_parser = subparsers.add_parser('music', help='Music or sound effect generation')
     music_parser.add_argument('--model', required=True, help='Model endpoint ID')
     music_parser.add_argument('--prompt', required=True, help='Music prompt')
-    music_parser.add_argument('--duration', type=int, help='Duration in seconds')
+    music_parser.add_argument('--duration', type=int, help='Duration in seconds (required for sound effects)')
     music_parser.add_argument('--refinement', type=int, help='Refinement level (model-specific)')
     music_parser.add_argument('--creativity', type=int, help='Creativity level (model-specific)')
     music_parser.add_argument('--lyrics', help='Song lyrics (required for minimax-music)')
+    _add_output_options(music_parser, inline=True)
+    _add_job_options(music_parser)
 
     # Avatar command
     avatar_parser = subparsers.add_parser('avatar', help='Avatar lipsync generation')
     avatar_parser.add_argument('--model', required=True, help='Model endpoint ID')
-    avatar_parser.add_argument('--audio-url', required=True, help='Audio URL for lipsync')
-    avatar_parser.add_argument('--image-url', help='Image URL for avatar')
-    avatar_parser.add_argument('--video-url', help='Video URL for avatar')
+    avatar_parser.add_argument('--audio-url', required=True, help='Audio URL or local file for lipsync')
+    avatar_parser.add_argument('--image-url', help='Image URL or local file for avatar')
+    avatar_parser.add_argument('--video-url', help='Video URL or local file for avatar')
     avatar_parser.add_argument('--prompt', help='Optional prompt or style')
     avatar_parser.add_argument('--sound-volume', type=float, help='Sound volume (model-specific)')
+    avatar_parser.add_argument('--resolution', help='Output resolution (model-specific, e.g. 720p)')
+    avatar_parser.add_argument('--stream', action='store_true',
+        help='Emit NDJSON progress events (queued, in_progress, completed) on stdout')
+    _add_output_options(avatar_parser)
+    _add_job_options(avatar_parser)
 
     # Transcribe command
     transcribe_parser = subparsers.add_parser('transcribe', help='Speech-to-text transcription')
     transcribe_parser.add_argument('--model', required=True, help='Model endpoint ID')
-    transcribe_parser.add_argument('--audio-url', required=True, help='Audio URL to transcribe')
+    transcribe_source = transcribe_parser.add_mutually_exclusive_group(required=True)
+    transcribe_source.add_argument('--audio-url', help='Audio URL or local file to transcribe')
+    transcribe_source.add_argument('--audio-file',
+        help='Local WAV (or raw PCM) file; long recordings are split and transcribed in parallel')
     transcribe_parser.add_argument('--task', help='Task type (transcribe/translate)')
     transcribe_parser.add_argument('--language', help='Language hint')
     transcribe_parser.add_argument('--num-speakers', type=int, help='Speaker count for diarization')
+    transcribe_parser.add_argument('--chunk-seconds', type=float, default=300,
+        help='Target chunk length for --audio-file (default: 300, 0 = no splitting)')
+    transcribe_parser.add_argument('--overlap', type=float, default=2,
+        help='Seconds of overlap between chunks (default: 2)')
+    transcribe_parser.add_argument('--split', choices=['silence', 'fixed'], default='silence',
+        help='Cut near silences or at fixed windows (default: silence)')
+    transcribe_parser.add_argument('--max-concurrency', type=int, default=4,
+        help='Chunks uploaded and transcribed at once (default: 4)')
+    transcribe_parser.add_argument('--sample-rate', type=int, default=16000,
+        help='Raw PCM sample rate (ignored for WAV, default: 16000)')
+    transcribe_parser.add_argument('--channels', type=int, default=1,
+        help='Raw PCM channel count (ignored for WAV, default: 1)')
+    transcribe_parser.add_argument('--sample-width', type=int, default=2,
+        help='Raw PCM bytes per sample (ignored for WAV, default: 2)')
+    _add_job_options(transcribe_parser)
 
     # Edit command
     edit_parser = subparsers.add_parser('edit', help='Advanced image editing (Fibo Edit suite)')
     edit_parser.add_argument('--model', required=True, help='Model endpoint ID')
-    edit_parser.add_argument('--image-url', required=True, help='Image URL to edit')
+    edit_parser.add_argument('--image-url', required=True, help='Image URL or local file to edit')
     edit_parser.add_argument('--operation',
         choices=['colorize', 'relight', 'reseason', 'restore', 'restyle',
                  'inpaint', 'outpaint', 'add-object', 'remove-object'],
@@ -493,16 +1038,124 @@ def main():
                  'Retro Ad', 'Pop Art Halftone', 'Vector Art', 'Story Board', 'Art Nouveau',
                  'Cross Etching', 'Wood Cut'],
         default='Oil Painting', help='Art style for restyle operation')
+    _add_output_options(edit_parser, inline=True)
+    _add_job_options(edit_parser)
 
     # Upscale command
     upscale_parser = subparsers.add_parser('upscale', help='Image or video upscaling')
     upscale_parser.add_argument('--model', required=True, help='Model endpoint ID')
-    upscale_parser.add_argument('--image-url', help='Image URL to upscale')
-    upscale_parser.add_argument('--video-url', help='Video URL to upscale')
+    upscale_parser.add_argument('--image-url', help='Image URL or local file to upscale')
+    upscale_parser.add_argument('--video-url', help='Video URL or local file to upscale')
+    upscale_parser.add_argument('--image-file', help='Local image to upscale (with --tile-size)')
+    upscale_parser.add_argument('--tile-size', type=int,
+        help='Split the image into tiles of this many source pixels, upscale them in parallel and stitch')
+    upscale_parser.add_argument('--tile-overlap', type=int, default=64,
+        help='Source pixels shared by neighbouring tiles, blended at the seams (default: 64)')
+    upscale_parser.add_argument('--max-concurrency', type=int, default=4,
+        help='Tiles upscaled at once (default: 4)')
+    upscale_parser.add_argument('--output', help='Stitched PNG path for tiled upscaling')
     upscale_parser.add_argument('--scale', type=int, default=2, choices=[2, 4, 8],
         help='Upscale factor')
     upscale_parser.add_argument('--creativity', type=float, default=0.35,
         help='AI enhancement level (0-1)')
+    upscale_parser.add_argument('--stream', action='store_true',
+        help='Emit NDJSON progress events (queued, in_progress, completed) on stdout')
+    _add_output_options(upscale_parser, inline=True)
+    _add_job_options(upscale_parser)
+
+    # Pipeline command
+    pipeline_parser = subparsers.add_parser('pipeline', help='Run a multi-step pipeline from a YAML spec')
+    pipeline_parser.add_argument('spec', help='Pipeline spec file (YAML)')
+    pipeline_parser.add_argument('--max-concurrency', type=int,
+        help='Steps to run at once (default: spec max_concurrency, then 4)')
+    pipeline_parser.add_argument('--checkpoint', help='Checkpoint file (default: <spec>.checkpoint.json)')
+    pipeline_parser.add_argument('--no-checkpoint', action='store_true', help='Do not read or write a checkpoint')
+    pipeline_parser.add_argument('--restart', action='store_true', help='Discard the checkpoint and run every step')
+    _add_job_options(pipeline_parser)
+
+    # Cancel command
+    cancel_parser = subparsers.add_parser('cancel', help='Cancel a queued or running request')
+    cancel_parser.add_argument('endpoint_id', help='Model endpoint ID the request was sent to')
+    cancel_parser.add_argument('request_id', help='Request ID (from a SUBMITTED event or the logs)')
+
+    # Worker command
+    worker_parser = subparsers.add_parser('worker', help='Run job files dropped into a spool directory')
+    worker_parser.add_argument('--spool', required=True,
+        help='Directory watched for <name>.json job files ({"endpoint": ..., "input": {...}})')
+    worker_parser.add_argument('--output', help='Result files and media (default: <spool>/out)')
+    worker_parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at once (default: 4)')
+    worker_parser.add_argument('--max-attempts', type=int, default=3,
+        help='Attempts before a job moves to <spool>/failed (default: 3)')
+    worker_parser.add_argument('--retry-delay', type=float, default=30.0,
+        help='Seconds before the first retry, doubling after each failure (default: 30)')
+    worker_parser.add_argument('--poll', type=float, default=1.0, help='Seconds between spool scans (default: 1)')
+    worker_parser.add_argument('--once', action='store_true', help='Exit once the spool and retries are drained')
+    worker_parser.add_argument('--no-download', action='store_true', help='Record result URLs without downloading')
+    _add_job_options(worker_parser, worker=True)
+
+    # Batch command
+    batch_parser = subparsers.add_parser('batch',
+        help='Run a JSONL manifest, shared between processes or hosts through a SQLite job table')
+    batch_parser.add_argument('manifest',
+        help='JSONL file, one {"id": ..., "endpoint": ..., "input": {...}} per line (id optional)')
+    batch_parser.add_argument('--db',
+        help='Job table shared by all workers; must be on a filesystem with working locks (default: <manifest>.db)')
+    batch_parser.add_argument('--concurrency', type=int, default=4, help='Jobs this process runs at once (default: 4)')
+    batch_parser.add_argument('--lease', type=float, default=60.0,
+        help='Seconds a claim lasts without a heartbeat before other workers may take the job (default: 60)')
+    batch_parser.add_argument('--max-attempts', type=int, default=3, help='Submissions per job before it fails (default: 3)')
+    batch_parser.add_argument('--poll', type=float, default=2.0, help='Seconds between status polls (default: 2)')
+    batch_parser.add_argument('--status', action='store_true', help='Print job counts by state and exit')
+    batch_parser.add_argument('--no-validate', action='store_true',
+        help='Skip local input checks against models.yaml params')
+
+    # Loadtest command
+    loadtest_parser = subparsers.add_parser('loadtest', help='Open-loop load test against a local stand-in')
+    loadtest_parser.add_argument('--rate', default='5',
+        help='Target arrival rate in jobs/s; comma-separate to sweep (e.g. 5,10,20)')
+    loadtest_parser.add_argument('--duration', type=float, default=30.0, help='Seconds of arrivals per rate')
+    loadtest_parser.add_argument('--arrival', choices=['poisson', 'constant'], default='poisson',
+        help='Inter-arrival timing')
+    loadtest_parser.add_argument('--mix', default='generate=6,tts=3,video=1',
+        help='Weighted subcommand mix (generate, edit, upscale, tts, music, video)')
+    loadtest_parser.add_argument('--concurrency', type=int, default=16, help='Worker threads')
+    loadtest_parser.add_argument('--window', type=float, default=1.0, help='Report window in seconds')
+    loadtest_parser.add_argument('--target-url',
+        help='External stand-in serving the fal queue protocol, e.g. http://127.0.0.1:8080 (default: built-in)')
+    loadtest_parser.add_argument('--capacity', type=int, default=8, help='Stand-in service slots')
+    loadtest_parser.add_argument('--queue-limit', type=int, default=32,
+        help='Stand-in queue depth before answering 429')
+    loadtest_parser.add_argument('--file-slots', type=int, default=4,
+        help='Stand-in concurrent file transfers before answering 429')
+    loadtest_parser.add_argument('--error-rate', type=float, default=0.0, help='Stand-in injected 500 rate')
+    loadtest_parser.add_argument('--service-scale', type=float, default=1.0,
+        help='Multiplier on stand-in service times')
+    loadtest_parser.add_argument('--request-timeout', type=float, default=60,
+        help='HTTP timeout per fal_client request')
+    loadtest_parser.add_argument('--drain-timeout', type=float, default=30.0,
+        help='Seconds to wait for outstanding jobs after arrivals stop')
+    loadtest_parser.add_argument('--no-fetch', action='store_true',
+        help="Skip downloading each job's output file")
+    loadtest_parser.add_argument('--retries', type=int, default=3,
+        help='Attempts per output download (http_utils retry/backoff)')
+    loadtest_parser.add_argument('--backoff', type=float, default=0.5,
+        help='Base backoff between download attempts in seconds')
+    loadtest_parser.add_argument('--seed', type=int, help='Random seed for arrivals and stand-in')
+
+    # Route command
+    route_parser = subparsers.add_parser('route',
+        help='Route request text to a command, default model and parameters (SKILL.md rules, no API calls)')
+    route_parser.add_argument('text', help="Request text, or '-' to route one request per stdin line (NDJSON out)")
+
+    # Download command
+    download_parser = subparsers.add_parser('download', help='Download result files (parallel, resumable)')
+    download_parser.add_argument('urls', nargs='+', help='Result URL(s)')
+    download_parser.add_argument('--dir', default='.', help='Destination directory (default: current)')
+    download_parser.add_argument('--output', help='Destination file path (single URL)')
+    download_parser.add_argument('--connections', type=int, default=4,
+        help='Parallel range connections per file (default: 4)')
+    download_parser.add_argument('--sha256', help='Expected SHA-256 of the file')
+    download_parser.add_argument('--size', type=int, help='Expected size in bytes')
 
     args = parser.parse_args()
 
@@ -510,43 +1163,42 @@ def main():
         parser.print_help()
         sys.exit(1)
 
+    # One trace span per invocation (FAL_TRACE); fal calls, uploads and outputs nest under it
+    from lib.tracing import span
+
     try:
-        client = FalAPIClient()
-        discovery = ModelDiscovery(client)
-
-        if args.command == 'run':
-            handle_run(args, client)
-        elif args.command == 'generate':
-            handle_generate(args, client)
-        elif args.command == 'video':
-            handle_video(args, client)
-        elif args.command == 'video-edit':
-            handle_video_edit(args, client)
-        elif args.command == 'tts':
-            handle_tts(args, client)
-        elif args.command == 'music':
-            handle_music(args, client)
-        elif args.command == 'avatar':
-            handle_avatar(args, client)
-        elif args.command == 'transcribe':
-            handle_transcribe(args, client)
-        elif args.command == 'edit':
-            handle_edit(args, client)
-        elif args.command == 'upscale':
-            handle_upscale(args, client)
-        elif args.command == 'discover':
-            handle_discover(args, discovery)
-        elif args.command == 'refresh':
-            handle_refresh(args, discovery)
-        elif args.command == 'validate':
-            handle_validate(args, client)
-        else:
-            print(f"Unknown command: {args.command}")
-            sys.exit(1)
+        with span(f"cli {args.command}", kind="server", **{"cli.command": args.command,
+                  "fal.endpoint": getattr(args, 'model', None) or getattr(args, 'endpoint_id', None)}):
+            if args.command in LOCAL_COMMANDS:
+                LOCAL_COMMANDS[args.command](args)
+                return
+
+            if args.command not in CLIENT_COMMANDS and args.command not in DISCOVERY_COMMANDS:
+                print(f"Unknown command: {args.command}")
+                sys.exit(1)
+
+            # Only build what the command needs; discovery and its cache dir stay untouched otherwise
+            from lib.api_client import FalAPIClient
+            client = FalAPIClient(
+                deadline=_command_deadline(args),
+                lane=getattr(args, 'lane', None),
+                tenant=getattr(args, 'tenant', None)
+            )
+
+            if args.command in DISCOVERY_COMMANDS:
+                from lib.discovery import ModelDiscovery
+                DISCOVERY_COMMANDS[args.command](args, ModelDiscovery(client))
+            else:
+                CLIENT_COMMANDS[args.command](args, client)
 
     except Exception as e:
+        if getattr(args, 'stream', False):
+            from lib.events import NDJSONEventStream
+            NDJSONEventStream(model=getattr(args, 'model', None) or getattr(args, 'endpoint_id', None)).failed(str(e))
         print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        # Same exit status as timeout(1) when a job ran out of time
+        sys.exit(124 if isinstance(e, TimeoutError) else 1)
 
 if __name__ == "__main__":
-    main()
+    from lib.profiling import run_profiled
+    run_profiled(main)
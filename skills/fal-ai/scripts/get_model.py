@@ -10,6 +10,7 @@ Examples:
     python get_model.py image-editing --list        # List all models in category
     python get_model.py tts --all                   # Get all model details as JSON
     python get_model.py text-to-image --tier premium  # Get premium tier model
+    python get_model.py tts --profile               # Also write a profile to ./fal-profile
 """
 
 import sys
@@ -121,9 +122,14 @@ def main():
         models = get_all_models(category, data)
         print(json.dumps(models, indent=2))
     else:
-        model = get_recommended(category, data, cost_tier)
+        from lib.tracing import span
+
+        with span("model.resolve", **{"fal.category": category, "model.cost_tier": cost_tier}) as current:
+            model = get_recommended(category, data, cost_tier)
+            current.set(**{"fal.endpoint": model, "model.source": "curated"})
         print(model)
 
 
 if __name__ == "__main__":
-    main()
+    from lib.profiling import run_profiled
+    run_profiled(main)
@@ -1,9 +1,8 @@
 import os
-import json
-import yaml
 import re
 from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
+from .tracing import span
 from .utils import atomic_write
 
 class ResponseAdapter:
@@ -74,6 +73,9 @@ class ResponseAdapter:
         "file.url"
     ]
 
+    # Hosted results are URLs; sync-mode (inline) results are base64 data URIs
+    RESULT_PREFIXES = ("http://", "https://", "data:")
+
     def __init__(self, patterns_file: str = None):
         if patterns_file is None:
             patterns_file = os.path.expanduser("~/.config/fal-skill/response_patterns.yaml")
@@ -86,6 +88,8 @@ class ResponseAdapter:
         if not os.path.exists(self.patterns_file):
             return {}
 
+        import yaml
+
         try:
             with open(self.patterns_file, 'r', encoding="utf-8") as f:
                 data = yaml.safe_load(f) or {}
@@ -95,6 +99,8 @@ class ResponseAdapter:
 
     def _save_patterns(self):
         """Persist learned patterns to YAML"""
+        import yaml
+
         directory = os.path.dirname(self.patterns_file)
         if directory:
             os.makedirs(directory, exist_ok=True)
@@ -120,6 +126,12 @@ class ResponseAdapter:
         Returns:
             Extracted URL string or None
         """
+        with span("extract", **{"fal.endpoint": endpoint_id}) as current:
+            url = self._extract_result(response, endpoint_id)
+            current.set(found=url is not None)
+            return url
+
+    def _extract_result(self, response: Dict[str, Any], endpoint_id: str) -> Optional[str]:
         # Stage 1: Try known learned pattern for this model
         if endpoint_id in self.patterns:
             pattern = self.patterns[endpoint_id]
@@ -174,8 +186,8 @@ class ResponseAdapter:
                     # Object key
                     current = current[part]
 
-            # Verify result looks like a URL
-            if isinstance(current, str) and (current.startswith("http://") or current.startswith("https://")):
+            # Verify result looks like a URL (or inline data URI)
+            if isinstance(current, str) and current.startswith(self.RESULT_PREFIXES):
                 return current
 
             return None
@@ -186,7 +198,7 @@ class ResponseAdapter:
     def _find_first_url_with_path(self, data: Any, path: str = "") -> Tuple[Optional[str], Optional[str]]:
         """Find the first URL-like string and return its path."""
         if isinstance(data, str):
-            if data.startswith("http://") or data.startswith("https://"):
+            if data.startswith(self.RESULT_PREFIXES):
                 return path or None, data
             return None, None
 
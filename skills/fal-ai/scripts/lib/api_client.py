@@ -1,12 +1,148 @@
 import os
 import re
-from typing import Dict, Any, Optional
-from .logging_config import setup_logging
-from .http_utils import urlopen_with_retries
-from .utils import load_api_key
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional
+from .key_pool import KeyPool, RequestKeyLog, key_id
+from .logging_config import ProgressSampler, setup_logging
+from .scheduler import BULK, Scheduler, parse_weights
+from .singleflight import SingleFlight, request_key
+from .tracing import span
+from .utils import load_api_keys
 
 logger = setup_logging(__name__)
 
+DEFAULT_TIMEOUT = 120.0
+POLL_INTERVAL = 0.1  # Seconds between queue status polls (fal_client's iter_events default)
+
+
+class JobTimeoutError(TimeoutError):
+    """A queue job outlived its timeout or deadline (and was cancelled if it had been submitted)"""
+
+    def __init__(self, endpoint_id: str, request_id: Optional[str] = None, cancelled: bool = False):
+        self.endpoint_id = endpoint_id
+        self.request_id = request_id
+        self.cancelled = cancelled
+        if request_id is None:
+            message = f"Deadline passed before {endpoint_id} was submitted"
+        elif cancelled:
+            message = f"{endpoint_id} request {request_id} missed its deadline and was cancelled"
+        else:
+            message = f"{endpoint_id} request {request_id} missed its deadline; cancelling it failed"
+        super().__init__(message)
+
+
+def _import_fal_client():
+    try:
+        import fal_client
+    except ImportError:
+        raise ImportError(
+            "fal_client is not installed. "
+            "Please run: uv pip install -r requirements.txt"
+        )
+    return fal_client
+
+
+def _default_host(fal_module, attr: str, fallback: str) -> str:
+    """Host fal_client computed at import time for one of its URL formats"""
+    url = getattr(getattr(fal_module, "client", None), attr, None)
+    if not url:
+        return fallback
+    return url.split("://", 1)[-1].split("/", 1)[0]
+
+
+def build_sync_client(
+    api_key: str,
+    timeout: float = DEFAULT_TIMEOUT,
+    host_overrides: Optional[Dict[str, str]] = None
+):
+    """
+    Build a fal_client.SyncClient bound to one key, timeout and connection pool.
+
+    fal_client only reads FAL_RUN_HOST at import, so per-client hosts are
+    applied with an httpx request hook on fal_client's own httpx client
+    (keeping its transports and redirect handling) that rewrites the
+    default hosts to the overrides ({default_host: custom_host}) on each
+    request. An override may carry a scheme and port ("http://127.0.0.1:8080").
+    """
+    fal_client = _import_fal_client()
+
+    if not host_overrides:
+        return fal_client.SyncClient(key=api_key, default_timeout=timeout)
+
+    from functools import cached_property
+    import httpx
+
+    def rewrite_host(request):
+        target = host_overrides.get(request.url.host)
+        if target:
+            # A bare host keeps https; "http://host:port" (a local stand-in) also sets the scheme
+            custom = httpx.URL(target if "://" in target else f"https://{target}")
+            request.url = request.url.copy_with(scheme=custom.scheme, host=custom.host, port=custom.port)
+            request.headers["Host"] = f"{custom.host}:{custom.port}" if custom.port else custom.host
+
+    class HostOverrideSyncClient(fal_client.SyncClient):
+        @cached_property
+        def _client(self):
+            # Request hooks run before httpx picks the transport, so the rewritten URL is routed as usual
+            client = fal_client.SyncClient._client.func(self)
+            client.event_hooks["request"] = [*client.event_hooks["request"], rewrite_host]
+            return client
+
+    return HostOverrideSyncClient(key=api_key, default_timeout=timeout)
+
+
+def status_to_dict(status) -> Dict[str, Any]:
+    """Convert a fal_client queue Status object into a plain dictionary"""
+    # Handle both dict (from mocks) and object (from real SDK) responses
+    if isinstance(status, dict):
+        return status
+
+    fal_client = _import_fal_client()
+    Queued, InProgress, Completed = fal_client.Queued, fal_client.InProgress, fal_client.Completed
+    Failed = getattr(fal_client, "Failed", None)
+    Canceled = getattr(fal_client, "Canceled", None)
+    Cancelled = getattr(fal_client, "Cancelled", None)
+
+    # Convert Status object to dictionary based on type
+    if isinstance(status, Completed):
+        return {
+            "status": "COMPLETED",
+            "logs": status.logs or [],
+            "metrics": status.metrics if hasattr(status, 'metrics') else {}
+        }
+    elif isinstance(status, InProgress):
+        return {
+            "status": "IN_PROGRESS",
+            "logs": status.logs or []
+        }
+    elif isinstance(status, Queued):
+        return {
+            "status": "IN_QUEUE",
+            "position": status.position if hasattr(status, 'position') else 0
+        }
+    elif Failed is not None and isinstance(status, Failed):
+        return {
+            "status": "FAILED",
+            "logs": status.logs or [],
+            "error": getattr(status, "error", None)
+        }
+    elif (Canceled is not None and isinstance(status, Canceled)) or (
+        Cancelled is not None and isinstance(status, Cancelled)
+    ):
+        return {
+            "status": "CANCELED",
+            "logs": status.logs or []
+        }
+    else:
+        # Fallback for unknown status types
+        return {
+            "status": "UNKNOWN",
+            "logs": []
+        }
+
+
 class FalAPIClient:
     """Official fal_client wrapper for fal.ai API"""
 
@@ -15,11 +151,27 @@ class FalAPIClient:
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         queue_url: Optional[str] = None,
-        api_host: Optional[str] = None
+        api_host: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        api_keys: Optional[List[str]] = None,
+        key_concurrency: Optional[int] = None,
+        key_rate: Optional[float] = None,
+        coalesce: Optional[bool] = None,
+        deadline: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        lane: Optional[str] = None,
+        tenant: Optional[str] = None,
+        record: Optional[str] = None,
+        replay: Optional[str] = None,
+        replay_scale: Optional[float] = None
     ):
         """
         Initialize the fal.ai API client.
 
+        Each instance holds its own fal_client client (key, hosts, timeout and
+        connection pool), so several clients can run side by side in one
+        process without touching os.environ.
+
         Args:
             api_key: API key for authentication. Falls back to FAL_KEY env var.
             base_url: Custom base URL host (e.g., 'custom.fal.run').
@@ -28,31 +180,219 @@ class FalAPIClient:
                        Falls back to FAL_QUEUE_RUN_HOST env var, then 'queue.{base_url}'.
             api_host: Custom API host for discovery (e.g., 'api.custom.fal.ai').
                       Falls back to FAL_API_HOST env var, then 'api.fal.ai'.
+            timeout: Default HTTP timeout in seconds for fal_client requests.
+            api_keys: Pool of API keys to spread requests over. Falls back to
+                      FAL_KEY and FAL_KEY_<n> entries in env, then config file.
+                      Ignored when api_key is given.
+            key_concurrency: Max requests in flight per pooled key.
+                             Falls back to FAL_KEY_CONCURRENCY env var, then unlimited.
+            key_rate: Max requests started per second per pooled key.
+                      Falls back to FAL_KEY_RATE env var, then unlimited.
+            coalesce: Share one fal job between identical concurrent requests
+                      (same endpoint_id and input_data). Falls back to
+                      FAL_COALESCE env var ("1" enables), then off, since two
+                      identical generation requests may intentionally want
+                      two different outputs.
+            deadline: Wall-clock time (epoch seconds) after which run_model stops
+                      waiting, cancels its job and raises JobTimeoutError.
+            max_in_flight: Jobs run_model keeps in flight at once; further calls
+                           queue in a Scheduler (interactive lane first, weighted
+                           fair tenants, earliest deadline first). Falls back to
+                           FAL_MAX_IN_FLIGHT env var, then unlimited (no scheduler).
+            lane: Default lane for run_model ('interactive' or 'bulk').
+                  Falls back to FAL_LANE env var, then 'bulk'.
+            tenant: Default tenant (fair-share group) for run_model.
+                    Falls back to FAL_TENANT env var, then 'default'.
+                    Tenant weights come from FAL_TENANT_WEIGHTS ("nightly=1,agent=4").
+            record: Cassette file to record every fal call and discovery page into,
+                    with timings. Falls back to FAL_RECORD env var.
+            replay: Cassette file to serve calls from instead of the network.
+                    Falls back to FAL_REPLAY env var; no API key is needed.
+            replay_scale: Multiplier on recorded latencies during replay
+                          (1 = original, 0 = none). Falls back to FAL_REPLAY_SCALE, then 1.
         """
-        self.api_key = load_api_key(api_key=api_key)
-        self.base_url = base_url
-        self.queue_url = queue_url
-        self.api_host = api_host
+        record = record or os.environ.get("FAL_RECORD")
+        replay = replay or os.environ.get("FAL_REPLAY")
+        self._recorder = None
+        self._replayer = None
+        if replay:
+            from .cassette import Replayer
+            if replay_scale is None:
+                replay_scale = float(os.environ.get("FAL_REPLAY_SCALE", "1"))
+            self._replayer = Replayer(replay, scale=replay_scale)
+        elif record:
+            from .cassette import CassetteWriter
+            self._recorder = CassetteWriter(record)
+            logger.info(f"Recording fal traffic to {record}")
+
+        try:
+            keys = [api_key] if api_key else load_api_keys(api_keys=api_keys)
+        except ValueError:
+            if not self._replayer:
+                raise
+            keys = ["replay"]
+        self.api_key = keys[0]
+        self.key_pool = None
+        self._request_log = None
+        if len(keys) > 1:
+            if key_concurrency is None:
+                key_concurrency = int(os.environ.get("FAL_KEY_CONCURRENCY", "0"))
+            if key_rate is None:
+                key_rate = float(os.environ.get("FAL_KEY_RATE", "0"))
+            self.key_pool = KeyPool(keys, max_concurrency=key_concurrency, rate=key_rate)
+            self._request_log = RequestKeyLog()
+            logger.info(f"Using a pool of {len(keys)} API keys")
+        self.base_url = base_url or os.environ.get("FAL_RUN_HOST")
+        self.queue_url = queue_url or os.environ.get("FAL_QUEUE_RUN_HOST")
+        self.api_host = api_host or os.environ.get("FAL_API_HOST", "api.fal.ai")
+        self.timeout = timeout
+        self.deadline = deadline
+        self.lane = lane or os.environ.get("FAL_LANE", BULK)
+        self.tenant = tenant or os.environ.get("FAL_TENANT", "default")
+        if max_in_flight is None:
+            max_in_flight = int(os.environ.get("FAL_MAX_IN_FLIGHT", "0"))
+        self.scheduler = None
+        if max_in_flight > 0:
+            self.scheduler = Scheduler(max_in_flight, weights=parse_weights(os.environ.get("FAL_TENANT_WEIGHTS")))
+        self._fal_clients: Dict[str, Any] = {}
+        self._fal_lock = threading.Lock()
+        self._request_keys: Dict[str, str] = {}
+
+        if coalesce is None:
+            coalesce = os.environ.get("FAL_COALESCE", "") in ("1", "true", "yes")
+        self._single_flight = SingleFlight() if coalesce else None
+        self._inflight_submits: Dict[str, str] = {}
+        self._submit_keys: Dict[str, str] = {}
+        self._submit_lock = threading.Lock()
         self._configure_fal_client()
 
     def _configure_fal_client(self):
-        """Configure fal_client with API key and optional custom URLs"""
-        os.environ['FAL_KEY'] = self.api_key
+        """Record per-instance host overrides for this client's fal_client"""
+        if self.base_url and self.queue_url is None:
+            scheme, separator, host = self.base_url.rpartition("://")
+            self.queue_url = f"{scheme}{separator}queue.{host}"
 
-        # Configure custom base URL if provided
         if self.base_url:
-            os.environ['FAL_RUN_HOST'] = self.base_url
-            logger.info(f"Using custom FAL_RUN_HOST: {self.base_url}")
-
-        # Configure custom queue URL if provided
+            logger.info(f"Using custom run host: {self.base_url}")
         if self.queue_url:
-            os.environ['FAL_QUEUE_RUN_HOST'] = self.queue_url
-            logger.info(f"Using custom FAL_QUEUE_RUN_HOST: {self.queue_url}")
+            logger.info(f"Using custom queue host: {self.queue_url}")
+
+    @property
+    def fal(self):
+        """This client's own fal_client.SyncClient for its primary key, built on first use"""
+        return self._fal_for(self.api_key)
+
+    def _fal_for(self, key: str):
+        """SyncClient for one key of this client (one connection pool per key)"""
+        if self._replayer is not None:
+            return self._replayer
+        fal = self._fal_clients.get(key)
+        if fal is None:
+            with self._fal_lock:
+                fal = self._fal_clients.get(key)
+                if fal is None:
+                    fal = build_sync_client(
+                        key,
+                        timeout=self.timeout,
+                        host_overrides=self._host_overrides()
+                    )
+                    if self._recorder is not None:
+                        from .cassette import RecordingFal
+                        fal = RecordingFal(fal, self._recorder, status_to_dict)
+                    self._fal_clients[key] = fal
+        return fal
+
+    @contextmanager
+    def _fal_lease(self):
+        """
+        Yield (key, SyncClient) for one request.
+
+        With a key pool this waits for a key with free capacity and reports
+        the outcome (HTTP status on failure) back to the pool's health tracking.
+        """
+        if self.key_pool is None:
+            yield self.api_key, self.fal
+            return
+
+        with self.key_pool.lease() as key:
+            yield key, self._fal_for(key)
+
+    def _remember_request_key(self, request_id: str, key: str):
+        """Note which pooled key submitted request_id, in memory and on disk"""
+        if self.key_pool is None:
+            return
+        self._request_keys[request_id] = key
+        self._request_log.record(request_id, key)
+
+    def _key_for_request(self, request_id: str) -> str:
+        """
+        The key that submitted request_id (queue results are per account).
 
-        # Configure custom API host if provided
-        if self.api_host:
-            os.environ['FAL_API_HOST'] = self.api_host
-            logger.info(f"Using custom FAL_API_HOST: {self.api_host}")
+        Raises:
+            ValueError: A key pool is configured but the submitting key is unknown
+                        or no longer configured
+        """
+        if self.key_pool is None:
+            return self.api_key
+        key = self._request_keys.get(request_id)
+        if key is not None:
+            return key
+        submitted_by = self._request_log.lookup(request_id)
+        if submitted_by is None:
+            raise ValueError(
+                f"Unknown submitting key for request {request_id}: it was not submitted through "
+                f"this key pool. Set FAL_KEY to the key that submitted it."
+            )
+        self.adopt_request(request_id, submitted_by)
+        return self._request_keys[request_id]
+
+    def request_key_id(self, request_id: str) -> str:
+        """key_id of the key that submitted request_id; store it to follow the request up from elsewhere"""
+        return key_id(self._key_for_request(request_id))
+
+    def adopt_request(self, request_id: str, submitted_by: str):
+        """
+        Route later status/result/cancel calls for request_id through the
+        configured key whose key_id is submitted_by.
+
+        Raises:
+            ValueError: No configured key has that key_id
+        """
+        for key in (self.key_pool.keys if self.key_pool is not None else [self.api_key]):
+            if key_id(key) == submitted_by:
+                if self.key_pool is not None:
+                    self._request_keys[request_id] = key
+                return
+        raise ValueError(
+            f"Request {request_id} was submitted with an API key that is not configured here "
+            f"(key id {submitted_by})"
+        )
+
+    def _fal_for_request(self, request_id: str):
+        """SyncClient for the key that submitted request_id"""
+        return self._fal_for(self._key_for_request(request_id))
+
+    def _host_overrides(self) -> Dict[str, str]:
+        """Map fal_client's default hosts to this instance's custom hosts"""
+        if not self.base_url and not self.queue_url:
+            return {}
+
+        fal_client = _import_fal_client()
+        overrides = {}
+        if self.base_url:
+            overrides[_default_host(fal_client, "RUN_URL_FORMAT", "fal.run")] = self.base_url
+        if self.queue_url:
+            overrides[_default_host(fal_client, "QUEUE_URL_FORMAT", "queue.fal.run")] = self.queue_url
+        return {source: target for source, target in overrides.items() if source != target}
+
+    def upload_file(self, file_path: str) -> str:
+        """Upload a local file to fal.ai storage with this client's key and return its URL"""
+        logger.info(f"Uploading {file_path}")
+        with span("fal.upload", kind="client", **{"file.name": os.path.basename(file_path),
+                                                  "file.size": os.path.getsize(file_path)}) as current:
+            url = self.fal.upload_file(file_path)
+            current.set(**{"url.full": url if not url.startswith("data:") else "data:"})
+            return url
 
     def _validate_endpoint_id(self, endpoint_id: str):
         """Validate endpoint ID format"""
@@ -67,58 +407,190 @@ class FalAPIClient:
         if '..' in endpoint_id:
             raise ValueError("endpoint_id cannot contain '..'")
 
-    def run_model(self, endpoint_id: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def run_model(
+        self,
+        endpoint_id: str,
+        input_data: Dict[str, Any],
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        lane: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Execute a model using official queue system with fal_client.subscribe()
+        Execute a model using official queue system with fal_client
 
-        This method uses the official fal_client SDK which automatically:
-        - Submits the request to the queue
-        - Polls for completion
-        - Returns the final result
+        This method uses the official fal_client SDK to:
+        - Submit the request to the queue
+        - Poll for completion until the deadline
+        - Return the final result
 
         Args:
             endpoint_id: Model endpoint ID (e.g., 'fal-ai/flux/dev')
             input_data: Model input parameters
+            on_event: Optional callback receiving {"status": "SUBMITTED", "request_id": ...}
+                      once enqueued, then every queue status as a dict (see status_to_dict)
+            timeout: Seconds to wait for this job before cancelling it
+            deadline: Wall-clock time (epoch seconds) to give up at; the earliest of
+                      this, timeout and the client's deadline applies
+            lane: Scheduler lane, 'interactive' or 'bulk' (default: the client's)
+            tenant: Scheduler fair-share group (default: the client's)
 
         Returns:
             Model output as dictionary
+
+        Raises:
+            JobTimeoutError: The job was still queued or running at the deadline
         """
         self._validate_endpoint_id(endpoint_id)
 
-        # Import fal_client here to avoid import at module level
-        try:
-            import fal_client
-        except ImportError:
-            raise ImportError(
-                "fal_client is not installed. "
-                "Please run: uv pip install -r requirements.txt"
-            )
+        limits = [d for d in (deadline, self.deadline) if d is not None]
+        if timeout is not None:
+            limits.append(time.time() + timeout)
+        deadline = min(limits) if limits else None
+
+        def run(emit):
+            if self.scheduler is None:
+                return self._run_model(endpoint_id, input_data, emit, deadline)
+            try:
+                with span("schedule.wait", lane=lane or self.lane, tenant=tenant or self.tenant):
+                    ticket = self.scheduler.acquire(lane or self.lane, tenant or self.tenant, deadline)
+            except TimeoutError:
+                raise JobTimeoutError(endpoint_id)
+            try:
+                return self._run_model(endpoint_id, input_data, emit, deadline)
+            finally:
+                self.scheduler.release(ticket)
+
+        with span("fal.run", **{"fal.endpoint": endpoint_id, "fal.deadline": deadline}) as current:
+            if self._single_flight is None:
+                return run(on_event)
+
+            # Identical requests already in flight in the same lane share that job's result and
+            # events (and slot); a joining caller still gives up at its own deadline
+            try:
+                result, shared = self._single_flight.do(
+                    ("run", request_key(endpoint_id, input_data), lane or self.lane),
+                    run,
+                    listener=on_event,
+                    timeout=None if deadline is None else max(0.0, deadline - time.time())
+                )
+            except TimeoutError as e:
+                if isinstance(e, JobTimeoutError):
+                    raise
+                logger.error(f"{endpoint_id}: {e}")
+                raise JobTimeoutError(endpoint_id)
+            current.set(**{"fal.coalesced": shared})
+            if shared:
+                logger.info(f"Shared result of an identical in-flight request to {endpoint_id}")
+            return result
+
+    def _run_model(
+        self,
+        endpoint_id: str,
+        input_data: Dict[str, Any],
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Submit, wait (until deadline) and return the result of one fal job (no coalescing)"""
+        if deadline is not None and time.time() >= deadline:
+            raise JobTimeoutError(endpoint_id)
 
         logger.info(f"Submitting request to {endpoint_id} via queue system")
 
+        progress = ProgressSampler()
+
         def on_queue_update(update):
-            """Handle queue status updates"""
-            if isinstance(update, fal_client.InProgress):
-                # Log any progress messages
-                for log in update.logs:
-                    logger.info(f"Progress: {log.get('message', '')}")
+            """Handle queue status updates; returns the status as a dict"""
+            status = status_to_dict(update)
+            if on_event:
+                on_event(status)
+
+            if status.get("status") == "IN_PROGRESS":
+                # Log new progress messages, sampled so long jobs don't flood the log
+                for log in status.get("logs") or []:
+                    should_log, suppressed = progress.sample(log)
+                    if should_log:
+                        message = log.get('message', '') if isinstance(log, dict) else str(log)
+                        if suppressed:
+                            message += f" (+{suppressed} more)"
+                        logger.info(f"Progress: {message}", extra={"endpoint_id": endpoint_id})
+            return status
 
         try:
-            # Use subscribe() which handles queue submission, polling, and result retrieval
-            result = fal_client.subscribe(
-                endpoint_id,
-                arguments=input_data,
-                with_logs=True,
-                on_queue_update=on_queue_update
-            )
+            # Same steps as fal.subscribe(), with a deadline check between polls
+            with self._fal_lease() as (key, fal):
+                with span("fal.submit", kind="client", **{"fal.endpoint": endpoint_id}) as current:
+                    handle = fal.submit(endpoint_id, arguments=input_data)
+                    current.set(**{"fal.request_id": handle.request_id})
+                self._remember_request_key(handle.request_id, key)
+                if on_event:
+                    on_event({"status": "SUBMITTED", "request_id": handle.request_id})
+
+                polls = 0
+                while True:
+                    polls += 1
+                    with span("fal.status", kind="client", **{"fal.request_id": handle.request_id,
+                                                              "fal.poll": polls}) as current:
+                        status = on_queue_update(handle.status(with_logs=True))
+                        current.set(**{"fal.status": status.get("status"),
+                                       "fal.queue_position": status.get("position")})
+                    if status.get("status") == "COMPLETED":
+                        break
+                    if deadline is not None and time.time() >= deadline:
+                        raise JobTimeoutError(
+                            endpoint_id, handle.request_id,
+                            cancelled=self._cancel_quietly(fal, endpoint_id, handle.request_id)
+                        )
+                    time.sleep(POLL_INTERVAL)
+
+                with span("fal.result", kind="client", **{"fal.request_id": handle.request_id}):
+                    result = handle.get()
 
             logger.info("Request completed successfully")
             return result
 
+        except JobTimeoutError as e:
+            logger.error(str(e))
+            raise
+
         except Exception as e:
             logger.error(f"API Error: {str(e)}")
             raise Exception(f"Failed to execute model {endpoint_id}: {str(e)}")
 
+    def _cancel_quietly(self, fal, endpoint_id: str, request_id: str) -> bool:
+        """Ask the queue to cancel request_id; False if the request could not be cancelled"""
+        try:
+            with span("fal.cancel", kind="client", **{"fal.request_id": request_id}):
+                fal.cancel(endpoint_id, request_id)
+            logger.info(f"Cancelled request {request_id}")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not cancel request {request_id}: {e}")
+            return False
+
+    def cancel(self, endpoint_id: str, request_id: str):
+        """
+        Cancel a queued or running request
+
+        Args:
+            endpoint_id: Model endpoint ID
+            request_id: Request ID from submit_async() or a SUBMITTED event
+        """
+        self._validate_endpoint_id(endpoint_id)
+
+        logger.info(f"Cancelling request {request_id}")
+
+        try:
+            with span("fal.cancel", kind="client", **{"fal.endpoint": endpoint_id, "fal.request_id": request_id}):
+                self._fal_for_request(request_id).cancel(endpoint_id, request_id)
+            self._request_keys.pop(request_id, None)
+            self._release_submit(request_id)
+
+        except Exception as e:
+            logger.error(f"Cancel Error: {str(e)}")
+            raise Exception(f"Failed to cancel request {request_id}: {str(e)}")
+
     def submit_async(self, endpoint_id: str, input_data: Dict[str, Any], webhook_url: Optional[str] = None) -> str:
         """
         Submit a request to the queue and return request_id for later retrieval
@@ -135,24 +607,50 @@ class FalAPIClient:
         """
         self._validate_endpoint_id(endpoint_id)
 
-        try:
-            import fal_client
-        except ImportError:
-            raise ImportError(
-                "fal_client is not installed. "
-                "Please run: uv pip install -r requirements.txt"
-            )
+        if self._single_flight is None:
+            return self._submit(endpoint_id, input_data, webhook_url)
+
+        key = request_key(endpoint_id, input_data, webhook_url)
+        with self._submit_lock:
+            request_id = self._inflight_submits.get(key)
+        if request_id:
+            logger.info(f"Joining in-flight request {request_id} for {endpoint_id}")
+            return request_id
+
+        def submit(_emit):
+            request_id = self._submit(endpoint_id, input_data, webhook_url)
+            # Remember the job until its result is fetched or it reaches a final state
+            with self._submit_lock:
+                self._inflight_submits[key] = request_id
+                self._submit_keys[request_id] = key
+            return request_id
+
+        request_id, _ = self._single_flight.do(("submit", key), submit)
+        return request_id
 
+    def _release_submit(self, request_id: str):
+        """Stop routing identical submits to a request that is no longer in flight"""
+        with self._submit_lock:
+            key = self._submit_keys.pop(request_id, None)
+            if key and self._inflight_submits.get(key) == request_id:
+                del self._inflight_submits[key]
+
+    def _submit(self, endpoint_id: str, input_data: Dict[str, Any], webhook_url: Optional[str] = None) -> str:
+        """Submit one job to the queue (no coalescing)"""
         logger.info(f"Submitting async request to {endpoint_id}")
 
         try:
-            handler = fal_client.submit(
-                endpoint_id,
-                arguments=input_data,
-                webhook_url=webhook_url
-            )
+            with span("fal.submit", kind="client", **{"fal.endpoint": endpoint_id}) as current, \
+                    self._fal_lease() as (key, fal):
+                handler = fal.submit(
+                    endpoint_id,
+                    arguments=input_data,
+                    webhook_url=webhook_url
+                )
+                current.set(**{"fal.request_id": handler.request_id})
 
             request_id = handler.request_id
+            self._remember_request_key(request_id, key)
             logger.info(f"Request submitted with ID: {request_id}")
             return request_id
 
@@ -173,18 +671,13 @@ class FalAPIClient:
         """
         self._validate_endpoint_id(endpoint_id)
 
-        try:
-            import fal_client
-        except ImportError:
-            raise ImportError(
-                "fal_client is not installed. "
-                "Please run: uv pip install -r requirements.txt"
-            )
-
         logger.info(f"Fetching result for request {request_id}")
 
         try:
-            result = fal_client.result(endpoint_id, request_id)
+            with span("fal.result", kind="client", **{"fal.endpoint": endpoint_id, "fal.request_id": request_id}):
+                result = self._fal_for_request(request_id).result(endpoint_id, request_id)
+            self._request_keys.pop(request_id, None)
+            self._release_submit(request_id)
             logger.info("Result retrieved successfully")
             return result
 
@@ -206,62 +699,15 @@ class FalAPIClient:
         self._validate_endpoint_id(endpoint_id)
 
         try:
-            import fal_client
-        except ImportError:
-            raise ImportError(
-                "fal_client is not installed. "
-                "Please run: uv pip install -r requirements.txt"
-            )
-
-        try:
-            from fal_client import Queued, InProgress, Completed
-            try:
-                from fal_client import Failed, Canceled, Cancelled
-            except Exception:
-                Failed = Canceled = Cancelled = None
-
-            status = fal_client.status(endpoint_id, request_id, with_logs=True)
-
-            # Handle both dict (from mocks) and object (from real SDK) responses
-            if isinstance(status, dict):
-                return status
-
-            # Convert Status object to dictionary based on type
-            if isinstance(status, Completed):
-                return {
-                    "status": "COMPLETED",
-                    "logs": status.logs or [],
-                    "metrics": status.metrics if hasattr(status, 'metrics') else {}
-                }
-            elif isinstance(status, InProgress):
-                return {
-                    "status": "IN_PROGRESS",
-                    "logs": status.logs or []
-                }
-            elif isinstance(status, Queued):
-                return {
-                    "status": "IN_QUEUE",
-                    "position": status.position if hasattr(status, 'position') else 0
-                }
-            elif Failed is not None and isinstance(status, Failed):
-                return {
-                    "status": "FAILED",
-                    "logs": status.logs or [],
-                    "error": getattr(status, "error", None)
-                }
-            elif (Canceled is not None and isinstance(status, Canceled)) or (
-                Cancelled is not None and isinstance(status, Cancelled)
-            ):
-                return {
-                    "status": "CANCELED",
-                    "logs": status.logs or []
-                }
-            else:
-                # Fallback for unknown status types
-                return {
-                    "status": "UNKNOWN",
-                    "logs": []
-                }
+            with span("fal.status", kind="client", **{"fal.endpoint": endpoint_id,
+                                                      "fal.request_id": request_id}) as current:
+                status = status_to_dict(
+                    self._fal_for_request(request_id).status(endpoint_id, request_id, with_logs=True)
+                )
+                current.set(**{"fal.status": status.get("status"), "fal.queue_position": status.get("position")})
+            if status.get("status") in ("COMPLETED", "FAILED", "CANCELED"):
+                self._release_submit(request_id)
+            return status
 
         except Exception as e:
             logger.error(f"Status Error: {str(e)}")
@@ -282,6 +728,7 @@ class FalAPIClient:
         import json
         import urllib.request
         import urllib.parse
+        from .http_utils import urlopen_with_retries
 
         params = {
             "status": status,
@@ -294,11 +741,13 @@ class FalAPIClient:
         if cursor:
             params["cursor"] = cursor
 
+        if self._replayer is not None:
+            with span("fal.discover", **{"fal.category": category, "fal.cursor": cursor}):
+                return self._replayer.discover(params)
+
         query_string = urllib.parse.urlencode(params)
 
-        # Use custom API host if configured, otherwise default to api.fal.ai
-        api_host = os.environ.get("FAL_API_HOST", "api.fal.ai")
-        url = f"https://{api_host}/v1/models?{query_string}"
+        url = f"https://{self.api_host}/v1/models?{query_string}"
 
         headers = {
             "Authorization": f"Key {self.api_key}",
@@ -308,8 +757,14 @@ class FalAPIClient:
         req = urllib.request.Request(url, headers=headers, method='GET')
 
         try:
-            with urlopen_with_retries(req, timeout=30) as response:
-                return json.loads(response.read().decode('utf-8'))
+            started = time.time()
+            with span("fal.discover", kind="client", **{"fal.category": category, "fal.cursor": cursor}) as current:
+                with urlopen_with_retries(req, timeout=30) as response:
+                    page = json.loads(response.read().decode('utf-8'))
+                current.set(**{"fal.models": len(page.get("models") or [])})
+            if self._recorder is not None:
+                self._recorder.op("discover", started, params=params, response=page)
+            return page
         except urllib.error.HTTPError as e:
             error_body = e.read().decode('utf-8')
             raise Exception(f"API Discovery Error {e.code}: {error_body}")
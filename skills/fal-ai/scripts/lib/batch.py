@@ -0,0 +1,342 @@
+"""Lease-based batch execution shared by several worker processes through one SQLite job table"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .logging_config import setup_logging
+from .tracing import span
+
+logger = setup_logging(__name__)
+
+PENDING = "pending"
+CLAIMED = "claimed"      # Leased, not yet submitted to fal
+SUBMITTED = "submitted"  # Leased, request_id recorded; waiting on fal
+DONE = "done"
+FAILED = "failed"
+POLL_ERRORS_TO_FAIL = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    endpoint TEXT NOT NULL,
+    input TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL,
+    request_id TEXT,
+    key_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    url TEXT,
+    result TEXT,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until);
+"""
+
+
+def read_manifest(path: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """(id, endpoint, input) per JSONL line {"id"?, "endpoint", "input"}; id defaults to the line number"""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if not job.get("endpoint") or not isinstance(job.get("input"), dict):
+                raise ValueError(f"{path}:{number}: job needs an 'endpoint' and an 'input' object")
+            yield str(job.get("id", number)), job["endpoint"], job["input"]
+
+
+class JobTable:
+    """
+    SQLite job table with leases.
+
+    Every state change is one short IMMEDIATE transaction, and updates by a
+    worker are fenced on (owner, state) so a worker whose lease expired and
+    was re-claimed elsewhere can no longer overwrite the job. The database
+    must live on a filesystem with working POSIX locks (local disks, and
+    network filesystems mounted with locking).
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "key_id" not in columns:
+                # Tables created before submitting keys were recorded
+                db.execute("ALTER TABLE jobs ADD COLUMN key_id TEXT")
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """One write transaction on a fresh connection (connections are not shared across threads)"""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def load(self, jobs: Iterator[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Insert jobs not already in the table (every node may load the same manifest)"""
+        with self._transaction() as db:
+            start = db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (id, seq, endpoint, input, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((job_id, seq, endpoint, json.dumps(data), time.time())
+                 for seq, (job_id, endpoint, data) in enumerate(jobs))
+            )
+            return db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - start
+
+    def claim(self, owner: str, lease: float) -> Optional[Dict[str, Any]]:
+        """Lease the next pending job, or one whose lease expired (its worker died)"""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE state = ? OR (state IN (?, ?) AND lease_until < ?) "
+                "ORDER BY state = ?, seq LIMIT 1",
+                (PENDING, CLAIMED, SUBMITTED, now, PENDING)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["state"] != PENDING:
+                logger.info(f"Re-claiming job {row['id']} from expired lease of {row['owner']}")
+            # A job that already has a request_id stays SUBMITTED: it is resumed, never resubmitted
+            state = SUBMITTED if row["request_id"] else CLAIMED
+            attempts = row["attempts"] if row["request_id"] else row["attempts"] + 1
+            db.execute(
+                "UPDATE jobs SET state = ?, owner = ?, lease_until = ?, attempts = ?, updated_at = ? WHERE id = ?",
+                (state, owner, now + lease, attempts, now, row["id"])
+            )
+        job = dict(row)
+        job.update(state=state, owner=owner, attempts=attempts, input=json.loads(row["input"]))
+        return job
+
+    def _fenced(self, sql: str, params: tuple, job_id: str, owner: str) -> bool:
+        """Run an UPDATE only while owner still holds the lease; False if it was lost"""
+        with self._transaction() as db:
+            cursor = db.execute(
+                f"{sql} WHERE id = ? AND owner = ? AND state IN (?, ?)",
+                params + (job_id, owner, CLAIMED, SUBMITTED)
+            )
+            return cursor.rowcount == 1
+
+    def record_submission(self, job_id: str, owner: str, request_id: str, key_id: Optional[str] = None) -> bool:
+        """Store the fal request and the key_id of the key that submitted it (queues are per account)"""
+        return self._fenced("UPDATE jobs SET state = ?, request_id = ?, key_id = ?, updated_at = ?",
+                            (SUBMITTED, request_id, key_id, time.time()), job_id, owner)
+
+    def renew(self, job_ids: List[str], owner: str, lease: float) -> List[str]:
+        """Extend the leases owner holds; returns the ids whose lease was lost"""
+        lost = []
+        now = time.time()
+        with self._transaction() as db:
+            for job_id in job_ids:
+                cursor = db.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND state IN (?, ?)",
+                    (now + lease, job_id, owner, CLAIMED, SUBMITTED)
+                )
+                if cursor.rowcount != 1:
+                    lost.append(job_id)
+        return lost
+
+    def complete(self, job_id: str, owner: str, url: Optional[str], result: Any) -> bool:
+        return self._fenced("UPDATE jobs SET state = ?, url = ?, result = ?, error = NULL, owner = NULL, "
+                            "lease_until = NULL, updated_at = ?",
+                            (DONE, url, json.dumps(result), time.time()), job_id, owner)
+
+    def fail(self, job_id: str, owner: str, error: str, retry: bool) -> bool:
+        """Record a failure; with retry the job goes back to pending and will be submitted afresh"""
+        return self._fenced("UPDATE jobs SET state = ?, error = ?, request_id = NULL, key_id = NULL, owner = NULL, "
+                            "lease_until = NULL, updated_at = ?",
+                            (PENDING if retry else FAILED, error, time.time()), job_id, owner)
+
+    def counts(self) -> Dict[str, int]:
+        db = self._connect()
+        try:
+            rows = db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        finally:
+            db.close()
+        counts = {state: 0 for state in (PENDING, CLAIMED, SUBMITTED, DONE, FAILED)}
+        counts.update({state: n for state, n in rows})
+        return counts
+
+
+class BatchWorker:
+    """
+    Pull jobs from a JobTable and run them with submit_async/get_result.
+
+    The request_id is written to the table as soon as fal accepts a job and
+    before any waiting, so a worker that re-claims the job after a crash
+    resumes the same fal request instead of submitting it again. With a key
+    pool the submitting key's key_id is stored next to it, and the resuming
+    worker follows the request up with that key. (A crash
+    between fal accepting the submit and the row being updated can still
+    leave one orphaned request; that window is a single local write.)
+    A heartbeat thread renews the leases of jobs in progress; a job whose
+    lease was lost is abandoned to its new owner.
+    """
+
+    def __init__(
+        self,
+        client,
+        table: JobTable,
+        concurrency: int = 4,
+        lease: float = 60.0,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        adapter=None,
+        on_finish: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.client = client
+        self.table = table
+        self.concurrency = max(1, concurrency)
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self.adapter = adapter
+        self.on_finish = on_finish
+        self.owner = f"{socket.gethostname()}.{os.getpid()}"
+        self._active: Dict[str, threading.Event] = {}  # job id -> set when its lease is lost
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease / 3):
+            with self._lock:
+                ids = list(self._active)
+            if not ids:
+                continue
+            try:
+                lost = self.table.renew(ids, self.owner, self.lease)
+            except sqlite3.Error as e:
+                logger.warning(f"Lease renewal failed: {e}")
+                continue
+            for job_id in lost:
+                logger.warning(f"Lost lease on job {job_id}; abandoning it")
+                with self._lock:
+                    if job_id in self._active:
+                        self._active[job_id].set()
+
+    def _wait(self, job: Dict[str, Any], lost: threading.Event) -> Optional[Dict[str, Any]]:
+        """Poll the recorded request until it completes; None if the lease was lost meanwhile"""
+        endpoint_id, request_id = job["endpoint"], job["request_id"]
+        errors = 0
+        while not lost.is_set():
+            try:
+                status = self.client.check_status(endpoint_id, request_id)
+                errors = 0
+            except Exception as e:
+                # A flaky poll must not turn into a resubmission
+                errors += 1
+                if errors >= POLL_ERRORS_TO_FAIL:
+                    raise
+                logger.warning(f"Status poll for job {job['id']} failed ({errors}/{POLL_ERRORS_TO_FAIL}): {e}")
+                lost.wait(self.poll_interval)
+                continue
+            state = status.get("status")
+            if state == "COMPLETED":
+                return self.client.get_result(endpoint_id, request_id)
+            if state in ("FAILED", "CANCELED"):
+                raise RuntimeError(f"Request {request_id} {state.lower()}: {status.get('error') or ''}".strip())
+            lost.wait(self.poll_interval)
+        return None
+
+    def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        lost = threading.Event()
+        with self._lock:
+            self._active[job_id] = lost
+        event = {"job": job_id, "attempts": job["attempts"]}
+        try:
+            if not job["request_id"]:
+                job["request_id"] = self.client.submit_async(job["endpoint"], job["input"])
+                submitted_by = self.client.request_key_id(job["request_id"])
+                if not self.table.record_submission(job_id, self.owner, job["request_id"], submitted_by):
+                    logger.warning(f"Lease on job {job_id} lost before its submission was recorded")
+                    return
+            else:
+                logger.info(f"Resuming job {job_id} at request {job['request_id']}")
+                if job.get("key_id"):
+                    self.client.adopt_request(job["request_id"], job["key_id"])
+            event["request_id"] = job["request_id"]
+
+            result = self._wait(job, lost)
+            if result is None:
+                return
+
+            url = None
+            if self.adapter is not None:
+                with self._lock:
+                    url = self.adapter.extract_result(result, job["endpoint"])
+            if self.table.complete(job_id, self.owner, url, result):
+                self._finish({**event, "status": DONE, "url": url})
+
+        except Exception as e:
+            retry = job["attempts"] < self.max_attempts
+            if retry and job["request_id"]:
+                # The job will be submitted afresh; don't leave the old request running
+                try:
+                    self.client.cancel(job["endpoint"], job["request_id"])
+                except Exception:
+                    pass
+            if self.table.fail(job_id, self.owner, str(e), retry):
+                logger.error(f"Job {job_id} failed (attempt {job['attempts']}/{self.max_attempts}): {e}")
+                self._finish({**event, "status": "retry" if retry else FAILED, "error": str(e)})
+        finally:
+            with self._lock:
+                self._active.pop(job_id, None)
+
+    def _finish(self, event: Dict[str, Any]):
+        if self.on_finish:
+            self.on_finish(event)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job = self.table.claim(self.owner, self.lease)
+            if job is None:
+                counts = self.table.counts()
+                if not (counts[PENDING] or counts[CLAIMED] or counts[SUBMITTED]):
+                    return
+                # Others hold the remaining jobs; wait in case one of their leases expires
+                self._stop.wait(min(self.lease / 3, 5.0))
+                continue
+            with span("batch.job", job=job["id"], attempt=job["attempts"], **{"fal.endpoint": job["endpoint"],
+                      "fal.request_id": job["request_id"]}):
+                self._run(job)
+
+    def stop(self):
+        """Stop claiming; jobs in progress keep their lease until it expires or they finish"""
+        self._stop.set()
+
+    def run(self) -> Dict[str, int]:
+        """Work until no job is pending or leased anywhere; returns table counts"""
+        heartbeat = threading.Thread(target=self._heartbeat, name="batch-heartbeat", daemon=True)
+        heartbeat.start()
+        workers = [threading.Thread(target=self._loop, name=f"batch-{i}") for i in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self._stop.set()
+        return self.table.counts()
@@ -0,0 +1,338 @@
+"""Record fal traffic (with timings) into cassette files and replay it offline"""
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from .logging_config import setup_logging
+from .singleflight import request_key
+
+logger = setup_logging(__name__)
+
+CASSETTE_VERSION = 1
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _fingerprint(endpoint_id: str, arguments: Dict[str, Any]) -> str:
+    return request_key(endpoint_id, arguments)[:16]
+
+
+class CassetteWriter:
+    """
+    Append interactions to a JSONL cassette (gzip when the path ends in .gz).
+
+    Lines: a header, then one object per operation with "op", "t" (seconds
+    since recording started) and "latency" (seconds the call took). Status
+    polls are stored only when the status changed, with "at" = seconds
+    since the job's submit, which is all replay needs to rebuild a job's
+    timeline under any polling interval.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.time()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = _open(path, "w")
+        atexit.register(self.close)  # A gzip cassette is only readable once closed
+        self.write({"cassette": CASSETTE_VERSION, "recorded_at": self.started})
+
+    def write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def op(self, op: str, started: float, **fields: Any):
+        """Write one operation that began at wall time started and ended now"""
+        now = time.time()
+        self.write({"op": op, "t": round(started - self.started, 4), "latency": round(now - started, 4), **fields})
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class _Job:
+    """Recording state of one submitted request"""
+
+    def __init__(self, endpoint_id: str, submitted_at: float):
+        self.endpoint_id = endpoint_id
+        self.submitted_at = submitted_at
+        self.last = None
+        self.logs = 0
+
+
+class RecordingFal:
+    """Wrap a fal_client.SyncClient, writing every call the client makes into a cassette"""
+
+    def __init__(self, fal, writer: CassetteWriter, to_dict: Callable[[Any], Dict[str, Any]]):
+        self._fal = fal
+        self._writer = writer
+        self._to_dict = to_dict
+        self._jobs: Dict[str, _Job] = {}
+
+    def submit(self, application: str, arguments: Dict[str, Any], **kwargs: Any):
+        started = time.time()
+        handle = self._fal.submit(application, arguments=arguments, **kwargs)
+        self._jobs[handle.request_id] = _Job(application, started)
+        self._writer.op("submit", started, endpoint=application, request_id=handle.request_id,
+                        fingerprint=_fingerprint(application, arguments))
+        return _Handle(self, application, handle.request_id)
+
+    def status(self, application: str, request_id: str, *, with_logs: bool = False):
+        started = time.time()
+        try:
+            status = self._fal.status(application, request_id, with_logs=with_logs)
+        except Exception as e:
+            self._writer.op("status", started, request_id=request_id, error=str(e))
+            raise
+        as_dict = self._to_dict(status)
+        job = self._jobs.setdefault(request_id, _Job(application, started))
+        signature = (as_dict.get("status"), as_dict.get("position"), len(as_dict.get("logs") or []))
+        if signature != job.last:
+            job.last = signature
+            # Logs are cumulative; store only the lines added since the last entry
+            logs = list(as_dict.get("logs") or [])
+            stored = dict(as_dict, logs=logs[job.logs:]) if "logs" in as_dict else as_dict
+            self._writer.op("status", started, request_id=request_id,
+                            at=round(time.time() - job.submitted_at, 4), status=stored, logs_from=job.logs)
+            job.logs = max(job.logs, len(logs))
+        return status
+
+    def result(self, application: str, request_id: str):
+        started = time.time()
+        try:
+            result = self._fal.result(application, request_id)
+        except Exception as e:
+            self._writer.op("result", started, request_id=request_id, error=str(e))
+            raise
+        self._writer.op("result", started, request_id=request_id, result=result)
+        self._jobs.pop(request_id, None)
+        return result
+
+    def cancel(self, application: str, request_id: str):
+        started = time.time()
+        self._fal.cancel(application, request_id)
+        self._writer.op("cancel", started, request_id=request_id)
+
+    def upload_file(self, path: str) -> str:
+        started = time.time()
+        url = self._fal.upload_file(path)
+        self._writer.op("upload", started, name=os.path.basename(path), size=os.path.getsize(path), url=url)
+        return url
+
+
+class _Handle:
+    """Request handle (iter_events / get / cancel) routed through a recording or replaying client"""
+
+    def __init__(self, client, application: str, request_id: str):
+        self.client = client
+        self.application = application
+        self.request_id = request_id
+
+    def status(self, *, with_logs: bool = False):
+        return self.client.status(self.application, self.request_id, with_logs=with_logs)
+
+    def iter_events(self, *, with_logs: bool = False, interval: float = 0.1):
+        while True:
+            status = self.status(with_logs=with_logs)
+            yield status
+            if self.client._to_dict(status).get("status") == "COMPLETED":
+                break
+            time.sleep(interval)
+
+    def get(self):
+        return self.client.result(self.application, self.request_id)
+
+    def cancel(self):
+        return self.client.cancel(self.application, self.request_id)
+
+
+class _RecordedJob:
+    def __init__(self, entry: Dict[str, Any]):
+        self.endpoint_id = entry["endpoint"]
+        self.request_id = entry["request_id"]
+        self.submit_latency = entry.get("latency", 0.0)
+        self.timeline: List[Dict[str, Any]] = []  # status entries ordered by "at"
+        self.logs: List[Any] = []  # Cumulative logs while loading
+        self.result: Optional[Dict[str, Any]] = None
+        self.started_at: Optional[float] = None  # Replay wall time of this job's submit
+
+    def completed_at(self) -> float:
+        for entry in self.timeline:
+            if entry.get("status", {}).get("status") == "COMPLETED":
+                return entry["at"]
+        return self.timeline[-1]["at"] if self.timeline else 0.0
+
+
+class Replayer:
+    """
+    Serve a cassette back in place of fal_client, with no network.
+
+    Submits are matched to recorded ones by endpoint and input fingerprint
+    (then, with a warning, by endpoint alone, in recorded order). Each job
+    replays its recorded status timeline against the replay clock, so a
+    different polling interval sees the same job durations; every call
+    sleeps for its recorded latency. scale multiplies all recorded times
+    (1 = original, 0.1 = ten times faster, 0 = no waiting).
+    """
+
+    def __init__(self, path: str, scale: float = 1.0):
+        self.path = path
+        self.scale = scale
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _RecordedJob] = {}
+        self._by_fingerprint: Dict[str, deque] = defaultdict(deque)
+        self._by_endpoint: Dict[str, deque] = defaultdict(deque)
+        self._used: set = set()
+        self._uploads: Dict[str, deque] = defaultdict(deque)
+        self._discovery: Dict[str, deque] = defaultdict(deque)
+        self._latency: Dict[str, List[float]] = defaultdict(list)
+        self._load()
+
+    def _load(self):
+        with _open(self.path, "r") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("cassette") != CASSETTE_VERSION:
+                raise ValueError(f"{self.path} is not a version {CASSETTE_VERSION} cassette")
+            for line in f:
+                entry = json.loads(line)
+                op = entry.get("op")
+                if op == "submit":
+                    job = _RecordedJob(entry)
+                    self._jobs[job.request_id] = job
+                    self._by_fingerprint[(job.endpoint_id, entry.get("fingerprint"))].append(job)
+                    self._by_endpoint[job.endpoint_id].append(job)
+                elif op == "status":
+                    self._latency["status"].append(entry.get("latency", 0.0))
+                    job = self._jobs.get(entry["request_id"])
+                    if job is not None and "at" in entry:
+                        if "logs" in entry["status"]:
+                            job.logs[entry.get("logs_from", 0):] = entry["status"]["logs"]
+                            entry["status"]["logs"] = list(job.logs)
+                        job.timeline.append(entry)
+                elif op == "result":
+                    job = self._jobs.get(entry["request_id"])
+                    if job is not None:
+                        job.result = entry
+                elif op == "upload":
+                    self._uploads[entry["name"]].append(entry)
+                elif op == "discover":
+                    self._discovery[json.dumps(entry["params"], sort_keys=True)].append(entry)
+                self._latency[op].append(entry.get("latency", 0.0))
+        for job in self._jobs.values():
+            job.timeline.sort(key=lambda e: e["at"])
+        logger.info(f"Replaying {len(self._jobs)} recorded jobs from {self.path} (scale {self.scale})")
+
+    def _sleep(self, seconds: float):
+        if self.scale and seconds > 0:
+            time.sleep(seconds * self.scale)
+
+    def _typical(self, op: str) -> float:
+        samples = sorted(self._latency.get(op) or [0.0])
+        return samples[len(samples) // 2]
+
+    def _job(self, request_id: str) -> _RecordedJob:
+        job = self._jobs.get(request_id)
+        if job is None:
+            raise LookupError(f"Cassette {self.path} has no request {request_id}")
+        with self._lock:
+            if job.started_at is None:
+                # Polled without a replayed submit (e.g. resumed batch job): start its clock now
+                job.started_at = time.time()
+        return job
+
+    def submit(self, application: str, arguments: Dict[str, Any], **kwargs: Any):
+        fingerprint = _fingerprint(application, arguments)
+        with self._lock:
+            job = self._take(self._by_fingerprint[(application, fingerprint)])
+            if job is None:
+                job = self._take(self._by_endpoint[application])
+                if job is None:
+                    raise LookupError(f"Cassette {self.path} has no unused submit for {application}")
+                logger.warning(f"No recorded submit with identical input for {application}; "
+                               f"replaying {job.request_id}")
+            self._used.add(job.request_id)
+        self._sleep(job.submit_latency)
+        job.started_at = time.time()
+        return _Handle(self, application, job.request_id)
+
+    def _take(self, queue: deque) -> Optional[_RecordedJob]:
+        while queue:
+            job = queue.popleft()
+            if job.request_id not in self._used:
+                return job
+        return None
+
+    def _elapsed(self, job: _RecordedJob) -> float:
+        """Seconds into the job's recorded timeline, on the scaled replay clock"""
+        elapsed = time.time() - job.started_at
+        return float("inf") if not self.scale else elapsed / self.scale
+
+    def status(self, application: str, request_id: str, *, with_logs: bool = False):
+        job = self._job(request_id)
+        self._sleep(self._typical("status"))
+        if not job.timeline:
+            return {"status": "COMPLETED", "logs": []}
+        elapsed = self._elapsed(job)
+        current = job.timeline[0]
+        for entry in job.timeline:
+            if entry["at"] > elapsed:
+                break
+            current = entry
+        status = dict(current["status"])
+        if not with_logs and "logs" in status:
+            status["logs"] = []
+        return status
+
+    def result(self, application: str, request_id: str):
+        job = self._job(request_id)
+        remaining = job.completed_at() - self._elapsed(job)
+        if remaining > 0 and self.scale:
+            time.sleep(remaining * self.scale)
+        entry = job.result or {}
+        self._sleep(entry.get("latency", self._typical("result")))
+        if "error" in entry:
+            raise Exception(entry["error"])
+        if "result" not in entry:
+            raise LookupError(f"Cassette {self.path} has no result for {request_id}")
+        return entry["result"]
+
+    def cancel(self, application: str, request_id: str):
+        self._sleep(self._typical("cancel"))
+
+    def upload_file(self, path: str) -> str:
+        with self._lock:
+            queue = self._uploads.get(os.path.basename(path))
+            entry = queue.popleft() if queue else None
+        if entry is None:
+            raise LookupError(f"Cassette {self.path} has no upload of {os.path.basename(path)}")
+        self._sleep(entry.get("latency", 0.0))
+        return entry["url"]
+
+    def discover(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Recorded discovery page for the same query (pages repeat if requested more often)"""
+        key = json.dumps(params, sort_keys=True)
+        with self._lock:
+            queue = self._discovery.get(key)
+            if not queue:
+                raise LookupError(f"Cassette {self.path} has no discovery page for {params}")
+            entry = queue[0] if len(queue) == 1 else queue.popleft()
+        self._sleep(entry.get("latency", 0.0))
+        return entry["response"]
+
+    @staticmethod
+    def _to_dict(status: Any) -> Dict[str, Any]:
+        return status
@@ -1,9 +1,8 @@
 import os
 import json
 import time
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from .logging_config import setup_logging
-from .utils import atomic_write
 
 logger = setup_logging(__name__)
 
@@ -12,85 +11,90 @@ class ModelDiscovery:
 
     CACHE_DIR = os.path.expanduser("~/.config/fal-skill/cache")
     CACHE_TTL = 24 * 60 * 60  # 24 hours in seconds
+    PAGE_SIZE = 100
 
     def __init__(self, api_client):
         self.api_client = api_client
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
-
-    def discover_all_models(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
-        """Discover all models with caching"""
-        cache_file = os.path.join(self.CACHE_DIR, "all_models.json")
-
-        # Check cache first
-        if not force_refresh and self._is_cache_valid(cache_file):
-            cached = self._load_cache(cache_file)
-            if cached is not None:
-                return cached
-
-        # Fetch from API with pagination
-        all_models = []
-        cursor = None
-
-        logger.info("Discovering models from fal.ai API")
-
-        while True:
-            response = self.api_client.discover_models(
-                status="active",
-                limit=100,
-                cursor=cursor
-            )
-
-            all_models.extend(response.get("models", []))
-
-            if not response.get("has_more", False):
-                break
-
-            cursor = response.get("next_cursor")
 
-        logger.info(f"Discovered {len(all_models)} models")
-
-        # Save to cache
-        self._save_cache(cache_file, all_models)
-
-        return all_models
+    def discover_all_models(self, force_refresh: bool = False) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of all active models as they arrive (from the cache while it is fresh)"""
+        yield from self._pages(None, force_refresh)
 
     def discover_by_category(
         self,
         category: str,
         force_refresh: bool = False
-    ) -> List[Dict[str, Any]]:
-        """Discover models by category with caching"""
-        cache_file = os.path.join(self.CACHE_DIR, f"{category}.json")
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of one category's active models as they arrive (from the cache while it is fresh)"""
+        yield from self._pages(category, force_refresh)
+
+    def _pages(self, category: Optional[str], force_refresh: bool) -> Iterator[List[Dict[str, Any]]]:
+        cache_file = os.path.join(self.CACHE_DIR, f"{category or 'all_models'}.ndjson")
 
         # Check cache first
         if not force_refresh and self._is_cache_valid(cache_file):
-            cached = self._load_cache(cache_file)
-            if cached is not None:
-                return cached
-
-        # Fetch from API
-        all_models = []
-        cursor = None
-
-        while True:
-            response = self.api_client.discover_models(
-                category=category,
-                status="active",
-                limit=100,
-                cursor=cursor
-            )
-
-            all_models.extend(response.get("models", []))
+            served = False
+            try:
+                for page in self._read_cache(cache_file):
+                    served = True
+                    yield page
+                return
+            except (json.JSONDecodeError, OSError):
+                if served:
+                    raise
+                logger.warning(f"Ignoring unreadable cache {cache_file}")
+
+        yield from self._fetch(category, cache_file)
+
+    def _fetch(self, category: Optional[str], cache_file: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Fetch pages from the API, appending each to a temporary NDJSON file
+        that replaces the cache once the last page is in, before that page is
+        yielded (so a consumer that stops at the last page still gets the
+        cache written). A consumer that stops earlier leaves the old cache as
+        it was.
+        """
+        import tempfile
 
-            if not response.get("has_more", False):
-                break
-
-            cursor = response.get("next_cursor")
-
-        # Save to cache
-        self._save_cache(cache_file, all_models)
+        logger.info("Discovering models from fal.ai API")
 
-        return all_models
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.CACHE_DIR)
+        total = 0
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                cursor = None
+                while True:
+                    response = self.api_client.discover_models(
+                        category=category,
+                        status="active",
+                        limit=self.PAGE_SIZE,
+                        cursor=cursor
+                    )
+
+                    page = response.get("models", [])
+                    for model in page:
+                        f.write(json.dumps(model, separators=(",", ":")) + "\n")
+                    total += len(page)
+
+                    if not response.get("has_more", False):
+                        break
+                    yield page
+
+                    cursor = response.get("next_cursor")
+
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cache_file)
+            logger.info(f"Discovered {total} models")
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        yield page
 
     def _is_cache_valid(self, cache_file: str) -> bool:
         """Check if cache exists and is not expired"""
@@ -102,14 +106,26 @@ class ModelDiscovery:
 
         return age < self.CACHE_TTL
 
-    def _load_cache(self, cache_file: str) -> Optional[List[Dict[str, Any]]]:
-        """Load models from cache"""
-        try:
-            with open(cache_file, 'r', encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, OSError):
-            return None
-
-    def _save_cache(self, cache_file: str, models: List[Dict[str, Any]]):
-        """Save models to cache"""
-        atomic_write(cache_file, json.dumps(models, indent=2))
+    def _read_cache(self, cache_file: str) -> Iterator[List[Dict[str, Any]]]:
+        """Stream cached models (one JSON object per line) in pages"""
+        with open(cache_file, "r", encoding="utf-8") as f:
+            page = []
+            for line in f:
+                if line.strip():
+                    page.append(json.loads(line))
+                if len(page) >= self.PAGE_SIZE:
+                    yield page
+                    page = []
+            if page:
+                yield page
+
+
+def project(model: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keep only fields of a model; dotted names reach into nested objects (metadata.category)"""
+    projected = {}
+    for field in fields:
+        value: Any = model
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        projected[field] = value
+    return projected
@@ -0,0 +1,314 @@
+"""Streaming, resumable, parallel downloads of generated media"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logging_config import setup_logging
+from .tracing import span
+from .utils import atomic_write
+
+logger = setup_logging(__name__)
+
+BLOCK_BYTES = 256 * 1024             # Read/write granularity; bounds memory per connection
+SEGMENT_BYTES = 8 * 1024 * 1024      # Unit of work (and of resume) for ranged downloads
+PARALLEL_THRESHOLD = 4 * 1024 * 1024  # Smaller files are fetched over one connection
+SEGMENT_RETRIES = 3
+
+
+def _request(url: str, headers: Optional[Dict[str, str]] = None):
+    import urllib.request
+    from .http_utils import urlopen_with_retries
+
+    request = urllib.request.Request(url, headers=headers or {})
+    return urlopen_with_retries(request, timeout=60)
+
+
+def probe(url: str) -> Dict[str, Any]:
+    """Size, range support and validator of a URL, using a one-byte ranged GET"""
+    with _request(url, {"Range": "bytes=0-0"}) as response:
+        headers = response.headers
+        status = getattr(response, "status", None) or response.getcode()
+        info = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type"),
+            "ranges": status == 206,
+            "size": None
+        }
+        content_range = headers.get("Content-Range", "")
+        if status == 206 and "/" in content_range and not content_range.endswith("/*"):
+            info["size"] = int(content_range.rsplit("/", 1)[1])
+        elif status == 200 and headers.get("Content-Length"):
+            info["size"] = int(headers["Content-Length"])
+    return info
+
+
+def is_data_uri(url: str) -> bool:
+    return isinstance(url, str) and url.startswith("data:")
+
+
+def _data_uri_parts(uri: str) -> Tuple[str, bool, int]:
+    """(mime type, base64?, offset of the payload) of a data: URI"""
+    comma = uri.find(",")
+    if comma < 0:
+        raise ValueError("Malformed data URI (no comma)")
+    params = uri[len("data:"):comma].split(";")
+    return (params[0] or "text/plain"), "base64" in params[1:], comma + 1
+
+
+def filename_for(url: str) -> str:
+    """Local file name for a result URL (or a content-addressed name for a data URI)"""
+    if is_data_uri(url):
+        import mimetypes
+
+        mime, _, offset = _data_uri_parts(url)
+        extension = mimetypes.guess_extension(mime) or ".bin"
+        digest = hashlib.sha256(url[offset:offset + 1024 * 1024].encode("ascii", "ignore")).hexdigest()
+        return f"inline-{digest[:12]}{extension}"
+
+    from urllib.parse import unquote, urlparse
+
+    name = os.path.basename(unquote(urlparse(url).path))
+    return name or "download"
+
+
+def save_data_uri(
+    uri: str,
+    path: str,
+    sha256: Optional[str] = None,
+    expected_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Decode an inline (sync-mode) data URI straight into path.
+
+    Base64 is decoded a block at a time, so no second full-size copy of the
+    payload is built in memory; the file appears at path only once complete.
+    """
+    started = time.monotonic()
+    mime, encoded, offset = _data_uri_parts(uri)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    part_path = f"{path}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    with open(part_path, "wb") as f:
+        if encoded:
+            step = BLOCK_BYTES // 3 * 4  # Whole base64 quanta per block
+            for start in range(offset, len(uri), step):
+                block = base64.b64decode(uri[start:start + step])
+                f.write(block)
+                digest.update(block)
+                size += len(block)
+        else:
+            from urllib.parse import unquote_to_bytes
+
+            block = unquote_to_bytes(uri[offset:])
+            f.write(block)
+            digest.update(block)
+            size = len(block)
+
+    if expected_size is not None and size != expected_size:
+        os.remove(part_path)
+        raise IOError(f"Decoded {size} bytes of inline result, expected {expected_size}")
+
+    checksum = digest.hexdigest()
+    if sha256 and checksum.lower() != sha256.lower():
+        os.remove(part_path)
+        raise IOError(f"Checksum mismatch for inline result: got {checksum}, expected {sha256}")
+    os.replace(part_path, path)
+
+    return {
+        "url": f"data:{mime}",
+        "path": path,
+        "size": size,
+        "sha256": checksum,
+        "content_type": mime,
+        "inline": True,
+        "seconds": round(time.monotonic() - started, 3)
+    }
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_BYTES * 4), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _Sidecar:
+    """JSON record of completed segments next to the .part file, so a rerun resumes"""
+
+    def __init__(self, path: str, identity: Dict[str, Any]):
+        self.path = path
+        self.identity = identity
+        self.done: set = set()
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Restore completed segments if the sidecar describes the same remote file"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if data.get("identity") != self.identity:
+            return False
+        self.done = set(data.get("done", []))
+        return True
+
+    def mark(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            atomic_write(self.path, json.dumps({"identity": self.identity, "done": sorted(self.done)}))
+
+
+def _fetch_range(url: str, part_path: str, start: int, end: int, validator: Optional[str]):
+    """Write bytes [start, end] of url into part_path at the same offset, resuming within the range"""
+    offset = start
+    last_error = None
+    for attempt in range(SEGMENT_RETRIES):
+        headers = {"Range": f"bytes={offset}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        try:
+            with _request(url, headers) as response, open(part_path, "r+b") as f:
+                if (getattr(response, "status", None) or response.getcode()) != 206:
+                    raise IOError("Server ignored the range request (file changed?)")
+                f.seek(offset)
+                while offset <= end:
+                    block = response.read(min(BLOCK_BYTES, end - offset + 1))
+                    if not block:
+                        break
+                    f.write(block)
+                    offset += len(block)
+            if offset > end:
+                return
+            last_error = IOError(f"Connection closed at byte {offset} of range {start}-{end}")
+        except Exception as e:
+            last_error = e
+        logger.info(f"Retrying range {start}-{end} from byte {offset} ({last_error})")
+        time.sleep(0.5 * (2 ** attempt))
+    raise last_error
+
+
+def _fetch_stream(url: str, part_path: str, digest) -> int:
+    """Single-connection download, hashing as it streams"""
+    size = 0
+    with _request(url) as response, open(part_path, "wb") as f:
+        for block in iter(lambda: response.read(BLOCK_BYTES), b""):
+            f.write(block)
+            digest.update(block)
+            size += len(block)
+    return size
+
+
+def download_file(
+    url: str,
+    path: str,
+    connections: int = 4,
+    sha256: Optional[str] = None,
+    expected_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Download url to path, verifying size (and sha256 when given).
+
+    Large files on servers that honour range requests are fetched as
+    segments over parallel connections into path + ".part"; a JSON sidecar
+    records finished segments so an interrupted download resumes where it
+    stopped. The file only appears at path once it is complete and verified.
+    Inline data URIs are decoded locally instead.
+    """
+    if is_data_uri(url):
+        return save_data_uri(url, path, sha256=sha256, expected_size=expected_size)
+
+    started = time.monotonic()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    part_path = f"{path}.part"
+    sidecar_path = f"{path}.part.json"
+
+    info = probe(url)
+    size = info["size"]
+    if expected_size is not None and size is not None and size != expected_size:
+        raise IOError(f"Server reports {size} bytes for {url}, expected {expected_size}")
+
+    resumed = 0
+    digest = None
+    parallel = info["ranges"] and size is not None and size >= PARALLEL_THRESHOLD and connections > 1
+
+    if parallel:
+        identity = {"url": url, "size": size, "etag": info["etag"], "last_modified": info["last_modified"],
+                    "segment": SEGMENT_BYTES}
+        sidecar = _Sidecar(sidecar_path, identity)
+        if not (os.path.exists(part_path) and os.path.getsize(part_path) == size and sidecar.load()):
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            sidecar.done = set()
+
+        segments: List[Tuple[int, int, int]] = [
+            (i, start, min(size, start + SEGMENT_BYTES) - 1)
+            for i, start in enumerate(range(0, size, SEGMENT_BYTES))
+        ]
+        todo = [s for s in segments if s[0] not in sidecar.done]
+        resumed = sum(end - start + 1 for i, start, end in segments if i in sidecar.done)
+        if resumed:
+            logger.info(f"Resuming {os.path.basename(path)}: {resumed} of {size} bytes already on disk")
+
+        validator = info["etag"] or info["last_modified"]
+
+        def fetch(segment: Tuple[int, int, int]):
+            index, start, end = segment
+            _fetch_range(url, part_path, start, end, validator)
+            sidecar.mark(index)
+
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="download") as executor:
+            for _ in executor.map(fetch, todo):
+                pass
+    else:
+        digest = hashlib.sha256()
+        written = _fetch_stream(url, part_path, digest)
+        if size is None:
+            size = written
+
+    actual_size = os.path.getsize(part_path)
+    if actual_size != size or (expected_size is not None and actual_size != expected_size):
+        raise IOError(f"Downloaded {actual_size} bytes of {url}, expected {expected_size or size}")
+
+    checksum = digest.hexdigest() if digest else sha256_file(part_path)
+    if sha256 and checksum.lower() != sha256.lower():
+        # A corrupt file must not be resumed from either
+        os.remove(part_path)
+        if os.path.exists(sidecar_path):
+            os.remove(sidecar_path)
+        raise IOError(f"Checksum mismatch for {url}: got {checksum}, expected {sha256}")
+
+    os.replace(part_path, path)
+    if os.path.exists(sidecar_path):
+        os.remove(sidecar_path)
+
+    seconds = time.monotonic() - started
+    return {
+        "url": url,
+        "path": path,
+        "size": actual_size,
+        "sha256": checksum,
+        "content_type": info["content_type"],
+        "resumed_bytes": resumed,
+        "connections": connections if parallel else 1,
+        "seconds": round(seconds, 3),
+        "mb_per_second": round((actual_size - resumed) / 1e6 / seconds, 2) if seconds else None
+    }
+
+
+def download_to_dir(url: str, directory: str, **kwargs: Any) -> Dict[str, Any]:
+    """download_file into directory, named after the URL's last path segment"""
+    with span("output.download", inline=is_data_uri(url)) as current:
+        saved = download_file(url, os.path.join(directory, filename_for(url)), **kwargs)
+        current.set(**{"file.path": saved["path"], "file.size": saved["size"]})
+        return saved
@@ -0,0 +1,80 @@
+"""Machine-readable NDJSON progress events for long-running queue jobs"""
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, TextIO
+
+
+class NDJSONEventStream:
+    """
+    Write job lifecycle events to stdout, one JSON object per line.
+
+    Events: submitted (request_id), queued (position), in_progress (new log
+    messages), completed (extracted URL and output fields) and failed. Every
+    event carries the model and seconds elapsed since the stream started;
+    completed also reports time spent queued (from submission) and running.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, **common: Any):
+        self.stream = stream or sys.stdout
+        self.common = common
+        self.started = time.monotonic()
+        self.submitted_at: Optional[float] = None
+        self.running_since: Optional[float] = None
+        self._last_position = None
+        self._seen_logs = set()
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any):
+        """Write one event line and flush so consumers see it immediately"""
+        payload = {"event": event, "elapsed": round(time.monotonic() - self.started, 3)}
+        payload.update(self.common)
+        payload.update(fields)
+        line = json.dumps(payload, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def on_status(self, status: Dict[str, Any]):
+        """run_model on_event callback: translate queue statuses into events"""
+        state = status.get("status")
+
+        if state == "SUBMITTED":
+            self.submitted_at = time.monotonic()
+            self.emit("submitted", request_id=status.get("request_id"))
+
+        elif state == "IN_QUEUE":
+            position = status.get("position")
+            if position != self._last_position:
+                self._last_position = position
+                self.emit("queued", position=position)
+
+        elif state == "IN_PROGRESS":
+            first = self.running_since is None
+            if first:
+                self.running_since = time.monotonic()
+
+            logs = []
+            for log in status.get("logs") or []:
+                key = (log.get("timestamp"), log.get("message")) if isinstance(log, dict) else (None, str(log))
+                if key not in self._seen_logs:
+                    self._seen_logs.add(key)
+                    logs.append(log.get("message", "") if isinstance(log, dict) else str(log))
+            if first or logs:
+                self.emit("in_progress", logs=logs)
+
+    def completed(self, **fields: Any):
+        """Final event with the extracted result and timing breakdown"""
+        now = time.monotonic()
+        running_since = self.running_since or now
+        submitted_at = self.submitted_at or self.started
+        self.emit(
+            "completed",
+            queue_seconds=round(running_since - submitted_at, 3),
+            run_seconds=round(now - running_since, 3),
+            **fields
+        )
+
+    def failed(self, error: str):
+        self.emit("failed", error=error)
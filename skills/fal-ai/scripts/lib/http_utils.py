@@ -1,7 +1,7 @@
 import time
 import urllib.error
 import urllib.request
-from typing import Iterable, Tuple
+from typing import Callable, Iterable, Optional, Tuple
 
 
 RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
@@ -13,8 +13,12 @@ def urlopen_with_retries(
     retries: int = 3,
     backoff_seconds: float = 0.5,
     retry_statuses: Iterable[int] = RETRY_STATUS_CODES,
+    on_retry: Optional[Callable[[int, Exception], None]] = None,
 ):
-    """Open URL with basic retry/backoff for transient failures."""
+    """Open URL with basic retry/backoff for transient failures.
+
+    on_retry, if given, is called with (attempt, error) before each backoff sleep.
+    """
     last_error = None
     for attempt in range(retries):
         try:
@@ -22,12 +26,16 @@ def urlopen_with_retries(
         except urllib.error.HTTPError as e:
             last_error = e
             if e.code in retry_statuses and attempt < retries - 1:
+                if on_retry:
+                    on_retry(attempt, e)
                 time.sleep(backoff_seconds * (2 ** attempt))
                 continue
             raise
         except urllib.error.URLError as e:
             last_error = e
             if attempt < retries - 1:
+                if on_retry:
+                    on_retry(attempt, e)
                 time.sleep(backoff_seconds * (2 ** attempt))
                 continue
             raise
@@ -0,0 +1,265 @@
+"""API-key pool with per-key concurrency, rate limits and health tracking"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .logging_config import setup_logging
+from .utils import atomic_write
+
+logger = setup_logging(__name__)
+
+
+def mask_key(key: str) -> str:
+    """Short, log-safe identifier for an API key"""
+    return f"…{key[-4:]}" if len(key) > 4 else "…"
+
+
+def key_id(key: str) -> str:
+    """Stable identifier for an API key that is safe to store (not reversible)"""
+    import hashlib
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class _KeyState:
+    def __init__(self, key: str, rate: float):
+        self.key = key
+        self.in_flight = 0
+        self.tokens = max(1.0, rate) if rate else 0.0
+        self.refilled_at = time.monotonic()
+        self.last_used = 0.0
+        self.cooldown_until = 0.0
+        self.consecutive_auth = 0
+        self.consecutive_throttle = 0
+        self.successes = 0
+        self.failures = 0
+        self.removed_reason: Optional[str] = None
+
+
+class KeyPool:
+    """
+    Spread requests over several fal.ai API keys.
+
+    Each lease picks the healthy key with the fewest requests in flight,
+    honouring a per-key concurrency cap and token-bucket rate limit. A 429
+    puts the key in an exponential cooldown; keys that keep returning
+    401/403 or 429 are removed from rotation.
+    """
+
+    AUTH_FAILURES_TO_REMOVE = 2      # Consecutive 401/403 before removal
+    THROTTLES_TO_REMOVE = 5          # Consecutive 429 before removal
+    COOLDOWN_BASE_SECONDS = 1.0
+    COOLDOWN_MAX_SECONDS = 60.0
+
+    def __init__(self, keys: List[str], max_concurrency: int = 0, rate: float = 0.0):
+        """
+        Args:
+            keys: API keys, in preference order (duplicates are dropped)
+            max_concurrency: Requests in flight per key (0 = unlimited)
+            rate: Requests started per second per key (0 = unlimited)
+        """
+        unique = list(dict.fromkeys(k for k in keys if k))
+        if not unique:
+            raise ValueError("KeyPool needs at least one API key")
+
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self._states = [_KeyState(k, rate) for k in unique]
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    @property
+    def keys(self) -> List[str]:
+        return [s.key for s in self._states]
+
+    def _refill(self, state: _KeyState, now: float):
+        if not self.rate:
+            return
+        burst = max(1.0, self.rate)
+        state.tokens = min(burst, state.tokens + (now - state.refilled_at) * self.rate)
+        state.refilled_at = now
+
+    def _pick(self, now: float):
+        """Choose a key or return (None, seconds until one may free up)"""
+        best = None
+        wake = None
+        for state in self._states:
+            if state.removed_reason:
+                continue
+            if state.cooldown_until > now:
+                wait = state.cooldown_until - now
+                wake = wait if wake is None else min(wake, wait)
+                continue
+            if self.max_concurrency and state.in_flight >= self.max_concurrency:
+                continue
+            self._refill(state, now)
+            if self.rate and state.tokens < 1.0:
+                wait = (1.0 - state.tokens) / self.rate
+                wake = wait if wake is None else min(wake, wait)
+                continue
+            if best is None or (state.in_flight, state.last_used) < (best.in_flight, best.last_used):
+                best = state
+        return best, wake
+
+    def acquire(self, timeout: Optional[float] = None) -> str:
+        """Block until a key may start a request; call release() when done"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if all(s.removed_reason for s in self._states):
+                    raise RuntimeError("No healthy API keys left in pool")
+
+                now = time.monotonic()
+                state, wake = self._pick(now)
+                if state is not None:
+                    if self.rate:
+                        state.tokens -= 1.0
+                    state.in_flight += 1
+                    state.last_used = now
+                    return state.key
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for an API key")
+                    wake = remaining if wake is None else min(wake, remaining)
+                self._cond.wait(wake)
+
+    def release(self, key: str, status_code: Optional[int] = None, ok: bool = True):
+        """Return a key, recording the outcome for health tracking"""
+        with self._cond:
+            state = self._state(key)
+            state.in_flight = max(0, state.in_flight - 1)
+
+            if ok:
+                state.successes += 1
+                state.consecutive_auth = 0
+                state.consecutive_throttle = 0
+            else:
+                state.failures += 1
+                if status_code in (401, 403):
+                    state.consecutive_auth += 1
+                    if state.consecutive_auth >= self.AUTH_FAILURES_TO_REMOVE:
+                        self._remove(state, f"HTTP {status_code}")
+                elif status_code == 429:
+                    state.consecutive_throttle += 1
+                    if state.consecutive_throttle >= self.THROTTLES_TO_REMOVE:
+                        self._remove(state, "HTTP 429")
+                    else:
+                        cooldown = min(
+                            self.COOLDOWN_MAX_SECONDS,
+                            self.COOLDOWN_BASE_SECONDS * (2 ** (state.consecutive_throttle - 1))
+                        )
+                        state.cooldown_until = time.monotonic() + cooldown
+                        logger.info(f"API key {mask_key(key)} throttled, cooling down {cooldown:.0f}s")
+
+            self._cond.notify_all()
+
+    def _remove(self, state: _KeyState, reason: str):
+        state.removed_reason = reason
+        logger.warning(f"Removing API key {mask_key(state.key)} from pool ({reason})")
+
+    def _state(self, key: str) -> _KeyState:
+        for state in self._states:
+            if state.key == key:
+                return state
+        raise KeyError(mask_key(key))
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[str]:
+        """Context manager around acquire/release that reports failures by HTTP status"""
+        key = self.acquire(timeout=timeout)
+        try:
+            yield key
+        except Exception as e:
+            self.release(key, status_code=http_status_of(e), ok=False)
+            raise
+        else:
+            self.release(key)
+
+    def health(self) -> List[Dict[str, Any]]:
+        """Per-key health snapshot (keys masked)"""
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                "key": mask_key(s.key),
+                "healthy": s.removed_reason is None,
+                "removed_reason": s.removed_reason,
+                "in_flight": s.in_flight,
+                "cooling_down": s.cooldown_until > now,
+                "successes": s.successes,
+                "failures": s.failures,
+            } for s in self._states]
+
+
+def http_status_of(error: Exception) -> Optional[int]:
+    """Best-effort HTTP status code from fal_client/httpx/urllib exceptions"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None) or getattr(error, "status_code", None) \
+            or getattr(error, "code", None)
+        if isinstance(code, int):
+            return code
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class RequestKeyLog:
+    """
+    Which pooled key submitted each queue request, kept on disk.
+
+    Queue results, status and cancellation are per account, so a request
+    must be followed up with the key that submitted it, including from a
+    later process. Entries are key_id()s, never keys, appended one JSON line
+    per request; the file is trimmed to the newest half once it grows past
+    MAX_BYTES.
+    """
+
+    PATH = os.path.expanduser("~/.config/fal-skill/request_keys.jsonl")
+    MAX_BYTES = 1 << 20
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or self.PATH
+        self._lock = threading.Lock()
+
+    def record(self, request_id: str, key: str):
+        line = json.dumps({"request_id": request_id, "key_id": key_id(key), "t": round(time.time())}) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    size = f.tell()
+                if size > self.MAX_BYTES:
+                    self._trim()
+            except OSError as e:
+                logger.warning(f"Could not record the key for request {request_id}: {e}")
+
+    def _trim(self):
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()
+        atomic_write(self.path, "".join(lines[len(lines) // 2:]))
+
+    def lookup(self, request_id: str) -> Optional[str]:
+        """key_id that submitted request_id, or None if it was not recorded here"""
+        found = None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if request_id not in line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("request_id") == request_id:
+                        found = entry.get("key_id")
+        except FileNotFoundError:
+            return None
+        return found
@@ -0,0 +1,619 @@
+"""Open-loop load generation against a local fal.ai stand-in"""
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .api_client import FalAPIClient, JobTimeoutError
+from .http_utils import urlopen_with_retries
+
+# Subcommand profiles: default endpoint, a representative payload, the mean
+# stand-in service time in seconds and the response shape it returns.
+JOB_PROFILES: Dict[str, Dict[str, Any]] = {
+    "generate": {
+        "endpoint_id": "fal-ai/flux.2/dev",
+        "input": {"prompt": "a cat", "image_size": "square_hd"},
+        "service_time": 0.4,
+        "output": "images",
+    },
+    "edit": {
+        "endpoint_id": "fal-ai/fibo-edit/relight",
+        "input": {"image_url": "https://example.com/in.png", "light_type": "sunrise light"},
+        "service_time": 0.6,
+        "output": "images",
+    },
+    "upscale": {
+        "endpoint_id": "fal-ai/crystal/upscale",
+        "input": {"image_url": "https://example.com/in.png", "scale": 2},
+        "service_time": 0.8,
+        "output": "images",
+    },
+    "tts": {
+        "endpoint_id": "fal-ai/kokoro/american-english",
+        "input": {"text": "Hello world"},
+        "service_time": 0.15,
+        "output": "audio",
+    },
+    "music": {
+        "endpoint_id": "fal-ai/minimax-music/v2",
+        "input": {"prompt": "calm ambient", "lyrics_prompt": "[instrumental]"},
+        "service_time": 1.0,
+        "output": "audio",
+    },
+    "video": {
+        "endpoint_id": "fal-ai/kling-video/v2/standard/text-to-video",
+        "input": {"prompt": "ocean waves", "duration": 5},
+        "service_time": 2.0,
+        "output": "video",
+    },
+}
+
+# Generated files the stand-in serves: size and mean transfer time in seconds
+FILE_BYTES = 64 * 1024
+FILE_SECONDS = 0.05
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """Parse 'generate=6,tts=3,video=1' into weighted subcommand entries"""
+    mix = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in JOB_PROFILES:
+            raise ValueError(f"Unknown subcommand in mix: {name} (choose from {', '.join(JOB_PROFILES)})")
+        mix.append((name, float(weight) if weight else 1.0))
+    if not mix or sum(w for _, w in mix) <= 0:
+        raise ValueError("Job mix must contain at least one positive weight")
+    return mix
+
+
+def arrival_schedule(
+    rate: float,
+    duration: float,
+    mix: List[Tuple[str, float]],
+    arrival: str = "poisson",
+    rng: Optional[random.Random] = None
+) -> List[Tuple[float, str]]:
+    """Intended (offset_seconds, subcommand) arrivals, fixed before the run starts"""
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    rng = rng or random.Random()
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    schedule = []
+    offset = 0.0
+    while True:
+        offset += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        if offset >= duration:
+            break
+        schedule.append((offset, rng.choices(names, weights)[0]))
+    return schedule
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class _StandInJob:
+    def __init__(self, request_id: str, endpoint_id: str, service_time: float, fail: bool):
+        self.request_id = request_id
+        self.endpoint_id = endpoint_id
+        self.service_time = service_time
+        self.fail = fail
+        self.state = "IN_QUEUE"
+        self.done = threading.Event()
+
+
+def _app_path(endpoint_id: str) -> str:
+    """owner/alias part of an endpoint, as fal's queue request URLs use it"""
+    return "/".join(endpoint_id.split("/")[:2])
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Simulates a capacity-limited fal queue: submit (429 once the queue is
+    full), status, result and cancel, with the same URLs and payloads as
+    queue.fal.run so fal_client drives it unchanged. Result URLs point at
+    /files/ on the stand-in, which has a few transfer slots and answers 429
+    when they are all busy.
+    """
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        endpoint_id = self.path.split("?", 1)[0].strip("/")
+        profile = server.profiles.get(endpoint_id, {"service_time": 0.2, "output": "images"})
+
+        with server.lock:
+            if server.outstanding >= server.capacity + server.queue_limit:
+                server.rejected_at.append(time.monotonic())
+                reject = True
+            else:
+                server.outstanding += 1
+                reject = False
+                job = _StandInJob(
+                    uuid.uuid4().hex,
+                    endpoint_id,
+                    server.rng.expovariate(1.0 / (profile["service_time"] * server.service_scale)),
+                    server.rng.random() < server.error_rate
+                )
+                server.jobs[job.request_id] = job
+                server.waiting.append(job)
+                server.queued.release()
+
+        if reject:
+            self._reply(429, {"detail": "Too many requests"})
+            return
+
+        base = f"http://{self.headers.get('Host')}/{_app_path(endpoint_id)}/requests/{job.request_id}"
+        self._reply(200, {
+            "request_id": job.request_id,
+            "response_url": base,
+            "status_url": f"{base}/status",
+            "cancel_url": f"{base}/cancel",
+        })
+
+    def _job(self) -> Tuple[Optional[_StandInJob], str]:
+        """(job, trailing action) for .../requests/<id>[/status|/cancel]"""
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if "requests" not in parts:
+            return None, ""
+        index = parts.index("requests")
+        request_id = parts[index + 1] if len(parts) > index + 1 else ""
+        action = parts[index + 2] if len(parts) > index + 2 else ""
+        return self.server.jobs.get(request_id), action
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith("/files/"):
+            self._serve_file()
+            return
+        job, action = self._job()
+        if job is None:
+            self._reply(404, {"detail": "Request not found"})
+            return
+
+        if action == "status":
+            with server.lock:
+                state = job.state
+                position = server.waiting.index(job) if job in server.waiting else 0
+            if state == "IN_QUEUE":
+                self._reply(200, {"status": "IN_QUEUE", "queue_position": position})
+            elif state == "IN_PROGRESS":
+                self._reply(200, {"status": "IN_PROGRESS", "logs": []})
+            else:
+                self._reply(200, {"status": "COMPLETED", "logs": [], "metrics": {}})
+            return
+
+        if not job.done.is_set():
+            self._reply(400, {"detail": "Request is still in progress"})
+            return
+        if job.state == "CANCELLED":
+            self._reply(400, {"detail": "Request was cancelled"})
+            return
+        if job.fail:
+            self._reply(500, {"detail": "Injected stand-in failure"})
+            return
+
+        url = f"http://{self.headers.get('Host')}/files/{job.endpoint_id.replace('/', '_')}"
+        output = server.profiles.get(job.endpoint_id, {"output": "images"})["output"]
+        if output == "images":
+            body = {"images": [{"url": url + ".png", "width": 1024, "height": 1024}]}
+        else:
+            body = {output: {"url": url + (".mp4" if output == "video" else ".wav")}}
+        self._reply(200, body)
+
+    def _serve_file(self):
+        server = self.server
+        with server.lock:
+            reject = server.transfers >= server.file_slots
+            if reject:
+                server.rejected_at.append(time.monotonic())
+            else:
+                server.transfers += 1
+                transfer_time = server.rng.expovariate(1.0 / (FILE_SECONDS * server.service_scale))
+
+        if reject:
+            self._reply(429, {"detail": "Too many requests"})
+            return
+        try:
+            time.sleep(transfer_time)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(FILE_BYTES))
+            self.end_headers()
+            self.wfile.write(bytes(FILE_BYTES))
+        finally:
+            with server.lock:
+                server.transfers -= 1
+
+    def do_PUT(self):
+        server = self.server
+        job, action = self._job()
+        if job is None or action != "cancel":
+            self._reply(404, {"detail": "Request not found"})
+            return
+        with server.lock:
+            cancelled = job in server.waiting
+            if cancelled:
+                server.waiting.remove(job)
+                job.state = "CANCELLED"
+                server.outstanding -= 1
+                job.done.set()
+        if cancelled:
+            self._reply(202, {"status": "CANCELLATION_REQUESTED"})
+        else:
+            self._reply(400, {"detail": "Request is already running or finished"})
+
+    def _reply(self, code: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer:
+    """Local HTTP stand-in for fal.ai's queue with a fixed number of runners"""
+
+    def __init__(
+        self,
+        capacity: int = 8,
+        queue_limit: int = 32,
+        file_slots: int = 4,
+        error_rate: float = 0.0,
+        service_scale: float = 1.0,
+        seed: Optional[int] = None
+    ):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.profiles = {p["endpoint_id"]: p for p in JOB_PROFILES.values()}
+        self.httpd.capacity = capacity
+        self.httpd.queue_limit = queue_limit
+        self.httpd.file_slots = file_slots
+        self.httpd.transfers = 0
+        self.httpd.error_rate = error_rate
+        self.httpd.service_scale = service_scale
+        self.httpd.lock = threading.Lock()
+        self.httpd.rng = random.Random(seed)
+        self.httpd.jobs: Dict[str, _StandInJob] = {}
+        self.httpd.waiting: List[_StandInJob] = []
+        self.httpd.queued = threading.Semaphore(0)
+        self.httpd.outstanding = 0
+        self.httpd.rejected_at: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._runners = [threading.Thread(target=self._runner, daemon=True) for _ in range(capacity)]
+
+    def _runner(self):
+        server = self.httpd
+        while not self._stop.is_set():
+            if not server.queued.acquire(timeout=0.1):
+                continue
+            with server.lock:
+                if not server.waiting:
+                    continue  # Cancelled while queued
+                job = server.waiting.pop(0)
+                job.state = "IN_PROGRESS"
+            time.sleep(job.service_time)
+            with server.lock:
+                job.state = "COMPLETED"
+                server.outstanding -= 1
+            job.done.set()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def rejected(self) -> int:
+        return len(self.httpd.rejected_at)
+
+    def rejections(self) -> List[float]:
+        """Monotonic times of 429 replies (submits and file transfers)"""
+        with self.httpd.lock:
+            return list(self.httpd.rejected_at)
+
+    def __enter__(self):
+        self._thread.start()
+        for runner in self._runners:
+            runner.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def stand_in_client(target_url: str, timeout: float = 60.0) -> FalAPIClient:
+    """
+    A real FalAPIClient whose queue host is the stand-in, so runs go through
+    submit, polling, result, the key pool, coalescing and the scheduler
+    exactly as against fal (FAL_KEY_<n>, FAL_COALESCE, FAL_MAX_IN_FLIGHT ...
+    apply as usual). Without configured keys a placeholder key is used.
+    """
+    try:
+        return FalAPIClient(queue_url=target_url, timeout=timeout)
+    except ValueError:
+        return FalAPIClient(api_key="stand-in", queue_url=target_url, timeout=timeout)
+
+
+def _output_url(result: Any) -> Optional[str]:
+    """First file URL in a model result"""
+    if isinstance(result, dict):
+        if isinstance(result.get("url"), str):
+            return result["url"]
+        values = list(result.values())
+    elif isinstance(result, list):
+        values = result
+    else:
+        return None
+    for value in values:
+        url = _output_url(value)
+        if url:
+            return url
+    return None
+
+
+def _error_kind(error: Exception) -> str:
+    if isinstance(error, JobTimeoutError):
+        return "abandoned"  # Still running at the drain deadline (and cancelled)
+    # FalAPIClient wraps FalClientError, which wraps httpx's status error
+    cause, seen = error, set()
+    while id(cause) not in seen:
+        seen.add(id(cause))
+        if isinstance(cause, urllib.error.HTTPError):
+            return f"http_{cause.code}"
+        status = getattr(getattr(cause, "response", None), "status_code", None)
+        if status:
+            return f"http_{status}"
+        nested = cause.__cause__ or cause.__context__
+        if nested is None:
+            break
+        cause = nested
+    if isinstance(cause, (urllib.error.URLError, ConnectionError)) or "Connect" in type(cause).__name__:
+        return "connection"
+    if isinstance(cause, TimeoutError) or "Timeout" in type(cause).__name__:
+        return "timeout"
+    return type(cause).__name__
+
+
+class LoadGenerator:
+    """
+    Open-loop load generator.
+
+    Arrivals follow a schedule fixed up front, independent of how fast jobs
+    complete, and latency is measured from each job's intended arrival time so
+    local queueing behind busy workers is counted (no coordinated omission).
+
+    Jobs go through client.run_model, then fetch their output file with
+    urlopen_with_retries the way a worker downloads results; its retries
+    are counted per job. Every job shares one deadline, the end of the drain
+    period: jobs still queued locally then are dropped, and jobs in flight
+    are cancelled and reported as abandoned. run returns once every job has
+    finished, so nothing spills into the next run.
+    """
+
+    def __init__(
+        self,
+        client: FalAPIClient,
+        mix: List[Tuple[str, float]],
+        concurrency: int = 16,
+        window: float = 1.0,
+        drain_timeout: float = 30.0,
+        seed: Optional[int] = None,
+        rejections: Optional[Callable[[], List[float]]] = None,
+        fetch: bool = True,
+        retries: int = 3,
+        backoff: float = 0.5
+    ):
+        """
+        Args:
+            rejections: Returns monotonic times of 429 replies from the target;
+                        counted as throttled
+            fetch: Download each job's output file after the result
+            retries: Attempts per output download (urlopen_with_retries)
+            backoff: Base backoff between download attempts, in seconds
+        """
+        self.client = client
+        self.mix = mix
+        self.concurrency = concurrency
+        self.window = window
+        self.drain_timeout = drain_timeout
+        self.rng = random.Random(seed)
+        self.rejections = rejections
+        self.fetch = fetch
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._throttled: List[float] = []
+
+    def run(self, rate: float, duration: float, arrival: str = "poisson") -> Dict[str, Any]:
+        """Drive one open-loop run at a fixed arrival rate and summarize it"""
+        schedule = arrival_schedule(rate, duration, self.mix, arrival, self.rng)
+        records: List[Dict[str, Any]] = []
+        queue_samples: List[Dict[str, Any]] = []
+        counters = {"submitted": 0, "started": 0, "finished": 0}
+        done = threading.Event()
+        deadline = None  # Wall-clock drain deadline, set once arrivals are scheduled
+
+        def execute(kind: str, intended: float):
+            started = time.monotonic()
+            with self._lock:
+                counters["started"] += 1
+            profile = JOB_PROFILES[kind]
+            record = {"kind": kind, "intended": intended, "started": started, "error": None, "retries": 0}
+
+            def on_retry(attempt, error):
+                record["retries"] += 1
+
+            try:
+                result = self.client.run_model(profile["endpoint_id"], dict(profile["input"]), deadline=deadline)
+                url = _output_url(result) if self.fetch else None
+                if url:
+                    timeout = max(1.0, min(60.0, deadline - time.time()))
+                    with urlopen_with_retries(
+                        urllib.request.Request(url),
+                        timeout=timeout,
+                        retries=self.retries,
+                        backoff_seconds=self.backoff,
+                        on_retry=on_retry
+                    ) as response:
+                        response.read()
+            except Exception as e:
+                record["error"] = _error_kind(e)
+            record["finished"] = time.monotonic()
+            with self._lock:
+                counters["finished"] += 1
+                records.append(record)
+
+        def sample_queue(t0: float):
+            while not done.wait(self.window):
+                with self._lock:
+                    queue_samples.append({
+                        "t": round(time.monotonic() - t0, 3),
+                        "waiting": counters["submitted"] - counters["started"],
+                        "in_flight": counters["started"] - counters["finished"],
+                    })
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="loadtest")
+        t0 = time.monotonic() + 0.05
+        deadline = time.time() + 0.05 + duration + self.drain_timeout
+        sampler = threading.Thread(target=sample_queue, args=(t0,), daemon=True)
+        sampler.start()
+
+        futures = []
+        for offset, kind in schedule:
+            intended = t0 + offset
+            delay = intended - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                counters["submitted"] += 1
+            futures.append(executor.submit(execute, kind, intended))
+
+        # Jobs still queued locally at the deadline never start; running ones give up at it
+        # on their own (cancelling their fal request), so the drain below is bounded
+        _, not_done = wait(futures, timeout=max(0.0, deadline - time.time()))
+        dropped = sum(1 for future in not_done if future.cancel())
+        executor.shutdown(wait=True)
+        done.set()
+        sampler.join()
+
+        abandoned = sum(1 for r in records if r["error"] == "abandoned")
+        rejected = self.rejections() if self.rejections else []
+        self._throttled = [t for t in rejected if t >= t0]
+        return self._summarize(rate, duration, arrival, t0, records, queue_samples, dropped, abandoned,
+                               len(schedule))
+
+    def _summarize(
+        self,
+        rate: float,
+        duration: float,
+        arrival: str,
+        t0: float,
+        records: List[Dict[str, Any]],
+        queue_samples: List[Dict[str, Any]],
+        dropped: int,
+        abandoned: int,
+        offered: int
+    ) -> Dict[str, Any]:
+        ok = sorted(r["finished"] - r["intended"] for r in records if not r["error"])
+        service = sorted(r["finished"] - r["started"] for r in records if not r["error"])
+        errors: Dict[str, int] = {}
+        for r in records:
+            if r["error"]:
+                errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+        end = max((r["finished"] for r in records), default=t0)
+        span = max(end - t0, 1e-9)
+        windows = []
+        for index in range(int(span // self.window) + 1):
+            lo, hi = t0 + index * self.window, t0 + (index + 1) * self.window
+            completed = [r for r in records if lo <= r["finished"] < hi]
+            latencies = sorted(r["finished"] - r["intended"] for r in completed if not r["error"])
+            failed = sum(1 for r in completed if r["error"])
+            windows.append({
+                "t": round(index * self.window, 3),
+                "arrivals": sum(1 for r in records if lo <= r["intended"] < hi),
+                "completed": len(completed),
+                "throughput": round((len(completed) - failed) / self.window, 3),
+                "error_rate": round(failed / len(completed), 4) if completed else 0.0,
+                "throttled": sum(1 for t in self._throttled if lo <= t < hi),
+                "retries": sum(r["retries"] for r in completed),
+                "p50": _round(percentile(latencies, 50)),
+                "p99": _round(percentile(latencies, 99)),
+            })
+
+        return {
+            "rate": rate,
+            "arrival": arrival,
+            "concurrency": self.concurrency,
+            "duration": duration,
+            "offered": offered,
+            "completed": len(ok),
+            "failed": sum(1 for r in records if r["error"] and r["error"] != "abandoned"),
+            "dropped": dropped,
+            "abandoned": abandoned,
+            "throughput": round(len(ok) / span, 3),
+            "error_rate": round((offered - len(ok)) / offered, 4) if offered else 0.0,
+            "errors": errors,
+            "throttled": len(self._throttled),
+            "retries": sum(r["retries"] for r in records),
+            "retried_jobs": sum(1 for r in records if r["retries"]),
+            "latency": {
+                "p50": _round(percentile(ok, 50)),
+                "p90": _round(percentile(ok, 90)),
+                "p99": _round(percentile(ok, 99)),
+                "max": _round(ok[-1] if ok else None),
+            },
+            "service_latency": {
+                "p50": _round(percentile(service, 50)),
+                "p99": _round(percentile(service, 99)),
+            },
+            "max_waiting": max((s["waiting"] for s in queue_samples), default=0),
+            "queue": queue_samples,
+            "windows": windows,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def find_saturation(runs: List[Dict[str, Any]]) -> Optional[float]:
+    """First offered rate that errors out, backs up locally, or whose p99 blows up"""
+    baseline_p99 = None
+    for run in sorted(runs, key=lambda r: r["rate"]):
+        p99 = run["latency"]["p99"]
+        if baseline_p99 is None:
+            baseline_p99 = p99
+        if (
+            run["error_rate"] > 0.01
+            or run["max_waiting"] > run["concurrency"]
+            or (baseline_p99 and p99 and p99 > 5 * baseline_p99)
+        ):
+            return run["rate"]
+    return None
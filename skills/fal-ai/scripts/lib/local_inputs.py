@@ -0,0 +1,78 @@
+"""Local file paths as media inputs: inline small files, upload large ones"""
+import base64
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from .logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+MEDIA_KEYS = ("image_url", "audio_url", "video_url", "first_frame_url", "last_frame_url")
+REMOTE_PREFIXES = ("http://", "https://", "data:")
+DEFAULT_INLINE_MAX_BYTES = 512 * 1024
+
+
+def inline_max_bytes() -> int:
+    """Largest file sent inline as a data URI (FAL_INLINE_MAX_BYTES, 0 = always upload)"""
+    value = os.environ.get("FAL_INLINE_MAX_BYTES")
+    return int(value) if value not in (None, "") else DEFAULT_INLINE_MAX_BYTES
+
+
+def is_remote(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(REMOTE_PREFIXES)
+
+
+def local_path(value: Any) -> str:
+    """Expanded path for a local file argument; raises if it is neither a URL nor a file"""
+    path = os.path.expanduser(value)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Not a URL or an existing file: {value}")
+    return path
+
+
+def to_data_uri(path: str) -> str:
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("ascii")
+    return f"data:{mime};base64,{encoded}"
+
+
+def resolve_local_inputs(
+    client,
+    input_data: Dict[str, Any],
+    keys=MEDIA_KEYS,
+    max_bytes: int = None,
+    max_concurrency: int = 4
+) -> Dict[str, Any]:
+    """
+    Replace local paths under `keys` with something fal can fetch.
+
+    Files up to max_bytes are embedded as data URIs (no upload round trip);
+    larger files are uploaded, concurrently when there are several.
+    Returns a new dict; URLs and data URIs pass through unchanged.
+    """
+    max_bytes = inline_max_bytes() if max_bytes is None else max_bytes
+    resolved = dict(input_data)
+    uploads: List[str] = []
+
+    for key in keys:
+        value = resolved.get(key)
+        if not isinstance(value, str) or is_remote(value):
+            continue
+        path = local_path(value)
+        if os.path.getsize(path) <= max_bytes:
+            logger.info(f"Sending {value} inline ({os.path.getsize(path)} bytes)")
+            resolved[key] = to_data_uri(path)
+        else:
+            uploads.append(key)
+
+    if uploads:
+        paths = [local_path(resolved[key]) for key in uploads]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(paths))),
+                                thread_name_prefix="upload") as executor:
+            for key, url in zip(uploads, executor.map(client.upload_file, paths)):
+                resolved[key] = url
+
+    return resolved
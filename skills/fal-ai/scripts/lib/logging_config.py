@@ -1,9 +1,179 @@
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_DIR = os.path.expanduser("~/.config/fal-skill/logs")
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and
+# is written as a field of the JSON line.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, pid plus any extras"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _file_handler_class():
+    from logging.handlers import RotatingFileHandler
+
+    class SharedRotatingFileHandler(RotatingFileHandler):
+        """
+        RotatingFileHandler that tolerates other processes rotating the same file.
+
+        Before rolling over, check whether the open stream still points at the
+        current log file; if another process already rotated it, reopen
+        instead of rotating a second time.
+        """
+
+        def shouldRollover(self, record):
+            if self.stream is not None:
+                try:
+                    current = os.stat(self.baseFilename)
+                    opened = os.fstat(self.stream.fileno())
+                    if (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+                        self.stream.close()
+                        self.stream = self._open()
+                except OSError:
+                    pass
+            return super().shouldRollover(record)
+
+    return SharedRotatingFileHandler
+
+
+class _QueueingHandler(logging.Handler):
+    """
+    Shared handler that hands records to a background QueueListener.
+
+    Logging calls only enqueue; the console and JSON-lines file writes happen
+    on the listener thread. The queue, listener and file are created on the
+    first record, so importing a lib module opens nothing.
+    """
+
+    def __init__(self, console_level: int):
+        super().__init__(logging.DEBUG)
+        self.console_level = console_level
+        self._queue_handler = None
+        self._listener = None
+
+    def _build_targets(self):
+        # Console handler
+        console = logging.StreamHandler()
+        console.setLevel(self.console_level)
+        console.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        targets = [console]
+
+        # File handler (optional, only if log directory can be created)
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            file_handler = _file_handler_class()(
+                os.path.join(LOG_DIR, 'fal-skill.log'),
+                maxBytes=1_000_000,  # 1MB
+                backupCount=3,
+                delay=True
+            )
+            file_handler.setLevel(logging.DEBUG)  # Always debug in file
+            file_handler.setFormatter(JSONLinesFormatter())
+            targets.append(file_handler)
+        except (OSError, PermissionError):
+            # If we can't create log directory, just use console
+            pass
+
+        return targets
+
+    def _start(self):
+        import atexit
+        import queue
+        from logging.handlers import QueueHandler, QueueListener
+
+        log_queue = queue.SimpleQueue()
+        self._queue_handler = QueueHandler(log_queue)
+        self._listener = QueueListener(log_queue, *self._build_targets(), respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def emit(self, record):
+        if self._queue_handler is None:
+            self._start()
+        self._queue_handler.emit(record)
+
+    def stop(self):
+        """Drain the queue and stop the writer thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            for target in self._listener.handlers:
+                target.close()
+            self._listener = None
+            self._queue_handler = None
+
+
+class ProgressSampler:
+    """
+    Rate limiter for high-volume progress logs.
+
+    Duplicate entries (the queue re-sends earlier log lines on every poll) are
+    dropped, and at most one line per `interval` seconds is let through; the
+    number of lines skipped in between is reported with the next one.
+    Interval defaults to FAL_PROGRESS_LOG_INTERVAL (seconds, 0 logs everything).
+    """
+
+    def __init__(self, interval: float = None):
+        if interval is None:
+            interval = float(os.environ.get("FAL_PROGRESS_LOG_INTERVAL", "5"))
+        self.interval = interval
+        self._seen = set()
+        self._last = None
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def sample(self, entry) -> tuple:
+        """Return (should_log, suppressed_since_last) for a progress log entry"""
+        if isinstance(entry, dict):
+            key = (entry.get("timestamp"), entry.get("message"))
+        else:
+            key = (None, str(entry))
+
+        with self._lock:
+            if key in self._seen:
+                return False, 0
+            self._seen.add(key)
+
+            now = time.monotonic()
+            if self._last is not None and now - self._last < self.interval:
+                self._suppressed += 1
+                return False, 0
+
+            self._last = now
+            suppressed, self._suppressed = self._suppressed, 0
+            return True, suppressed
+
+
+_shared_handler = None
+
 
 def setup_logging(name: str = "fal-skill", level: str = None):
     """Configure logging for fal-skill"""
+    global _shared_handler
 
     # Get log level from environment or parameter
     if level is None:
@@ -19,32 +189,8 @@ def setup_logging(name: str = "fal-skill", level: str = None):
     if logger.handlers:
         return logger
 
-    # Console handler
-    console = logging.StreamHandler()
-    console.setLevel(log_level)
-    console_fmt = logging.Formatter(
-        '%(levelname)s: %(message)s'
-    )
-    console.setFormatter(console_fmt)
-    logger.addHandler(console)
-
-    # File handler (optional, only if log directory exists)
-    log_dir = os.path.expanduser("~/.config/fal-skill/logs")
-    try:
-        os.makedirs(log_dir, exist_ok=True)
-        file_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'fal-skill.log'),
-            maxBytes=1_000_000,  # 1MB
-            backupCount=3
-        )
-        file_handler.setLevel(logging.DEBUG)  # Always debug in file
-        file_fmt = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(file_fmt)
-        logger.addHandler(file_handler)
-    except (OSError, PermissionError):
-        # If we can't create log directory, just use console
-        pass
+    if _shared_handler is None:
+        _shared_handler = _QueueingHandler(log_level)
+    logger.addHandler(_shared_handler)
 
     return logger
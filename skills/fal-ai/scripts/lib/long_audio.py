@@ -0,0 +1,403 @@
+"""Chunked, parallel transcription of long local WAV/PCM recordings"""
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+FRAME_SECONDS = 0.05  # Energy analysis resolution
+
+
+class AudioChunk:
+    """One slice of the source recording, written to its own WAV file"""
+
+    def __init__(self, index: int, path: str, offset: float, duration: float):
+        self.index = index
+        self.path = path
+        self.offset = offset
+        self.duration = duration
+
+    @property
+    def end(self) -> float:
+        return self.offset + self.duration
+
+
+class _PCMSource:
+    """Uniform reader over a WAV file or raw little-endian PCM"""
+
+    def __init__(self, path: str, sample_rate: int, channels: int, sample_width: int):
+        self.path = path
+        if path.lower().endswith((".wav", ".wave")):
+            self._wav = wave.open(path, "rb")
+            self.sample_rate = self._wav.getframerate()
+            self.channels = self._wav.getnchannels()
+            self.sample_width = self._wav.getsampwidth()
+            self.frames = self._wav.getnframes()
+            self._raw = None
+        else:
+            self._wav = None
+            self._raw = open(path, "rb")
+            self.sample_rate = sample_rate
+            self.channels = channels
+            self.sample_width = sample_width
+            self.frames = os.path.getsize(path) // (channels * sample_width)
+
+    @property
+    def duration(self) -> float:
+        return self.frames / float(self.sample_rate)
+
+    def seek(self, frame: int):
+        if self._wav:
+            self._wav.setpos(frame)
+        else:
+            self._raw.seek(frame * self.channels * self.sample_width)
+
+    def read(self, frames: int) -> bytes:
+        if self._wav:
+            return self._wav.readframes(frames)
+        return self._raw.read(frames * self.channels * self.sample_width)
+
+    def close(self):
+        (self._wav or self._raw).close()
+
+
+def _rms(data: bytes, sample_width: int) -> float:
+    """Root-mean-square amplitude of little-endian PCM samples"""
+    if sample_width == 1:
+        samples = [b - 128 for b in data]
+    elif sample_width in (2, 4):
+        samples = array("h" if sample_width == 2 else "i")
+        samples.frombytes(data[:len(data) - len(data) % sample_width])
+        if sys.byteorder == "big":
+            samples.byteswap()
+    else:
+        samples = [int.from_bytes(data[i:i + sample_width], "little", signed=True)
+                   for i in range(0, len(data) - sample_width + 1, sample_width)]
+    if not len(samples):
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def _energy_profile(source: _PCMSource) -> List[float]:
+    """RMS per FRAME_SECONDS block, streamed so the whole file is never in memory"""
+    block = max(1, int(source.sample_rate * FRAME_SECONDS))
+    source.seek(0)
+    energy = []
+    while True:
+        data = source.read(block)
+        if not data:
+            break
+        energy.append(_rms(data, source.sample_width))
+    return energy
+
+
+def _silence_cut(energy: List[float], target: float, search: float, min_silence: float) -> float:
+    """Quietest min_silence-long stretch in [target - search, target]; returns its midpoint (seconds)"""
+    hi = min(len(energy), int(target / FRAME_SECONDS))
+    lo = max(0, int((target - search) / FRAME_SECONDS))
+    width = max(1, int(min_silence / FRAME_SECONDS))
+    if hi - lo <= width:
+        return target
+
+    best, best_start = None, lo
+    for start in range(lo, hi - width + 1):
+        window = sum(energy[start:start + width])
+        if best is None or window <= best:
+            # Ties go to the latest quiet stretch so chunks stay close to full length
+            best, best_start = window, start
+    return (best_start + width / 2.0) * FRAME_SECONDS
+
+
+def plan_chunks(
+    duration: float,
+    window: float,
+    overlap: float,
+    energy: Optional[List[float]] = None,
+    min_silence: float = 0.3
+) -> List[Tuple[float, float]]:
+    """
+    (start, end) seconds for each chunk.
+
+    With an energy profile, cuts move back to the quietest point within the
+    last 20% of each window. Each chunk but the last runs on for overlap
+    seconds past its cut (the next chunk starts at the cut), so words spoken
+    across a cut are heard complete by one of the chunks.
+    """
+    if window <= 0 or duration <= window:
+        return [(0.0, duration)]
+    if overlap >= window:
+        raise ValueError("Chunk overlap must be shorter than the chunk window")
+
+    spans = []
+    start = 0.0
+    while start < duration:
+        cut = start + window - overlap
+        if duration - start <= window * 1.25:
+            # Fold a short tail into the last chunk rather than sending a sliver
+            spans.append((start, duration))
+            break
+        if energy:
+            cut = max(start + window / 2.0, _silence_cut(energy, cut, window * 0.2, min_silence))
+        spans.append((start, min(duration, cut + overlap)))
+        start = cut
+    return spans
+
+
+def split_audio(
+    path: str,
+    out_dir: str,
+    window: float = 300.0,
+    overlap: float = 2.0,
+    mode: str = "silence",
+    sample_rate: int = 16000,
+    channels: int = 1,
+    sample_width: int = 2
+) -> List[AudioChunk]:
+    """Split a WAV (or raw PCM with the given format) into WAV chunk files"""
+    source = _PCMSource(path, sample_rate, channels, sample_width)
+    try:
+        energy = _energy_profile(source) if mode == "silence" else None
+        spans = plan_chunks(source.duration, window, overlap, energy)
+
+        chunks = []
+        for index, (start, end) in enumerate(spans):
+            first = int(start * source.sample_rate)
+            last = min(source.frames, int(math.ceil(end * source.sample_rate)))
+            chunk_path = os.path.join(out_dir, f"chunk-{index:04d}.wav")
+            source.seek(first)
+
+            with wave.open(chunk_path, "wb") as out:
+                out.setnchannels(source.channels)
+                out.setsampwidth(source.sample_width)
+                out.setframerate(source.sample_rate)
+                remaining = last - first
+                while remaining > 0:
+                    data = source.read(min(remaining, source.sample_rate * 10))
+                    if not data:
+                        break
+                    out.writeframes(data)
+                    remaining -= len(data) // (source.channels * source.sample_width)
+
+            chunks.append(AudioChunk(index, chunk_path, first / source.sample_rate,
+                                     (last - first) / source.sample_rate))
+        return chunks
+    finally:
+        source.close()
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^\w]", "", (text or "").lower())
+
+
+def _shift(item: Dict[str, Any], offset: float) -> Dict[str, Any]:
+    """Copy of a word/segment with absolute timestamps"""
+    shifted = dict(item)
+    for key in ("start", "end"):
+        if isinstance(shifted.get(key), (int, float)):
+            shifted[key] = round(shifted[key] + offset, 3)
+    timestamp = shifted.get("timestamp")
+    if isinstance(timestamp, (list, tuple)):
+        shifted["timestamp"] = [round(t + offset, 3) if isinstance(t, (int, float)) else t for t in timestamp]
+    return shifted
+
+
+def _start(item: Dict[str, Any]) -> Optional[float]:
+    if isinstance(item.get("start"), (int, float)):
+        return item["start"]
+    timestamp = item.get("timestamp")
+    if isinstance(timestamp, (list, tuple)) and timestamp and isinstance(timestamp[0], (int, float)):
+        return timestamp[0]
+    return None
+
+
+def _within(item: Dict[str, Any], lo: float, hi: float) -> bool:
+    start = _start(item)
+    return start is not None and lo <= start <= hi
+
+
+def _timed(items: List[Dict[str, Any]], default: float) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Pair items with their start. Items without a timestamp take the start of
+    the item before them (the first timestamped one if they lead), or
+    default when nothing in the chunk is timestamped.
+    """
+    last = next((start for start in map(_start, items) if start is not None), default)
+    timed = []
+    for item in items:
+        start = _start(item)
+        if start is None:
+            start = last
+        last = start
+        timed.append((start, item))
+    return timed
+
+
+def _items_key(result: Dict[str, Any]) -> Optional[str]:
+    """Which list in the result carries timestamped items"""
+    for key in ("words", "segments", "chunks"):
+        if isinstance(result.get(key), list):
+            return key
+    return None
+
+
+def _fresh_speaker(label: str, taken: set) -> str:
+    """Next unused id in the style of label (speaker_3 -> speaker_4, ...)"""
+    match = re.match(r"^(.*?)(\d+)$", str(label))
+    prefix, number = (match.group(1), int(match.group(2))) if match else (f"{label}_", 0)
+    while f"{prefix}{number}" in taken:
+        number += 1
+    return f"{prefix}{number}"
+
+
+def _speaker_mapping(
+    previous: List[Dict[str, Any]],
+    current: List[Dict[str, Any]],
+    lo: float,
+    hi: float
+) -> Dict[str, str]:
+    """
+    Map this chunk's speaker ids onto earlier ids using words heard in the overlap.
+
+    previous items already carry global speaker ids, so they are voted for as is.
+    """
+    votes: Dict[Tuple[str, str], int] = {}
+    earlier = [w for w in previous if _within(w, lo, hi) and w.get("speaker_id") and _normalize(w.get("text"))]
+    for word in current:
+        if not _within(word, lo, hi) or not word.get("speaker_id"):
+            continue
+        text = _normalize(word.get("text"))
+        if not text:
+            continue
+        for other in earlier:
+            if _normalize(other.get("text")) == text and abs(_start(other) - _start(word)) < 0.5:
+                pair = (word["speaker_id"], other["speaker_id"])
+                votes[pair] = votes.get(pair, 0) + 1
+                break
+
+    mapping: Dict[str, str] = {}
+    taken = set()
+    for (local, global_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if local not in mapping and global_id not in taken:
+            mapping[local] = global_id
+            taken.add(global_id)
+    return mapping
+
+
+def merge_transcripts(chunks: List[AudioChunk], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-chunk transcripts into one.
+
+    Timestamps are shifted by each chunk's offset. In each overlap, items
+    from the earlier chunk are kept before the overlap midpoint and items
+    from the later chunk after it; items without a timestamp go with the
+    item before them. Speaker ids are carried across chunks by matching
+    words heard in both halves of an overlap.
+    """
+    key = next((k for k in (_items_key(r) for r in results) if k), None)
+    if key is None:
+        text = " ".join((r.get("text") or "").strip() for r in results if r.get("text"))
+        return {"text": text}
+
+    kept: List[Tuple[float, Dict[str, Any]]] = []
+    previous_items: List[Dict[str, Any]] = []
+    seen_speakers = set()
+    previous_end = None
+
+    for chunk, result in zip(chunks, results):
+        # An untimed chunk is placed after the overlap so none of it is trimmed
+        timed = _timed([_shift(item, chunk.offset) for item in result.get(key) or []],
+                       previous_end if previous_end is not None else chunk.offset)
+
+        if previous_end is not None and chunk.offset < previous_end:
+            lo, hi = chunk.offset, previous_end
+            midpoint = (lo + hi) / 2.0
+            chunk_map = _speaker_mapping(previous_items, [item for _, item in timed], lo, hi)
+            kept = [(start, item) for start, item in kept if start < midpoint]
+            timed = [(start, item) for start, item in timed if start >= midpoint]
+        else:
+            chunk_map = {}
+        items = [item for _, item in timed]
+
+        local_map = dict(chunk_map)
+        claimed = set(chunk_map.values())
+        for item in items:
+            speaker = item.get("speaker_id")
+            if speaker is None:
+                continue
+            if speaker not in local_map:
+                # Unmatched speakers keep their label unless a matched one already took it
+                label = speaker if speaker not in claimed else _fresh_speaker(speaker, claimed | seen_speakers)
+                local_map[speaker] = label
+                claimed.add(label)
+            item["speaker_id"] = local_map[speaker]
+        seen_speakers.update(local_map.values())
+
+        previous_items = [_shift(item, chunk.offset) for item in result.get(key) or []]
+        for item in previous_items:
+            if item.get("speaker_id") in local_map:
+                item["speaker_id"] = local_map[item["speaker_id"]]
+        kept.extend(timed)
+        previous_end = chunk.end
+
+    merged = [item for _, item in kept]
+    if any(item.get("type") == "spacing" for item in merged):
+        text = "".join(item.get("text", "") for item in merged)
+    else:
+        text = " ".join((item.get("text") or "").strip() for item in merged if item.get("text"))
+
+    output = {k: v for k, v in results[0].items() if k not in (key, "text")}
+    output["text"] = text.strip()
+    output[key] = merged
+    return output
+
+
+def transcribe_long_audio(
+    client,
+    path: str,
+    endpoint_id: str,
+    input_data: Dict[str, Any],
+    window: float = 300.0,
+    overlap: float = 2.0,
+    mode: str = "silence",
+    max_concurrency: int = 4,
+    pcm_format: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    """
+    Split a local recording, upload and transcribe chunks concurrently, merge.
+
+    input_data holds the extra model parameters (language, num_speakers, ...);
+    audio_url is filled in per chunk.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix="fal-transcribe-") as work_dir:
+        chunks = split_audio(path, work_dir, window=window, overlap=overlap, mode=mode, **(pcm_format or {}))
+        logger.info(f"Transcribing {len(chunks)} chunks with up to {max_concurrency} in parallel")
+
+        def transcribe(chunk: AudioChunk) -> Tuple[Dict[str, Any], float]:
+            chunk_started = time.monotonic()
+            audio_url = client.upload_file(chunk.path)
+            result = client.run_model(endpoint_id, {**input_data, "audio_url": audio_url})
+            return result, round(time.monotonic() - chunk_started, 3)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="transcribe") as executor:
+            outcomes = list(executor.map(transcribe, chunks))
+
+    merged = merge_transcripts(chunks, [result for result, _ in outcomes])
+    merged["chunk_timings"] = [
+        {"index": c.index, "offset": round(c.offset, 3), "duration": round(c.duration, 3), "seconds": seconds}
+        for c, (_, seconds) in zip(chunks, outcomes)
+    ]
+    merged["wall_seconds"] = round(time.monotonic() - started, 3)
+    return merged
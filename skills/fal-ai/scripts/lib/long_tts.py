@@ -0,0 +1,329 @@
+"""Sentence-chunked parallel TTS with ordered stitching into one audio file"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .download import download_file
+from .logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+# Characters per request; conservative so each chunk finishes well inside the queue timeout
+MAX_TEXT_CHARS = {
+    "fal-ai/elevenlabs/tts": 2500,
+    "fal-ai/minimax/speech": 2500,
+    "fal-ai/kokoro": 1000,
+    "fal-ai/qwen-3-tts": 1000,
+}
+DEFAULT_MAX_TEXT_CHARS = 1000
+
+SENTENCE_END = ".!?…"
+CJK_SENTENCE_END = "。！？；"
+CLOSERS = "\"'”’)]」』）"
+CLAUSE_BREAK = re.compile(r"(?<=[,;:，、：])\s*")
+
+
+def max_chars_for(endpoint_id: str) -> int:
+    """Per-request text limit for an endpoint (longest matching prefix wins)"""
+    matches = [prefix for prefix in MAX_TEXT_CHARS if endpoint_id.startswith(prefix)]
+    return MAX_TEXT_CHARS[max(matches, key=len)] if matches else DEFAULT_MAX_TEXT_CHARS
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """Split on sentence punctuation, keeping closing quotes/brackets with their sentence"""
+    sentences = []
+    start = 0
+    i = 0
+    n = len(paragraph)
+    while i < n:
+        char = paragraph[i]
+        cjk = char in CJK_SENTENCE_END
+        if cjk or char in SENTENCE_END:
+            end = i + 1
+            while end < n and (paragraph[end] in SENTENCE_END or paragraph[end] in CJK_SENTENCE_END
+                               or paragraph[end] in CLOSERS):
+                end += 1
+            # Latin punctuation only ends a sentence before whitespace ("3.14", "e.g.x" stay whole)
+            if cjk or end == n or paragraph[end].isspace():
+                sentence = paragraph[start:end].strip()
+                if sentence:
+                    sentences.append(sentence)
+                start = end
+            i = end
+            continue
+        i += 1
+
+    tail = paragraph[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Break an over-long sentence at clause punctuation, then spaces, then hard cuts"""
+    pieces = []
+    for clause in (c for c in CLAUSE_BREAK.split(sentence) if c):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars + 1)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+
+    # Re-pack clauses so chunks aren't needlessly short
+    packed: List[str] = []
+    for piece in pieces:
+        if packed and len(packed[-1]) + 1 + len(piece) <= max_chars:
+            packed[-1] = f"{packed[-1]} {piece}"
+        else:
+            packed.append(piece)
+    return packed
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """
+    Pack text into chunks of at most max_chars.
+
+    Paragraphs (blank-line separated) and sentences are kept whole whenever
+    they fit; sentences are never merged across a paragraph break that would
+    push a chunk over the limit.
+    """
+    if max_chars <= 0:
+        raise ValueError("max_chars must be positive")
+
+    chunks: List[str] = []
+    for paragraph in (p.strip() for p in re.split(r"\n\s*\n", text)):
+        if not paragraph:
+            continue
+        if chunks and len(chunks[-1]) + 2 + len(paragraph) <= max_chars:
+            chunks[-1] = f"{chunks[-1]}\n\n{paragraph}"
+            continue
+
+        current = ""
+        for sentence in split_sentences(paragraph):
+            for piece in ([sentence] if len(sentence) <= max_chars else _split_long(sentence, max_chars)):
+                joiner = "" if current and current[-1] in CJK_SENTENCE_END else " "
+                if current and len(current) + len(joiner) + len(piece) <= max_chars:
+                    current = f"{current}{joiner}{piece}"
+                else:
+                    if current:
+                        chunks.append(current)
+                    current = piece
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _audio_format(path: str) -> str:
+    with open(path, "rb") as f:
+        header = f.read(12)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return "unknown"
+
+
+def _mp3_audio_bounds(data: bytes) -> slice:
+    """Slice of an MP3 file without its ID3v2 header and ID3v1 trailer"""
+    start = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data) - 128 if len(data) >= 128 and data[-128:-125] == b"TAG" else len(data)
+    return slice(start, end)
+
+
+class _WavStitcher:
+    """Append WAV segments in order, crossfading 16-bit PCM at each joint"""
+
+    def __init__(self, path: str, crossfade_ms: float):
+        self.path = path
+        self.crossfade_ms = crossfade_ms
+        self.params = None
+        self.writer = None
+        self.tail = b""
+        self.frames = 0
+
+    def append(self, segment_path: str):
+        with wave.open(segment_path, "rb") as segment:
+            params = (segment.getnchannels(), segment.getsampwidth(), segment.getframerate())
+            data = segment.readframes(segment.getnframes())
+
+        if self.writer is None:
+            self.params = params
+            self.writer = wave.open(self.path, "wb")
+            self.writer.setnchannels(params[0])
+            self.writer.setsampwidth(params[1])
+            self.writer.setframerate(params[2])
+        elif params != self.params:
+            raise ValueError(f"Audio segments differ in format: {params} vs {self.params}")
+
+        channels, width, rate = self.params
+        frame_bytes = channels * width
+        fade = int(rate * self.crossfade_ms / 1000.0) * frame_bytes if width == 2 else 0
+        fade = min(fade, len(self.tail), len(data) // 2 // frame_bytes * frame_bytes)
+
+        if fade:
+            data = self._mix(self.tail[-fade:], data[:fade]) + data[fade:]
+            self._write(self.tail[:-fade])
+        else:
+            self._write(self.tail)
+
+        # Hold back the end of this segment so the next one can fade into it
+        keep = int(rate * self.crossfade_ms / 1000.0) * frame_bytes if width == 2 else 0
+        keep = min(keep, len(data) // frame_bytes * frame_bytes)
+        self._write(data[:len(data) - keep])
+        self.tail = data[len(data) - keep:]
+
+    @staticmethod
+    def _mix(outgoing: bytes, incoming: bytes) -> bytes:
+        a, b = array("h"), array("h")
+        a.frombytes(outgoing)
+        b.frombytes(incoming)
+        if sys.byteorder == "big":
+            a.byteswap()
+            b.byteswap()
+        n = len(a)
+        mixed = array("h", (
+            max(-32768, min(32767, int(a[i] * (1 - i / n) + b[i] * (i / n))))
+            for i in range(n)
+        ))
+        if sys.byteorder == "big":
+            mixed.byteswap()
+        return mixed.tobytes()
+
+    def _write(self, data: bytes):
+        if data:
+            self.writer.writeframes(data)
+            self.frames += len(data) // (self.params[0] * self.params[1])
+
+    def close(self) -> Optional[float]:
+        if self.writer is None:
+            return None
+        self._write(self.tail)
+        self.tail = b""
+        self.writer.close()
+        return round(self.frames / float(self.params[2]), 3)
+
+
+class _Mp3Joiner:
+    """Concatenate MP3 segments frame-wise, dropping the ID3 tags of all but the first"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.count = 0
+
+    def append(self, segment_path: str):
+        with open(segment_path, "rb") as f:
+            data = f.read()
+        self.file.write(data if not self.count else data[_mp3_audio_bounds(data)])
+        self.file.flush()
+        self.count += 1
+
+    def close(self) -> Optional[float]:
+        self.file.close()
+        return None
+
+
+def synthesize_long_text(
+    client,
+    endpoint_id: str,
+    text: str,
+    input_data: Dict[str, Any],
+    output_path: str,
+    max_chars: Optional[int] = None,
+    max_concurrency: int = 4,
+    crossfade_ms: float = 30.0,
+    adapter=None
+) -> Dict[str, Any]:
+    """
+    Synthesize text in parallel chunks and stitch the audio, in order, into output_path.
+
+    Segments are appended to output_path as soon as every earlier segment is
+    in, so playback can start after the first chunk rather than the whole
+    document (time_to_first_audio); on failure the partial file is removed. WAV
+    segments are crossfaded; MP3 segments are joined frame-wise (no
+    crossfade, since that would need decoding).
+    """
+    limit = min(max_chars, max_chars_for(endpoint_id)) if max_chars else max_chars_for(endpoint_id)
+    chunks = split_text(text, limit)
+    if not chunks:
+        raise ValueError("No text to synthesize")
+
+    started = time.monotonic()
+    extract_lock = threading.Lock()
+    logger.info(f"Synthesizing {len(chunks)} chunks (≤{limit} chars) with up to {max_concurrency} in parallel")
+
+    with tempfile.TemporaryDirectory(prefix="fal-tts-") as work_dir:
+
+        def synthesize(index: int) -> Dict[str, Any]:
+            chunk_started = time.monotonic()
+            result = client.run_model(endpoint_id, {**input_data, "text": chunks[index]})
+            with extract_lock:
+                url = adapter.extract_result(result, endpoint_id)
+            if not url:
+                raise ValueError(f"Could not extract audio URL for chunk {index}")
+            path = os.path.join(work_dir, f"segment-{index:04d}")
+            download_file(url, path)
+            return {"index": index, "chars": len(chunks[index]), "url": url, "path": path,
+                    "seconds": round(time.monotonic() - chunk_started, 3)}
+
+        directory = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(directory, exist_ok=True)
+
+        segments = []
+        audio_format = None
+        first_audio = None
+        duration = None
+        stitcher = None
+        finished = False
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="tts") as executor:
+                futures = [executor.submit(synthesize, i) for i in range(len(chunks))]
+                for future in futures:
+                    segment = future.result()
+                    segment_format = _audio_format(segment["path"])
+                    if stitcher is None:
+                        audio_format = segment_format
+                        if audio_format == "wav":
+                            stitcher = _WavStitcher(output_path, crossfade_ms)
+                        elif audio_format == "mp3":
+                            stitcher = _Mp3Joiner(output_path)
+                        else:
+                            raise ValueError("Only WAV and MP3 segments can be stitched")
+                    elif segment_format != audio_format:
+                        raise ValueError(f"Chunk {segment['index']} returned {segment_format}, expected {audio_format}")
+
+                    stitcher.append(segment["path"])
+                    if first_audio is None:
+                        first_audio = round(time.monotonic() - started, 3)
+                    os.remove(segment.pop("path"))
+                    segments.append(segment)
+            finished = True
+        finally:
+            if stitcher is not None:
+                duration = stitcher.close()
+                # A partial file is not the requested audio
+                if not finished and os.path.exists(output_path):
+                    os.remove(output_path)
+
+    output = {
+        "path": output_path,
+        "format": audio_format,
+        "chunks": len(chunks),
+        "time_to_first_audio": first_audio,
+        "wall_seconds": round(time.monotonic() - started, 3),
+        "segments": segments
+    }
+    if duration is not None:
+        output["duration"] = duration
+    return output
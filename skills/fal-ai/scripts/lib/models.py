@@ -2,6 +2,7 @@ import os
 import yaml
 from typing import Dict, List, Optional, Any
 from .logging_config import setup_logging
+from .tracing import span
 
 logger = setup_logging(__name__)
 
@@ -41,6 +42,13 @@ class ModelRegistry:
         prefer_curated: bool = True
     ) -> Optional[Dict[str, Any]]:
         """Get best model for a category"""
+        with span("model.resolve", **{"fal.category": category}) as current:
+            model, source = self._resolve_model(category, prefer_curated)
+            current.set(**{"fal.endpoint": model.get("endpoint_id") if model else None, "model.source": source})
+            return model
+
+    def _resolve_model(self, category: str, prefer_curated: bool):
+        """(model, "curated" | "discovered") for a category, or (None, None)"""
 
         # First check curated models
         if prefer_curated and category in self.curated_models.get("categories", {}):
@@ -49,21 +57,25 @@ class ModelRegistry:
             # Find recommended model
             for model in category_models:
                 if model.get("recommended", False):
-                    return model
+                    return model, "curated"
 
             # Return first model if no recommendation
             if category_models:
-                return category_models[0]
+                return category_models[0], "curated"
 
-        # Fallback to discovered models
+        # Fallback to discovered models. Only the first is needed, but the pages are
+        # read to the end: discovery writes the category's cache once the last page is in
+        first = None
         try:
-            discovered = self.discovery.discover_by_category(category)
-            if discovered:
-                return self._convert_discovered_to_model(discovered[0])
+            for page in self.discovery.discover_by_category(category):
+                if page and first is None:
+                    first = page[0]
         except Exception as e:
             logger.warning(f"Could not discover models for {category}: {e}")
 
-        return None
+        if first is None:
+            return None, None
+        return self._convert_discovered_to_model(first), "discovered"
 
     def _convert_discovered_to_model(self, discovered_model: Dict[str, Any]) -> Dict[str, Any]:
         """Convert API response format to internal model format"""
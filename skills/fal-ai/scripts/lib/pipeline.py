@@ -0,0 +1,281 @@
+"""Declarative multi-step pipelines executed as a DAG in one process"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from .logging_config import setup_logging
+from .utils import atomic_write
+
+logger = setup_logging(__name__)
+
+# ${step.url} or ${step.result.some.path[0]}
+REFERENCE = re.compile(r"\$\{([A-Za-z0-9_-]+)\.(url|result(?:[.\[][^}]*)?)\}")
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    """Load a pipeline spec from YAML (or JSON, which is valid YAML)"""
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+
+    if not isinstance(spec, dict) or not spec.get("steps"):
+        raise ValueError(f"Pipeline spec {path} has no steps")
+    return spec
+
+
+def resolve_path(data: Any, path: str) -> Any:
+    """Look up a dot/bracket path such as 'words[0].text' (None if missing)"""
+    current = data
+    for part in (p for p in re.split(r"\.|\[|\]", path) if p):
+        try:
+            current = current[int(part)] if part.isdigit() else current[part]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return current
+
+
+def _references(value: Any) -> Set[str]:
+    """Names of steps referenced anywhere inside an input value"""
+    if isinstance(value, str):
+        return {match.group(1) for match in REFERENCE.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(_references(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(_references(v) for v in value)) if value else set()
+    return set()
+
+
+class Pipeline:
+    """
+    Run a DAG of fal.ai steps, feeding each step's extracted URL (or any
+    field of its raw result) into the steps that reference it.
+
+    Steps whose dependencies are satisfied run concurrently, completed steps
+    are recorded in a checkpoint file so a re-run skips them (unless their
+    resolved input changed), and a failed step only skips its dependents.
+    """
+
+    def __init__(
+        self,
+        spec: Dict[str, Any],
+        client,
+        checkpoint_path: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        adapter=None
+    ):
+        self.name = spec.get("name", "pipeline")
+        self.steps = self._normalize_steps(spec["steps"])
+        self.client = client
+        self.checkpoint_path = checkpoint_path
+        self.max_concurrency = max_concurrency or int(spec.get("max_concurrency", 4))
+        self.adapter = adapter
+        self._lock = threading.Lock()
+        self.dependencies = {name: self._dependencies(name, step) for name, step in self.steps.items()}
+        self.order = self._topological_order()
+
+    @staticmethod
+    def _normalize_steps(steps: Any) -> Dict[str, Dict[str, Any]]:
+        """Accept either {name: step} or [{name: ..., ...}] and validate fields"""
+        if isinstance(steps, list):
+            named = {}
+            for step in steps:
+                if not isinstance(step, dict) or not step.get("name"):
+                    raise ValueError("Each pipeline step in a list needs a 'name'")
+                if step["name"] in named:
+                    raise ValueError(f"Duplicate pipeline step: {step['name']}")
+                named[step["name"]] = step
+            steps = named
+
+        if not isinstance(steps, dict):
+            raise ValueError("Pipeline 'steps' must be a mapping or a list")
+
+        for name, step in steps.items():
+            if not re.match(r"^[A-Za-z0-9_-]+$", str(name)):
+                raise ValueError(f"Invalid step name: {name}")
+            if not isinstance(step, dict) or not step.get("endpoint"):
+                raise ValueError(f"Step '{name}' needs an 'endpoint'")
+            if not isinstance(step.get("input", {}), dict):
+                raise ValueError(f"Step '{name}' input must be a mapping")
+            needs = step.get("needs")
+            if isinstance(needs, str):
+                step["needs"] = [needs]
+            elif needs is not None and not isinstance(needs, list):
+                raise ValueError(f"Step '{name}' needs must be a step name or a list of step names")
+        return steps
+
+    def _dependencies(self, name: str, step: Dict[str, Any]) -> Set[str]:
+        deps = _references(step.get("input", {})) | set(step.get("needs", []) or [])
+        unknown = deps - set(self.steps)
+        if unknown:
+            raise ValueError(f"Step '{name}' references unknown steps: {', '.join(sorted(unknown))}")
+        if name in deps:
+            raise ValueError(f"Step '{name}' depends on itself")
+        return deps
+
+    def _topological_order(self) -> List[str]:
+        """Kahn's algorithm; raises on cycles"""
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle among: {', '.join(sorted(remaining))}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def validate_inputs(self):
+        """Check every step's input against models.yaml before running; references match any type"""
+        from .validation import validate_input
+
+        for name in self.order:
+            step = self.steps[name]
+            validate_input(step["endpoint"], step.get("input", {}),
+                           skip_value=lambda v: isinstance(v, str) and bool(REFERENCE.search(v)))
+
+    def _resolve(self, value: Any, outputs: Dict[str, Dict[str, Any]]) -> Any:
+        """Substitute ${step.url} / ${step.result.path} references with step outputs"""
+        if isinstance(value, dict):
+            return {k: self._resolve(v, outputs) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(v, outputs) for v in value]
+        if not isinstance(value, str):
+            return value
+
+        def lookup(match):
+            output = outputs[match.group(1)]
+            field = match.group(2)
+            if field == "url":
+                found = output.get("url")
+            else:
+                found = resolve_path(output.get("result"), field[len("result"):].lstrip("."))
+            if found is None:
+                raise ValueError(f"Step '{match.group(1)}' has no {field} for reference {match.group(0)}")
+            return found
+
+        whole = REFERENCE.fullmatch(value)
+        if whole:
+            # A lone reference keeps the referenced value's type
+            return lookup(whole)
+        return REFERENCE.sub(lambda m: str(lookup(m)), value)
+
+    @staticmethod
+    def _fingerprint(endpoint_id: str, input_data: Dict[str, Any]) -> str:
+        payload = json.dumps({"endpoint": endpoint_id, "input": input_data}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("steps", {})
+        except (json.JSONDecodeError, OSError):
+            logger.warning(f"Ignoring unreadable checkpoint {self.checkpoint_path}")
+            return {}
+
+    def _save_checkpoint(self, completed: Dict[str, Dict[str, Any]]):
+        if not self.checkpoint_path:
+            return
+        data = {
+            "pipeline": self.name,
+            "last_updated": datetime.utcnow().isoformat() + "Z",
+            "steps": completed
+        }
+        atomic_write(self.checkpoint_path, json.dumps(data, indent=2))
+
+    def _extract_url(self, result: Dict[str, Any], endpoint_id: str) -> Optional[str]:
+        if self.adapter is None:
+            return None
+        # ResponseAdapter learning state is shared, so extract one result at a time
+        with self._lock:
+            return self.adapter.extract_result(result, endpoint_id)
+
+    def _run_step(self, name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        step = self.steps[name]
+        endpoint_id = step["endpoint"]
+        started = time.monotonic()
+        logger.info(f"Pipeline step '{name}' → {endpoint_id}")
+
+        result = self.client.run_model(endpoint_id, input_data)
+
+        return {
+            "endpoint": endpoint_id,
+            "url": self._extract_url(result, endpoint_id),
+            "result": result,
+            "seconds": round(time.monotonic() - started, 3),
+            "fingerprint": self._fingerprint(endpoint_id, input_data),
+            "completed_at": datetime.utcnow().isoformat() + "Z"
+        }
+
+    def run(self) -> Dict[str, Any]:
+        """Execute all steps; returns per-step status, URLs and timings"""
+        checkpoint = self._load_checkpoint()
+        completed: Dict[str, Dict[str, Any]] = {}
+        status: Dict[str, Dict[str, Any]] = {}
+        pending = list(self.order)
+        running = {}
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.dependencies[name]
+                    if any(status.get(d, {}).get("status") in ("failed", "skipped") for d in deps):
+                        pending.remove(name)
+                        status[name] = {"status": "skipped", "reason": "dependency failed"}
+                        continue
+                    if not deps.issubset(completed):
+                        continue
+
+                    pending.remove(name)
+                    step = self.steps[name]
+                    try:
+                        input_data = self._resolve(step.get("input", {}), completed)
+                    except ValueError as e:
+                        logger.error(f"Pipeline step '{name}' failed: {e}")
+                        status[name] = {"status": "failed", "error": str(e)}
+                        continue
+                    cached = checkpoint.get(name)
+                    if cached and cached.get("fingerprint") == self._fingerprint(step["endpoint"], input_data):
+                        completed[name] = cached
+                        status[name] = {"status": "cached", "url": cached.get("url")}
+                        logger.info(f"Pipeline step '{name}' restored from checkpoint")
+                        continue
+
+                    running[executor.submit(self._run_step, name, input_data)] = name
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        output = future.result()
+                    except Exception as e:
+                        logger.error(f"Pipeline step '{name}' failed: {e}")
+                        status[name] = {"status": "failed", "error": str(e)}
+                        continue
+
+                    completed[name] = output
+                    status[name] = {"status": "completed", "url": output["url"], "seconds": output["seconds"]}
+                    with self._lock:
+                        self._save_checkpoint(completed)
+
+        return {
+            "pipeline": self.name,
+            "ok": all(s["status"] in ("completed", "cached") for s in status.values()),
+            "seconds": round(time.monotonic() - started, 3),
+            "steps": {name: status[name] for name in self.order}
+        }
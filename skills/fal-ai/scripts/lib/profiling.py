@@ -0,0 +1,191 @@
+"""Whole-invocation profiling: cProfile stats plus sampled wall and CPU stacks for flame graphs"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_DIR = "fal-profile"
+DEFAULT_INTERVAL = 0.005
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_cpu_clock(ident: int) -> Optional[int]:
+    """CPU clock id of a thread (Unix), or None where per-thread CPU time is unavailable"""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+class StackSampler:
+    """
+    Sample every thread's Python stack at a fixed interval.
+
+    Wall samples count where each thread is, waiting or not, so blocking
+    (network, locks, sleeps in poll loops) shows up. CPU samples weight the
+    same stacks by the CPU time the thread actually used since the previous
+    sample, so pure waits drop out.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.wall: Counter = Counter()        # stack -> samples
+        self.cpu: Counter = Counter()         # stack -> CPU microseconds
+        self.samples = 0
+        self._cpu_seen: Dict[int, Tuple[Optional[int], float]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fal-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _cpu_delta(self, ident: int) -> Optional[float]:
+        clock, last = self._cpu_seen.get(ident, (None, None))
+        if ident not in self._cpu_seen:
+            clock = _thread_cpu_clock(ident)
+        if clock is None:
+            self._cpu_seen[ident] = (None, 0.0)
+            return None
+        try:
+            now = time.clock_gettime(clock)
+        except OSError:
+            return None
+        self._cpu_seen[ident] = (clock, now)
+        return None if last is None else now - last
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                self.wall[key] += 1
+                delta = self._cpu_delta(ident)
+                if delta:
+                    self.cpu[key] += int(delta * 1e6)
+            self.samples += 1
+
+    @staticmethod
+    def write_folded(counts: Counter, path: str):
+        """Collapsed-stack lines ("frame;frame;frame count") for flamegraph.pl / speedscope"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                if count > 0:
+                    f.write(f"{stack} {count}\n")
+
+    def top_leaves(self, counts: Counter, limit: int = 10) -> List[Dict[str, object]]:
+        """Innermost frames carrying the most weight, per thread (idle helper threads show up as such)"""
+        leaves: Counter = Counter()
+        for stack, count in counts.items():
+            thread, _, rest = stack.partition(";")
+            leaves[f"{thread}: {rest.rsplit(';', 1)[-1]}"] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": frame, "share": round(count / total, 3)} for frame, count in leaves.most_common(limit)]
+
+
+def _split_argv(argv: List[str]) -> Tuple[Optional[str], List[str]]:
+    """(profile output dir or None, argv without --profile / --profile=DIR)"""
+    directory = None
+    rest = []
+    for arg in argv:
+        if arg == "--profile":
+            directory = DEFAULT_DIR
+        elif arg.startswith("--profile="):
+            directory = arg.split("=", 1)[1] or DEFAULT_DIR
+        else:
+            rest.append(arg)
+    if directory is None:
+        env = os.environ.get("FAL_PROFILE", "")
+        if env and env != "0":
+            directory = DEFAULT_DIR if env in ("1", "true", "yes") else env
+    return directory, rest
+
+
+def run_profiled(main: Callable[[], None], name: Optional[str] = None):
+    """
+    Run main(), profiling the whole invocation when --profile[=DIR] is on the
+    command line or FAL_PROFILE is set (1 or a directory).
+
+    Writes into DIR (default ./fal-profile):
+      <name>-<time>-<pid>.pstats       cProfile of the main thread (pstats, snakeviz)
+      <name>-<time>-<pid>.wall.folded  sampled stacks of all threads, by wall time
+      <name>-<time>-<pid>.cpu.folded   the same stacks weighted by CPU microseconds
+      <name>-<time>-<pid>.json         wall vs CPU seconds and the heaviest frames
+    """
+    directory, argv = _split_argv(sys.argv)
+    sys.argv[:] = argv
+    if directory is None:
+        return main()
+
+    import cProfile
+
+    name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    interval = float(os.environ.get("FAL_PROFILE_INTERVAL", DEFAULT_INTERVAL))
+    sampler = StackSampler(interval)
+    profiler = cProfile.Profile()
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    times_started = os.times()
+
+    sampler.start()
+    profiler.enable()
+    try:
+        return main()
+    finally:
+        profiler.disable()
+        sampler.stop()
+        _write_report(directory, name, profiler, sampler, time.perf_counter() - wall_started,
+                      time.process_time() - cpu_started, times_started)
+
+
+def _write_report(directory, name, profiler, sampler, wall, cpu, times_started):
+    import pstats
+
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    profiler.dump_stats(f"{prefix}.pstats")
+    StackSampler.write_folded(sampler.wall, f"{prefix}.wall.folded")
+    StackSampler.write_folded(sampler.cpu, f"{prefix}.cpu.folded")
+
+    stats = pstats.Stats(profiler)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:15]
+    times_ended = os.times()
+    summary = {
+        "command": sys.argv,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "user_seconds": round(times_ended.user - times_started.user, 4),
+        "system_seconds": round(times_ended.system - times_started.system, 4),
+        "waiting_share": round(1 - cpu / wall, 3) if wall else 0.0,
+        "samples": sampler.samples,
+        "sample_interval": sampler.interval,
+        "top_self_time": [
+            {"function": f"{func} ({os.path.basename(path)}:{line})", "self_seconds": round(tottime, 4),
+             "calls": calls}
+            for (path, line, func), (_, calls, tottime, _, _) in functions
+        ],
+        "top_wall_frames": sampler.top_leaves(sampler.wall),
+        "top_cpu_frames": sampler.top_leaves(sampler.cpu),
+    }
+    with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Profile: {prefix}.{{pstats,wall.folded,cpu.folded,json}} "
+          f"(wall {wall:.3f}s, CPU {cpu:.3f}s)", file=sys.stderr)
@@ -0,0 +1,385 @@
+"""Deterministic intent routing of request text, per SKILL.md's intent table and priority order"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# SKILL.md "Default Models"
+DEFAULT_MODELS = {
+    "generate": "fal-ai/flux.2/dev",
+    "video": "fal-ai/kling-video/v2/standard/text-to-video",
+    "image-to-video": "fal-ai/kling-video/v2/standard/image-to-video",
+    "tts": "fal-ai/kokoro/american-english",
+    "music": "fal-ai/minimax-music/v2",
+    "sfx": "cassetteai/sound-effects-generator",
+    "avatar": "fal-ai/kling-video/ai-avatar/v2/standard",
+    "transcribe": "fal-ai/elevenlabs/speech-to-text/scribe-v2",
+    "upscale": "fal-ai/crystal/upscale",
+    "colorize": "fal-ai/fibo-edit/colorize",
+    "relight": "fal-ai/fibo-edit/relight",
+    "reseason": "fal-ai/fibo-edit/reseason",
+    "restyle": "fal-ai/fibo-edit/restyle",
+}
+
+COMMANDS = {
+    "generate": "generate", "video": "video", "image-to-video": "video", "tts": "tts",
+    "music": "music", "sfx": "music", "avatar": "avatar", "transcribe": "transcribe",
+    "upscale": "upscale", "edit": "edit",
+}
+
+DEFAULT_SFX_SECONDS = 5  # The sound-effects model requires a duration
+
+# Aspect ratio -> generate --size (fal image size presets)
+IMAGE_SIZES = {"16:9": "landscape_16_9", "9:16": "portrait_16_9", "1:1": "square_hd",
+               "4:3": "landscape_4_3", "3:4": "portrait_4_3"}
+
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "webp", "gif", "bmp", "tif", "tiff", "heic", "avif")
+AUDIO_EXTENSIONS = ("mp3", "wav", "m4a", "flac", "ogg", "aac", "opus")
+VIDEO_EXTENSIONS = ("mp4", "mov", "webm", "mkv", "avi", "m4v")
+
+
+def _terms(english: str = "", chinese: str = "") -> "re.Pattern":
+    """One case-insensitive pattern: English alternatives on word boundaries, Chinese ones anywhere"""
+    parts = []
+    if english:
+        parts.append(rf"\b(?:{english})\b")
+    if chinese:
+        parts.append(f"(?:{chinese})")
+    return re.compile("|".join(parts), re.IGNORECASE)
+
+
+_FILE = re.compile(
+    r"(?:https?://\S+|(?:[\w~./\\-]*[\w-])\.(?:" + "|".join(IMAGE_EXTENSIONS + AUDIO_EXTENSIONS + VIDEO_EXTENSIONS)
+    + r"))(?=$|[\s,，。;；)）\"'”])", re.IGNORECASE)
+
+# Intent triggers (SKILL.md "Intent Classification"), strongest first
+_UPSCALE = _terms(r"upscale[sd]?|upscaling|super[- ]?resolution|[248]\s?x|x[248]|[248]×",
+                  r"放大|超分|[248二四八]\s?倍")
+_UPSCALE_WEAK = _terms(r"enhance[sd]?|larger|bigger|sharpen|higher[- ]res(?:olution)?|increase (?:the )?resolution",
+                       r"变清晰|更清晰|高清化|提高分辨率")
+_REMOVE_BG = _terms(r"(?:remove|delete|erase|strip|drop|no)\s+(?:the\s+)?(?:bg|background)|remove\s?bg|"
+                    r"background removal|transparent|cut\s?out",
+                    r"去背景|去掉背景|抠图|透明背景|移除背景|删除背景")
+_TRANSCRIBE = _terms(r"transcribe[sd]?|transcription|transcript|speech[- ]to[- ]text|stt",
+                     r"转文字|转成文字|转写|转录|听写|语音识别")
+_AVATAR = _terms(r"avatar|lip[- ]?sync(?:ing|ed)?|talking[- ]head",
+                 r"口型|对口型|数字人")
+_TTS = _terms(r"speak|tts|text[- ]to[- ]speech|read (?:it |this |that )?(?:aloud|out loud)|read aloud|"
+              r"voice(?:over)?|narrate|narration",
+              r"朗读|念一下|念出|配音|(?<![小解听据传])说(?![明服])")
+_MUSIC = _terms(r"music|musical|song|songs|bgm|soundtrack|jingle|melody|tune",
+                r"音乐|歌曲|歌|配乐|曲子|旋律")
+_SFX = _terms(r"sound[- ]?effects?|sfx|foley",
+              r"音效")
+_VIDEO = _terms(r"video|videos|animate[sd]?|animation|(?<!audio )(?<!sound )clip(?![- ]?art)|movie|film|"
+                r"make (?:it|this|them) move",
+                r"视频|动画|动起来|短片|影片")
+_MUSIC_VIDEO = _terms(r"music video|mv", r"音乐视频|音乐录像")
+# Music as the output and video as its context ("music for my video", "给视频配乐")
+_VIDEO_AS_CONTEXT = _terms(r"for (?:my |the |this |a |our )?(?:\w+ )?video|to (?:my |the |this )?video",
+                           r"[给为].{0,12}视频配|视频配乐|视频的(?:背景)?音乐")
+
+# Photo edit operations (only with an existing image), in matching order
+_EDIT_OPERATIONS: List[Tuple[str, "re.Pattern"]] = [
+    ("colorize", _terms(r"colori[sz]e[sd]?|colou?ri[sz]ation|colou?rs?|recolou?r|black[- ]and[- ]white",
+                        r"调色|上色|颜色|色彩|黑白")),
+    ("relight", _terms(r"relight|lighting|light|lit|warmer|warm|sunset|sunrise|golden hour|moonlight",
+                       r"打光|光线|灯光|光照|温暖|暖色|暖一点")),
+    ("reseason", _terms(r"reseason|seasons?|winter|summer|autumn|fall|spring|snowy",
+                        r"季节|换季|冬天|冬季|夏天|夏季|秋天|秋季|春天|春季|雪景")),
+    ("restyle", _terms(r"restyle|style|oil painting|anime|cartoon|cubism|pop art|vector art|woodcut|3d render",
+                       r"风格|油画|动漫|卡通|漫画风")),
+    ("restore", _terms(r"restore|restoration|repair|fix (?:the |this )?(?:old )?(?:photo|picture)",
+                       r"修复|修复老照片")),
+    ("remove-object", _terms(r"(?:remove|erase|delete|get rid of)\s+(?:the\s+|a\s+|an\s+|this\s+|that\s+)?\w+",
+                             r"去掉|去除|删除|删掉|移除|抹掉")),
+    ("add-object", _terms(r"add (?:a |an |the |some )?\w+", r"加上|添加|加一个|加个")),
+]
+
+_CREATIVE = _terms(r"create|generate|draw|paint|design|render|imagine|make (?:a|an|me a|me an)",
+                   r"(?<!动)画(?![面质])|生成|创作|设计")
+# An image that already exists; a bare "photo"/"图片" is usually what to create ("a photo of a sunset")
+_IMAGE_REFERENCE = _terms(r"(?:this|that|these|those|the|my|our|attached|uploaded|old) "
+                          r"(?:photos?|pictures?|images?|pics?|imgs?|portraits?|selfies?)",
+                          r"这张|那张|这幅|那幅|原图|老照片|我的(?:照片|图片)")
+
+# Parameter extraction (SKILL.md "Parameter Extraction")
+_SECONDS = re.compile(r"(\d+)\s*(?:秒|s\b|secs?\b|seconds?\b)", re.IGNORECASE)
+_MINUTES = re.compile(r"(\d+|一|两|三)\s*(?:分钟|min(?:ute)?s?\b)", re.IGNORECASE)
+_SHORT = _terms(r"short", r"短视频|短一点|短的")
+_LONG = _terms(r"long(?:er)?", r"长一点|长一些|长视频")
+_RATIO = re.compile(r"\b(16:9|9:16|1:1|4:3|3:4)\b")
+# Bare "phone"/"story" are usually subject matter ("a cat on the phone"), not a format
+_VERTICAL = _terms(r"vertical|portrait|tiktok|reels?|shorts|(?:phone|mobile) (?:wallpaper|screen)|"
+                   r"for (?:my |a )?(?:phone|mobile)|(?:instagram|ig) stor(?:y|ies)",
+                   r"手机看|手机壁纸|手机屏幕|竖屏|竖版|竖的|抖音")
+_HORIZONTAL = _terms(r"horizontal|landscape|widescreen|wide|youtube|cinematic",
+                     r"横屏|横版|横的|宽屏")
+_SQUARE = _terms(r"square", r"方形|正方形|方图")
+_FAST = _terms(r"fast|quick(?:ly)?|draft|rough", r"快速|快一点|草图")
+_DETAILED = _terms(r"detailed|high[- ]quality|hq|best quality|fine", r"精细|高质量|细节|高清")
+_SCALE = re.compile(r"([248])\s?(?:x|×|倍)|x([248])\b|([二四八])倍", re.IGNORECASE)
+_CHINESE_DIGITS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "八": 8}
+_SEASON = [("winter", _terms(r"winter|snowy", r"冬天|冬季|雪景")), ("summer", _terms(r"summer", r"夏天|夏季")),
+           ("autumn", _terms(r"autumn|fall", r"秋天|秋季")), ("spring", _terms(r"spring", r"春天|春季"))]
+_LIGHT = [("sunrise light", _terms(r"warm(?:er)?|sunrise|golden hour", r"温暖|暖色|暖一点|日出")),
+          ("moonlight lighting", _terms(r"moonlight|night", r"月光|夜晚|夜景")),
+          ("harsh studio lighting", _terms(r"studio", r"影棚|棚拍")),
+          ("blue hour light", _terms(r"blue hour", r"蓝调"))]
+_STYLE = [("Oil Painting", _terms(r"oil painting", r"油画")), ("Anime", _terms(r"anime", r"动漫|二次元")),
+          ("Cartoon", _terms(r"cartoon", r"卡通")), ("Cubism", _terms(r"cubism", r"立体主义")),
+          ("3D Render", _terms(r"3d render|3d", r"3D渲染")), ("Pop Art Halftone", _terms(r"pop art", r"波普")),
+          ("Vector Art", _terms(r"vector art|vector", r"矢量")), ("Wood Cut", _terms(r"woodcut|wood cut", r"木刻"))]
+_BLACK_AND_WHITE = _terms(r"black[- ]and[- ]white|monochrome", r"黑白")
+_SEPIA = _terms(r"sepia|vintage", r"复古|怀旧")
+_QUOTED = re.compile(r"[\"“「『](.+?)[\"”」』]")
+_AFTER_COLON = re.compile(r"[:：]\s*(.+)$", re.DOTALL)
+_FILLER = re.compile(r"^(?:please\s+|can you\s+|could you\s+|帮我|请你|请|麻烦)+", re.IGNORECASE)
+
+
+def _head(items: List[str]) -> Optional[str]:
+    return items[0] if items else None
+
+
+def _files(text: str) -> Dict[str, List[str]]:
+    """File paths and URLs in the request, by media kind (URLs without a known extension count as images)"""
+    found: Dict[str, List[str]] = {"image": [], "audio": [], "video": []}
+    for match in _FILE.finditer(text):
+        ref = match.group(0)
+        extension = ref.lower().split("?", 1)[0].rsplit(".", 1)[-1]
+        if extension in AUDIO_EXTENSIONS:
+            found["audio"].append(ref)
+        elif extension in VIDEO_EXTENSIONS:
+            found["video"].append(ref)
+        else:
+            found["image"].append(ref)
+    return found
+
+
+def _prompt(text: str) -> str:
+    """The request minus file references and leading politeness; the wording is otherwise kept"""
+    prompt = _FILE.sub(" ", text)
+    prompt = re.sub(r"\s+", " ", prompt).strip(" ,，。.;；")
+    return _FILLER.sub("", prompt).strip()
+
+
+def _spoken_text(text: str) -> Optional[str]:
+    """Text to speak: a quoted passage, else whatever follows the first colon"""
+    match = _QUOTED.search(text) or _AFTER_COLON.search(text)
+    return match.group(1).strip() if match else None
+
+
+def _number(value: str) -> int:
+    return int(value) if value.isdigit() else _CHINESE_DIGITS[value]
+
+
+def _duration(text: str) -> Optional[int]:
+    match = _SECONDS.search(text)
+    if match:
+        return int(match.group(1))
+    match = _MINUTES.search(text)
+    if match:
+        return _number(match.group(1)) * 60
+    return None
+
+
+def _aspect_ratio(text: str) -> Optional[str]:
+    match = _RATIO.search(text)
+    if match:
+        return match.group(1)
+    if _VERTICAL.search(text):
+        return "9:16"
+    if _HORIZONTAL.search(text):
+        return "16:9"
+    if _SQUARE.search(text):
+        return "1:1"
+    return None
+
+
+def _pick(options: List[Tuple[str, "re.Pattern"]], text: str) -> Optional[str]:
+    for value, pattern in options:
+        if pattern.search(text):
+            return value
+    return None
+
+
+def _music_over_video(text: str, music: "re.Match", video: "re.Match") -> bool:
+    """With both music and video words: is music the output? ("music video" is a video)"""
+    if _MUSIC_VIDEO.search(text):
+        return False
+    if _VIDEO_AS_CONTEXT.search(text):
+        return True
+    # Otherwise the output is named first: "a video with background music" vs "music for a clip"
+    return music.start() < video.start()
+
+
+def classify(text: str) -> Tuple[str, Optional[str], List[str]]:
+    """
+    (intent, edit operation or None, matched trigger words), applying the
+    priority order and the ambiguous-case rules of SKILL.md.
+    """
+    files = _files(text)
+    text = _FILE.sub(" ", text)  # "music.mp3" or "vintage.jpg" are names, not intent
+    has_image = bool(files["image"]) or bool(_IMAGE_REFERENCE.search(text))
+
+    match = _UPSCALE.search(text)
+    if match:
+        return "upscale", None, [match.group(0)]
+    match = _REMOVE_BG.search(text)
+    if match:
+        return "remove-bg", None, [match.group(0)]
+    match = _TRANSCRIBE.search(text)
+    if match:
+        return "transcribe", None, [match.group(0)]
+    match = _AVATAR.search(text)
+    if match:
+        return "avatar", None, [match.group(0)]
+    match = _TTS.search(text)
+    if match:
+        return "tts", None, [match.group(0)]
+
+    music = _SFX.search(text) or _MUSIC.search(text)
+    video = _VIDEO.search(text)
+    if music and (not video or _music_over_video(text, music, video)):
+        return ("sfx" if _SFX.search(text) else "music"), None, [music.group(0)]
+    if video:
+        if has_image and not files["video"]:
+            return "image-to-video", None, [video.group(0)]
+        return "video", None, [video.group(0)]
+
+    # Without an actual file, a creative verb means a new image ("create a photo of my dog in winter")
+    if has_image and (files["image"] or not _CREATIVE.search(text)):
+        for operation, pattern in _EDIT_OPERATIONS:
+            match = pattern.search(text)
+            if match:
+                return "edit", operation, [match.group(0)]
+
+    # "larger"/"enhance" mean upscale unless the request is creative ("create a larger castle image")
+    match = _UPSCALE_WEAK.search(text)
+    if match and has_image and not _CREATIVE.search(text):
+        return "upscale", None, [match.group(0)]
+
+    return "generate", None, []
+
+
+def route(text: str) -> Dict[str, Any]:
+    """
+    Route request text to a fal_api.py command with its default model and
+    extracted parameters.
+
+    "argv" is the full command line when "missing" is empty; otherwise the
+    request lacks something only a person (or a reasoning step) can supply,
+    such as the file to edit or the text to speak.
+    """
+    intent, operation, matched = classify(text)
+    files = _files(text)
+    prompt = _prompt(text)
+    text = _FILE.sub(" ", text)
+    result: Dict[str, Any] = {"intent": intent, "matched": matched}
+
+    if intent == "remove-bg":
+        result.update({"command": None, "skill": "/fal-remove-bg", "model": None,
+                       "params": {"image_url": files["image"][0]} if files["image"] else {},
+                       "argv": None, "missing": [] if files["image"] else ["image_url"]})
+        return result
+
+    model = DEFAULT_MODELS.get(operation or intent)
+    params: Dict[str, Any] = {}
+    missing: List[str] = []
+
+    def need(name: str, value: Any):
+        if value:
+            params[name] = value
+        else:
+            missing.append(name)
+
+    if intent == "generate":
+        params["prompt"] = prompt
+        size = IMAGE_SIZES.get(_aspect_ratio(text))
+        if size:
+            params["size"] = size
+        if _DETAILED.search(text):
+            params["steps"] = 50
+        elif _FAST.search(text):
+            params["steps"] = 12
+
+    elif intent in ("video", "image-to-video"):
+        if intent == "image-to-video":
+            need("image_url", _head(files["image"]))
+        params["prompt"] = prompt
+        seconds = _duration(text)
+        if seconds is None and _LONG.search(text):
+            seconds = 10
+        elif seconds is None and _SHORT.search(text):
+            seconds = 5
+        if seconds is not None:
+            params["duration"] = 5 if seconds <= 7 else 10  # The video command takes 5 or 10
+        ratio = _aspect_ratio(text)
+        if ratio:
+            params["aspect_ratio"] = ratio
+
+    elif intent == "tts":
+        need("text", _spoken_text(text))
+
+    elif intent == "music":
+        params["prompt"] = prompt
+        need("lyrics", _spoken_text(text))  # MiniMax Music requires lyrics and sets its own length
+
+    elif intent == "sfx":
+        params["prompt"] = prompt
+        params["duration"] = _duration(text) or DEFAULT_SFX_SECONDS
+
+    elif intent == "avatar":
+        need("image_url", _head(files["image"]))
+        need("audio_url", _head(files["audio"]))
+
+    elif intent == "transcribe":
+        need("audio_url", _head(files["audio"] or files["video"]))
+
+    elif intent == "upscale":
+        match = _SCALE.search(text)
+        params["scale"] = _number(next(g for g in match.groups() if g)) if match else 2
+        if files["video"] and not files["image"]:
+            params["video_url"] = files["video"][0]
+            model = None  # SKILL.md lists no default video upscaler
+            missing.append("model")
+        else:
+            need("image_url", _head(files["image"]))
+
+    elif intent == "edit":
+        params["operation"] = operation
+        need("image_url", _head(files["image"]))
+        if operation == "colorize":
+            if _BLACK_AND_WHITE.search(text) and not re.search(r"colori[sz]e|上色", text, re.IGNORECASE):
+                params["color"] = "black and white colors"
+            elif _SEPIA.search(text) and not re.search(r"\bold\b|老照片", text, re.IGNORECASE):
+                params["color"] = "sepia vintage"
+        elif operation == "relight":
+            light = _pick(_LIGHT, text)
+            if light:
+                params["light_type"] = light
+        elif operation == "reseason":
+            season = _pick(_SEASON, text)
+            if season:
+                params["season"] = season
+        elif operation == "restyle":
+            style = _pick(_STYLE, text)
+            if style:
+                params["style"] = style
+        if model is None:
+            # SKILL.md names default models for colorize, relight, reseason and restyle only;
+            # the other operations are driven by the instruction itself
+            missing.append("model")
+            params["prompt"] = prompt
+
+    result.update({"command": COMMANDS[intent], "model": model, "params": params, "missing": missing,
+                   "argv": None if missing else _argv(COMMANDS[intent], model, params)})
+    return result
+
+
+def _argv(command: str, model: Optional[str], params: Dict[str, Any]) -> List[str]:
+    """fal_api.py arguments for a complete route"""
+    argv = [command, "--model", model]
+    for name, value in params.items():
+        if name == "operation" and command != "edit":
+            continue
+        argv += [f"--{name.replace('_', '-')}", str(value)]
+    return argv
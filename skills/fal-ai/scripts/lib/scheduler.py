@@ -0,0 +1,191 @@
+"""In-flight slot scheduler: priority lanes, weighted fair tenants, earliest deadline first"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """{tenant: weight} from "nightly=1,agent=4" (FAL_TENANT_WEIGHTS)"""
+    weights = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        try:
+            weights[name.strip()] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid tenant weight '{item}' (expected name=number)")
+        if weights[name.strip()] <= 0:
+            raise ValueError(f"Tenant weight must be positive: '{item}'")
+    return weights
+
+
+class _Waiter:
+    def __init__(self, lane: str, tenant: str, deadline: Optional[float], seq: int):
+        self.lane = lane
+        self.tenant = tenant
+        self.deadline = deadline
+        self.seq = seq
+        self.granted = False
+        self.enqueued = time.monotonic()
+
+    def order(self):
+        # Earliest deadline first; jobs without one go last, in arrival order
+        return (self.deadline if self.deadline is not None else float("inf"), self.seq)
+
+
+class _Lane:
+    """Waiting jobs of one lane, one EDF queue per tenant, served by stride scheduling"""
+
+    def __init__(self):
+        self.queues: Dict[str, List[_Waiter]] = {}
+        self.passes: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def add(self, waiter: _Waiter):
+        queue = self.queues.setdefault(waiter.tenant, [])
+        if not queue:
+            # A tenant that was idle re-enters at the current virtual time, so it
+            # cannot bank credit while idle and then monopolise the lane
+            active = [self.passes[t] for t, q in self.queues.items() if q and t in self.passes]
+            floor = min(active) if active else 0.0
+            self.passes[waiter.tenant] = max(self.passes.get(waiter.tenant, 0.0), floor)
+        queue.append(waiter)
+        queue.sort(key=_Waiter.order)
+
+    def remove(self, waiter: _Waiter):
+        queue = self.queues.get(waiter.tenant)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+
+    def pop(self, weights: Dict[str, float], default_weight: float) -> Optional[_Waiter]:
+        """Head of the tenant queue with the lowest pass value (ties: earliest deadline)"""
+        candidates = [(self.passes[t], q[0].order(), t) for t, q in self.queues.items() if q]
+        if not candidates:
+            return None
+        _, _, tenant = min(candidates)
+        self.passes[tenant] += 1.0 / weights.get(tenant, default_weight)
+        return self.queues[tenant].pop(0)
+
+
+class Scheduler:
+    """
+    Decide which waiting local jobs get the limited in-flight slots.
+
+    The interactive lane always goes first, and `reserved` slots are kept
+    for it: bulk jobs never occupy more than slots - reserved, so an
+    interactive request does not wait for a long bulk job to finish. Inside
+    a lane, tenants (or tags) share slots in proportion to their weights,
+    and each tenant's own jobs run earliest deadline first.
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        reserved: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0
+    ):
+        """
+        Args:
+            slots: Jobs in flight at once
+            reserved: Slots bulk jobs may not use (default: 1 when slots > 1)
+            weights: Relative share per tenant within a lane
+            default_weight: Weight of tenants missing from weights
+        """
+        if slots < 1:
+            raise ValueError("Scheduler needs at least one slot")
+        if reserved is None:
+            reserved = 1 if slots > 1 else 0
+        if not 0 <= reserved < slots:
+            raise ValueError("Reserved interactive slots must be fewer than total slots")
+
+        self.slots = slots
+        self.reserved = reserved
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self._lanes = {lane: _Lane() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._waited = {lane: [0, 0.0] for lane in LANES}  # [jobs, seconds]
+
+    def _dispatch(self):
+        """Grant free slots to waiting jobs (caller holds the lock)"""
+        granted = False
+        while sum(self._running.values()) < self.slots:
+            waiter = self._lanes[INTERACTIVE].pop(self.weights, self.default_weight)
+            if waiter is None:
+                if self._running[BULK] >= self.slots - self.reserved:
+                    break
+                waiter = self._lanes[BULK].pop(self.weights, self.default_weight)
+                if waiter is None:
+                    break
+            waiter.granted = True
+            self._running[waiter.lane] += 1
+            stats = self._waited[waiter.lane]
+            stats[0] += 1
+            stats[1] += time.monotonic() - waiter.enqueued
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, lane: str = BULK, tenant: str = "default", deadline: Optional[float] = None) -> _Waiter:
+        """
+        Block until this job may start; call release() with the returned ticket.
+
+        Raises TimeoutError if deadline (epoch seconds) passes while waiting.
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown lane '{lane}' (expected one of: {', '.join(LANES)})")
+
+        with self._cond:
+            waiter = _Waiter(lane, tenant, deadline, next(self._seq))
+            self._lanes[lane].add(waiter)
+            self._dispatch()
+            while not waiter.granted:
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.time()
+                    if wait <= 0:
+                        self._lanes[lane].remove(waiter)
+                        raise TimeoutError(f"Deadline passed waiting for a {lane} slot")
+                self._cond.wait(wait)
+        return waiter
+
+    def release(self, ticket: _Waiter):
+        with self._cond:
+            self._running[ticket.lane] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, lane: str = BULK, tenant: str = "default", deadline: Optional[float] = None) -> Iterator[None]:
+        """Context manager around acquire/release"""
+        ticket = self.acquire(lane, tenant, deadline)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        """Running, waiting and mean wait per lane"""
+        with self._cond:
+            return {lane: {
+                "running": self._running[lane],
+                "waiting": len(self._lanes[lane]),
+                "started": self._waited[lane][0],
+                "mean_wait_seconds": round(self._waited[lane][1] / self._waited[lane][0], 3)
+                if self._waited[lane][0] else 0.0
+            } for lane in LANES}
@@ -0,0 +1,109 @@
+"""Single-flight coalescing of identical in-flight requests"""
+import copy
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+def request_key(endpoint_id: str, input_data: Dict[str, Any], *extra: Any) -> str:
+    """Stable key for (endpoint_id, input_data): same payload, same key"""
+    import hashlib
+
+    payload = json.dumps([endpoint_id, input_data, *extra], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.listeners: List[Callable[[Any], None]] = []
+        self.joined = 0
+
+    def broadcast(self, event: Any):
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Event listener failed: {e}")
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+
+    The first caller for a key (the leader) executes the function; callers
+    arriving with the same key while it is still running wait for it and
+    receive a copy of the same result (or the same exception). Events the
+    leader emits are fanned out to every caller's listener. Nothing is kept
+    once the call finishes: this is not a result cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[Callable[[Any], None]], Any],
+        listener: Optional[Callable[[Any], None]] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Execute fn(emit) once per in-flight key.
+
+        Returns (result, shared) where shared is True for callers that joined
+        an existing call instead of executing fn themselves.
+
+        Args:
+            timeout: Seconds a joining caller waits for the leader
+
+        Raises:
+            TimeoutError: A joining caller's timeout ran out first (the leader carries on)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.joined += 1
+            if listener:
+                call.listeners.append(listener)
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    if listener in call.listeners:
+                        call.listeners.remove(listener)
+                raise TimeoutError(f"Gave up waiting for the in-flight call after {timeout:.1f}s")
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = fn(call.broadcast)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        # Joiners copy the shared result; hand the leader its own copy too so
+        # a caller mutating its result can't race with them
+        if call.joined:
+            return copy.deepcopy(call.result), False
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
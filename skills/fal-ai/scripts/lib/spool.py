@@ -0,0 +1,299 @@
+"""Spool-directory worker: claim dropped job files by rename and run them concurrently"""
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .logging_config import setup_logging
+from .tracing import span
+from .utils import atomic_write
+
+logger = setup_logging(__name__)
+
+PROCESSING = "processing"
+RETRY = "retry"
+DONE = "done"
+FAILED = "failed"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SpoolWorker:
+    """
+    Run job files dropped into a spool directory.
+
+    A job file is `<name>.json` holding {"endpoint": ..., "input": {...}}
+    (optionally "lane", "tenant", "timeout", "download": false). Upstream
+    writers should write it under a dot-prefixed temporary name and rename it
+    into place. The worker moves each file through sub-directories of the
+    spool, always with an atomic rename so a file has exactly one owner:
+
+        <spool>/<name>.json                      waiting
+        processing/<name>.json.<host>.<pid>      claimed by one worker process
+        retry/<name>.json                        failed, runnable again after its mtime
+        done/<name>.json                         finished; result in the output dir
+        failed/<name>.json (+ .error.json)       dead letter after max_attempts
+
+    Claims left by a process that died on this host are returned to the spool
+    at startup. Results are written to <output>/<name>.result.json and media to
+    <output>/<name>/, both with atomic writes.
+    """
+
+    def __init__(
+        self,
+        client,
+        spool_dir: str,
+        output_dir: Optional[str] = None,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        retry_delay: float = 30.0,
+        poll_interval: float = 1.0,
+        download: bool = True,
+        validate: bool = True,
+        adapter=None,
+        on_finish: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ):
+        """
+        Args:
+            timeout: Seconds each job may take (a job file's own "timeout" wins);
+                     a job that runs over is cancelled and retried
+            deadline: Epoch seconds after which no new jobs are claimed; run()
+                      returns once the jobs already running finish
+        """
+        self.client = client
+        self.spool_dir = os.path.abspath(spool_dir)
+        self.output_dir = os.path.abspath(output_dir or os.path.join(spool_dir, "out"))
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.download = download
+        self.validate = validate
+        self.adapter = adapter
+        self.on_finish = on_finish
+        self.timeout = timeout
+        self.deadline = deadline
+        self.owner = f"{socket.gethostname()}.{os.getpid()}"
+        self.counts = {"done": 0, "retried": 0, "failed": 0}
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._running = 0
+
+        for sub in (PROCESSING, RETRY, DONE, FAILED):
+            os.makedirs(os.path.join(self.spool_dir, sub), exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.spool_dir, *parts)
+
+    def recover(self) -> int:
+        """Return claims of dead processes on this host to the spool"""
+        host = socket.gethostname()
+        recovered = 0
+        for entry in os.listdir(self._path(PROCESSING)):
+            name, _, owner = entry.partition(".json.")
+            owner_host, _, pid = owner.rpartition(".")
+            if owner_host != host or not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            try:
+                os.rename(self._path(PROCESSING, entry), self._path(f"{name}.json"))
+                recovered += 1
+                logger.info(f"Recovered {name}.json from dead worker {owner}")
+            except FileNotFoundError:
+                pass
+        return recovered
+
+    def _release_due_retries(self):
+        now = time.time()
+        for name in os.listdir(self._path(RETRY)):
+            path = self._path(RETRY, name)
+            try:
+                if os.path.getmtime(path) <= now:
+                    os.rename(path, self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def _waiting(self) -> List[str]:
+        """Job files ready to claim, oldest first"""
+        entries = []
+        with os.scandir(self.spool_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".json") and not entry.name.startswith("."):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.name))
+                    except FileNotFoundError:
+                        pass
+        return [name for _, name in sorted(entries)]
+
+    def _claim(self, name: str) -> Optional[str]:
+        """Atomically take ownership of one job file; None if another worker won"""
+        claimed = self._path(PROCESSING, f"{name}.{self.owner}")
+        try:
+            os.rename(self._path(name), claimed)
+            return claimed
+        except FileNotFoundError:
+            return None
+
+    def _execute(self, job: Dict[str, Any], name: str) -> Dict[str, Any]:
+        from .local_inputs import resolve_local_inputs
+
+        endpoint_id = job.get("endpoint")
+        input_data = job.get("input")
+        if not endpoint_id or not isinstance(input_data, dict):
+            raise ValueError("Job file needs an 'endpoint' and an 'input' object")
+        if self.validate and job.get("validate", True):
+            from .validation import validate_input
+            validate_input(endpoint_id, input_data)
+
+        started = time.monotonic()
+        input_data = resolve_local_inputs(self.client, input_data)
+        result = self.client.run_model(
+            endpoint_id, input_data,
+            timeout=job.get("timeout", self.timeout), lane=job.get("lane"), tenant=job.get("tenant")
+        )
+
+        url = None
+        if self.adapter is not None:
+            # ResponseAdapter learning state is shared, so extract one result at a time
+            with self._lock:
+                url = self.adapter.extract_result(result, endpoint_id)
+        output = {"job": name, "endpoint": endpoint_id, "url": url, "result": result}
+
+        # Inline (data URI) results are always decoded so the payload stays out of the result file
+        inline = bool(url) and url.startswith("data:")
+        if inline or (url and self.download and job.get("download", True)):
+            from .download import download_to_dir
+
+            saved = download_to_dir(url, os.path.join(self.output_dir, name[:-len(".json")]))
+            output.update({"path": saved["path"], "size": saved["size"], "sha256": saved["sha256"]})
+            if inline:
+                output["url"] = None
+                output["result"] = None  # The payload now lives in the saved file
+
+        output["seconds"] = round(time.monotonic() - started, 3)
+        return output
+
+    def _process(self, claimed: str, name: str):
+        try:
+            job = None
+            try:
+                with open(claimed, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+                if not isinstance(job, dict):
+                    raise ValueError("Job file must hold a JSON object")
+                job["attempts"] = int(job.get("attempts", 0)) + 1
+                atomic_write(claimed, json.dumps(job, indent=2))
+
+                with span("spool.job", job=name, attempt=job["attempts"], **{"fal.endpoint": job.get("endpoint")}):
+                    output = self._execute(job, name)
+                output["attempts"] = job["attempts"]
+                output["completed_at"] = datetime.utcnow().isoformat() + "Z"
+                atomic_write(os.path.join(self.output_dir, f"{name[:-len('.json')]}.result.json"),
+                             json.dumps(output, indent=2))
+                os.replace(claimed, self._path(DONE, name))
+                self._finish({"job": name, "status": "done", "path": output.get("path"),
+                              "url": output["url"], "attempts": job["attempts"], "seconds": output["seconds"]})
+
+            except Exception as e:
+                self._fail(claimed, name, job, e)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._slots.release()
+
+    def _fail(self, claimed: str, name: str, job: Optional[Dict[str, Any]], error: Exception):
+        attempts = (job or {}).get("attempts", 1)
+        # Bad job files and rejected input fail the same way every time
+        permanent = job is None or isinstance(error, ValueError)
+        if not permanent and attempts < self.max_attempts:
+            delay = self.retry_delay * (2 ** (attempts - 1))
+            retry_path = self._path(RETRY, name)
+            os.replace(claimed, retry_path)
+            os.utime(retry_path, (time.time(), time.time() + delay))
+            logger.warning(f"Job {name} failed (attempt {attempts}/{self.max_attempts}), retrying in {delay:.0f}s: {error}")
+            self._finish({"job": name, "status": "retry", "error": str(error), "attempts": attempts})
+            return
+
+        os.replace(claimed, self._path(FAILED, name))
+        atomic_write(self._path(FAILED, f"{name[:-len('.json')]}.error.json"), json.dumps({
+            "job": name,
+            "error": str(error),
+            "type": type(error).__name__,
+            "attempts": attempts,
+            "failed_at": datetime.utcnow().isoformat() + "Z"
+        }, indent=2))
+        logger.error(f"Job {name} moved to dead letter after {attempts} attempt(s): {error}")
+        self._finish({"job": name, "status": "failed", "error": str(error), "attempts": attempts})
+
+    def _finish(self, event: Dict[str, Any]):
+        key = {"done": "done", "retry": "retried", "failed": "failed"}[event["status"]]
+        with self._lock:
+            self.counts[key] += 1
+        if self.on_finish:
+            self.on_finish(event)
+
+    def stop(self):
+        """Stop claiming new jobs; in-flight jobs still finish"""
+        self._stop.set()
+
+    def _past_deadline(self) -> bool:
+        if self.deadline is not None and time.time() >= self.deadline and not self._stop.is_set():
+            logger.info("Worker deadline reached; finishing running jobs without claiming more")
+            self._stop.set()
+        return self._stop.is_set()
+
+    def run(self, once: bool = False) -> Dict[str, int]:
+        """
+        Claim and run jobs until stop() or the deadline (or, with once, until
+        the spool, running jobs and pending retries are drained). Never claims
+        more jobs than it can run, so other workers on the spool get the rest.
+        """
+        self.recover()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="spool") as executor:
+            while not self._past_deadline():
+                self._release_due_retries()
+                claimed_any = False
+                for name in self._waiting():
+                    self._slots.acquire()
+                    if self._past_deadline():
+                        self._slots.release()
+                        break
+                    claimed = self._claim(name)
+                    if claimed is None:
+                        self._slots.release()
+                        continue
+                    claimed_any = True
+                    with self._lock:
+                        self._running += 1
+                    executor.submit(self._process, claimed, name)
+
+                if not claimed_any:
+                    if once and not self._busy():
+                        break
+                    wait = self.poll_interval
+                    if self.deadline is not None:
+                        wait = max(0.0, min(wait, self.deadline - time.time()))
+                    self._stop.wait(wait)
+        return dict(self.counts)
+
+    def _busy(self) -> bool:
+        """Jobs still running, or waiting in retry/"""
+        with self._lock:
+            if self._running:
+                return True
+        return bool(os.listdir(self._path(RETRY)))
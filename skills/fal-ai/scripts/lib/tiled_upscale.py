@@ -0,0 +1,221 @@
+"""Tiled, parallel upscaling of images too large for a single job"""
+import math
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from .download import download_file
+from .logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+def _import_pil():
+    """Import Pillow lazily; it is only needed for tiled upscaling"""
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        raise ImportError(
+            "Pillow is required for tiled upscaling. "
+            "Please run: uv pip install pillow"
+        )
+
+
+def tile_starts(size: int, tile: int, overlap: int) -> List[int]:
+    """Start offsets covering [0, size) with tiles of `tile` px overlapping by at least `overlap`"""
+    if tile >= size:
+        return [0]
+    if overlap >= tile:
+        raise ValueError("Tile overlap must be smaller than the tile size")
+    step = tile - overlap
+    count = int(math.ceil((size - overlap) / float(step)))
+    return sorted({min(i * step, size - tile) for i in range(count)})
+
+
+class PNGStreamWriter:
+    """Write an 8-bit RGB/RGBA PNG row band by row band, without holding the whole image"""
+
+    CHUNK_BYTES = 1 << 20
+
+    def __init__(self, path: str, width: int, height: int, mode: str):
+        if mode not in ("RGB", "RGBA"):
+            raise ValueError(f"Unsupported PNG mode: {mode}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.stride = width * len(mode)
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj(6)
+        self._pending = bytearray()
+
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 2 if mode == "RGB" else 6
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_band(self, image):
+        """Append the rows of a PIL image exactly `width` pixels wide"""
+        data = image.tobytes()
+        raw = bytearray()
+        for offset in range(0, len(data), self.stride):
+            raw += b"\x00"  # Filter type None
+            raw += data[offset:offset + self.stride]
+        self.rows += len(data) // self.stride
+
+        self._pending += self._compressor.compress(bytes(raw))
+        if len(self._pending) >= self.CHUNK_BYTES:
+            self._chunk(b"IDAT", bytes(self._pending))
+            self._pending.clear()
+
+    def close(self):
+        if self.rows != self.height:
+            self._file.close()
+            raise ValueError(f"PNG expected {self.height} rows, got {self.rows}")
+        self._pending += self._compressor.flush()
+        self._chunk(b"IDAT", bytes(self._pending))
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+
+def _gradient(Image, width: int, height: int, horizontal: bool):
+    """L-mode mask ramping 0→255 left-to-right (or top-to-bottom)"""
+    length = width if horizontal else height
+    ramp = bytes(int(255 * (i + 0.5) / length) for i in range(length))
+    if horizontal:
+        return Image.frombytes("L", (width, 1), ramp).resize((width, height))
+    return Image.frombytes("L", (1, height), ramp).resize((width, height))
+
+
+def _feather(Image, base, overlay, box: Tuple[int, int, int, int], horizontal: bool):
+    """Blend overlay into base over box, fading from base to overlay"""
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    if width <= 0 or height <= 0:
+        return
+    mask = _gradient(Image, width, height, horizontal)
+    region = Image.composite(overlay.crop((0, 0, width, height)), base.crop(box), mask)
+    base.paste(region, (left, top))
+
+
+def upscale_tiled(
+    client,
+    endpoint_id: str,
+    source_path: str,
+    output_path: str,
+    input_data: Dict[str, Any],
+    scale: int,
+    tile_size: int = 1024,
+    overlap: int = 64,
+    max_concurrency: int = 4,
+    adapter=None
+) -> Dict[str, Any]:
+    """
+    Upscale source_path tile by tile and stitch the result into a PNG.
+
+    Tiles are uploaded and upscaled concurrently. Stitching proceeds one row
+    of tiles at a time: tiles are feathered into a band, the band is
+    feathered into the previous band's overlap, and finished rows are
+    streamed into the PNG, so memory is bounded by two bands rather than the
+    full output image.
+    """
+    Image = _import_pil()
+    started = time.monotonic()
+
+    with Image.open(source_path) as source:
+        mode = "RGBA" if "A" in source.getbands() else "RGB"
+        source = source.convert(mode)
+        width, height = source.size
+        xs = tile_starts(width, tile_size, overlap)
+        ys = tile_starts(height, tile_size, overlap)
+        tw, th = min(tile_size, width), min(tile_size, height)
+        logger.info(f"Upscaling {width}x{height} as {len(xs)}x{len(ys)} tiles of {tw}x{th} (overlap {overlap}px)")
+
+        work_dir = tempfile.mkdtemp(prefix="fal-upscale-")
+        # Crop every tile up front so the decoded source can be released before stitching
+        tiles = {}
+        for row, y in enumerate(ys):
+            for col, x in enumerate(xs):
+                path = os.path.join(work_dir, f"tile-{row:03d}-{col:03d}.png")
+                source.crop((x, y, x + tw, y + th)).save(path)
+                tiles[(row, col)] = path
+
+    extract_lock = threading.Lock()
+    model_input = {k: v for k, v in input_data.items() if k != "image_url"}
+
+    def upscale_tile(row: int, col: int) -> str:
+        tile_url = client.upload_file(tiles[(row, col)])
+        result = client.run_model(endpoint_id, {**model_input, "image_url": tile_url})
+        with extract_lock:
+            url = adapter.extract_result(result, endpoint_id)
+        if not url:
+            raise ValueError(f"Could not extract URL for tile {row},{col}")
+        path = os.path.join(work_dir, f"out-{row:03d}-{col:03d}")
+        download_file(url, path)
+        return path
+
+    out_w, out_h = width * scale, height * scale
+    out_tw, out_th = tw * scale, th * scale
+    partial = f"{output_path}.part"
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="upscale") as executor:
+            futures = {(r, c): executor.submit(upscale_tile, r, c) for r in range(len(ys)) for c in range(len(xs))}
+            writer = PNGStreamWriter(partial, out_w, out_h, mode)
+            held = None  # Bottom strip of the previous band, blended into the next band's top
+
+            for row, y in enumerate(ys):
+                band = Image.new(mode, (out_w, out_th))
+                for col, x in enumerate(xs):
+                    with Image.open(futures[(row, col)].result()) as tile:
+                        tile = tile.convert(mode)
+                        if tile.size != (out_tw, out_th):
+                            tile = tile.resize((out_tw, out_th), Image.LANCZOS)
+                    ox = x * scale
+                    if col:
+                        seam_end = (xs[col - 1] + tw) * scale
+                        _feather(Image, band, tile, (ox, 0, seam_end, out_th), horizontal=True)
+                        band.paste(tile.crop((seam_end - ox, 0, out_tw, out_th)), (seam_end, 0))
+                    else:
+                        band.paste(tile, (ox, 0))
+                    os.remove(futures[(row, col)].result())
+
+                if held is not None:
+                    _feather(Image, held, band, (0, 0, out_w, held.size[1]), horizontal=False)
+                    band.paste(held, (0, 0))
+
+                if row + 1 < len(ys):
+                    # Hold back the rows the next band overlaps; emit the rest now
+                    cut = (ys[row + 1] - y) * scale
+                    writer.write_band(band.crop((0, 0, out_w, cut)))
+                    held = band.crop((0, cut, out_w, out_th))
+                else:
+                    writer.write_band(band)
+                    held = None
+
+            writer.close()
+        os.replace(partial, output_path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "path": output_path,
+        "width": out_w,
+        "height": out_h,
+        "tiles": len(xs) * len(ys),
+        "wall_seconds": round(time.monotonic() - started, 3)
+    }
@@ -0,0 +1,227 @@
+"""Local trace spans for job lifecycles, written as OTLP JSON files"""
+import atexit
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_DIR = "fal-traces"
+SERVICE_NAME = "fal-skill"
+FLUSH_EVERY = 256  # Finished spans buffered before a long run (worker, batch) writes them out
+
+KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current: contextvars.ContextVar = contextvars.ContextVar("fal_span", default=None)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    if not isinstance(value, str):
+        value = json.dumps(value, default=str)
+    return {"key": key, "value": {"stringValue": value}}
+
+
+def _attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [_attribute(k, v) for k, v in values.items() if v is not None]
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace_id, parent span_id) from a W3C traceparent header, or (None, None)"""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+
+class Span:
+    """One timed operation; attributes and events are added while it runs"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start", "end",
+                 "attributes", "events", "error")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def event(self, name: str, **attributes: Any):
+        self.events.append({"timeUnixNano": str(time.time_ns()), "name": name,
+                            "attributes": _attributes(attributes)})
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end or time.time_ns()),
+            "attributes": _attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error is not None else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.events:
+            span["events"] = self.events
+        return span
+
+
+class _NoSpan:
+    """Stand-in yielded when tracing is off, so call sites never check"""
+
+    traceparent = None
+
+    def set(self, **attributes: Any):
+        pass
+
+    def event(self, name: str, **attributes: Any):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """
+    Collect spans of this process and append them to
+    <directory>/<trace_id>-<pid>.jsonl, one OTLP/JSON ExportTraceServiceRequest
+    per line (the format of the OpenTelemetry Collector's otlpjsonfile
+    receiver and file exporter).
+
+    The first span opened with no parent is the process root; spans started
+    on threads that carry no trace context (pools, workers) become its
+    children, so one invocation is one tree. A traceparent (W3C) makes the
+    root a child of a span in another process, joining multi-step workflows
+    into a single trace.
+    """
+
+    def __init__(self, directory: str, traceparent: Optional[str] = None):
+        self.directory = directory
+        trace_id, parent_id = parse_traceparent(traceparent)
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.remote_parent = parent_id
+        self.root: Optional[Span] = None
+        self.path = os.path.join(directory, f"{self.trace_id}-{os.getpid()}.jsonl")
+        self._finished: List[Span] = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def start(self, name: str, kind: str, attributes: Dict[str, Any]) -> Span:
+        parent = _current.get() or self.root
+        span = Span(name, kind, self.trace_id, parent.span_id if parent else self.remote_parent, attributes)
+        if parent is None:
+            with self._lock:
+                if self.root is None:
+                    self.root = span
+        return span
+
+    def end(self, span: Span):
+        span.end = time.time_ns()
+        with self._lock:
+            self._finished.append(span)
+            is_root = span is self.root
+            if is_root:
+                self.root = None
+            full = len(self._finished) >= FLUSH_EVERY
+        if is_root or full:
+            self.flush()
+        if is_root:
+            print(f"Trace: {span.traceparent} -> {self.path}", file=sys.stderr)
+
+    def flush(self):
+        with self._lock:
+            spans, self._finished = self._finished, []
+        if not spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _attributes({
+                "service.name": SERVICE_NAME,
+                "process.pid": os.getpid(),
+                "process.command_args": list(sys.argv),
+            })},
+            "scopeSpans": [{"scope": {"name": "fal-skill.scripts"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, separators=(",", ":")) + "\n")
+
+
+_tracer: Optional[Tracer] = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def tracer() -> Optional[Tracer]:
+    """The process tracer when FAL_TRACE is set (1 or an output directory), else None"""
+    global _tracer, _configured
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                setting = os.environ.get("FAL_TRACE", "")
+                if setting and setting != "0":
+                    directory = DEFAULT_DIR if setting in ("1", "true", "yes") else setting
+                    _tracer = Tracer(directory, os.environ.get("FAL_TRACEPARENT"))
+                _configured = True
+    return _tracer
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Any]:
+    """
+    Time the enclosed block as a child of the current span (a no-op when
+    tracing is off). An exception escaping the block marks the span failed.
+    """
+    active = tracer()
+    if active is None:
+        yield NO_SPAN
+        return
+
+    current = active.start(name, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            current.error = f"exit status {e.code}"
+        raise
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        active.end(current)
+
+
+def current_span() -> Any:
+    """The innermost open span on this thread, or a no-op span"""
+    active = tracer()
+    if active is None:
+        return NO_SPAN
+    return _current.get() or active.root or NO_SPAN
@@ -1,6 +1,6 @@
 import os
-import tempfile
-from typing import Optional
+import re
+from typing import List, Optional
 
 
 DEFAULT_CONFIG_PATH = os.path.expanduser("~/.config/fal-skill/.env")
@@ -30,8 +30,55 @@ def load_api_key(
     raise ValueError("FAL_KEY not found in config file")
 
 
+def _numbered_keys(items, env_var: str) -> List[str]:
+    """Values of env_var and env_var_<n> entries, unnumbered first then by n"""
+    pattern = re.compile(rf"^{re.escape(env_var)}(?:_(\d+))?$")
+    found = []
+    for name, value in items:
+        match = pattern.match(name)
+        if match and value:
+            found.append((int(match.group(1) or -1), value))
+    return [value for _, value in sorted(found, key=lambda item: item[0])]
+
+
+def load_api_keys(
+    api_keys: Optional[List[str]] = None,
+    env_var: str = "FAL_KEY",
+    config_path: str = DEFAULT_CONFIG_PATH,
+) -> List[str]:
+    """
+    Load a pool of API keys from argument, env, or config file.
+
+    Accepts FAL_KEY plus numbered FAL_KEY_1, FAL_KEY_2, ... entries; the
+    first source that defines any key wins. Duplicates are dropped.
+    """
+    if api_keys:
+        return list(dict.fromkeys(k for k in api_keys if k))
+
+    keys = _numbered_keys(os.environ.items(), env_var)
+    if keys:
+        return list(dict.fromkeys(keys))
+
+    if not os.path.exists(config_path):
+        raise ValueError("API key not found. Run /fal-setup first.")
+
+    entries = []
+    with open(config_path, "r", encoding="utf-8") as f:
+        for line in f:
+            name, sep, value = line.strip().partition("=")
+            if sep:
+                entries.append((name.strip(), value.strip()))
+
+    keys = _numbered_keys(entries, env_var)
+    if not keys:
+        raise ValueError("FAL_KEY not found in config file")
+    return list(dict.fromkeys(keys))
+
+
 def atomic_write(path: str, data: str, mode: str = "w", encoding: str = "utf-8") -> None:
     """Atomically write text data to a file."""
+    import tempfile
+
     directory = os.path.dirname(path) or "."
     os.makedirs(directory, exist_ok=True)
 
@@ -0,0 +1,181 @@
+"""
+Local input validation compiled from the params specs in references/models.yaml.
+
+Specs list only the params worth documenting, so keys they don't mention
+are passed through; documented params are checked for presence, type and
+choices.
+"""
+import ast
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from .logging_config import setup_logging
+from .utils import atomic_write
+
+logger = setup_logging(__name__)
+
+MODELS_YAML = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           "references", "models.yaml")
+CACHE_PATH = os.path.expanduser("~/.config/fal-skill/cache/validators.json")
+CACHE_FORMAT = 3
+
+# "int (optional, default: 28)", "array of strings (required)", "string (required, choices: ['a', 'b'])"
+SPEC = re.compile(r"^\s*(?P<type>[A-Za-z ]+?)\s*\((?P<presence>required|optional)(?P<rest>.*)\)\s*$")
+
+TYPE_ALIASES = {
+    "str": "string", "text": "string", "integer": "int", "number": "float",
+    "boolean": "bool", "list": "array", "dict": "object",
+}
+
+TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "int": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "float": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "bool": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+}
+
+
+class InputValidationError(ValueError):
+    """Input rejected locally before anything was uploaded or submitted"""
+
+    def __init__(self, endpoint_id: str, problems: List[str]):
+        self.endpoint_id = endpoint_id
+        self.problems = problems
+        super().__init__(
+            f"Invalid input for {endpoint_id}: {'; '.join(problems)} (use --no-validate to send anyway)"
+        )
+
+
+def parse_param_spec(spec: Any) -> Dict[str, Any]:
+    """Compile one models.yaml param spec string into {type, items, required, choices}"""
+    match = SPEC.match(str(spec))
+    if not match:
+        # Unparseable specs still declare the key; accept any value
+        return {"type": None, "items": None, "required": False, "choices": None}
+
+    words = match.group("type").lower().split()
+    type_name = TYPE_ALIASES.get(words[0], words[0])
+    items = None
+    if type_name == "array" and len(words) >= 3 and words[1] == "of":
+        items = TYPE_ALIASES.get(words[2].rstrip("s"), words[2].rstrip("s"))
+
+    choices = None
+    choice_match = re.search(r"choices:\s*(\[.*?\])", match.group("rest"))
+    if choice_match:
+        try:
+            choices = list(ast.literal_eval(choice_match.group(1)))
+        except (ValueError, SyntaxError):
+            choices = None
+
+    return {
+        "type": type_name if type_name in TYPE_CHECKS else None,
+        "items": items if items in TYPE_CHECKS else None,
+        "required": match.group("presence") == "required",
+        "choices": choices,
+    }
+
+
+def compile_validators(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """{endpoint_id: {param: compiled spec}} for every model with a non-empty params spec"""
+    validators = {}
+    for models in (data.get("categories") or {}).values():
+        for model in models or []:
+            params = model.get("params") or {}
+            if model.get("endpoint_id") and params:
+                validators[model["endpoint_id"]] = {name: parse_param_spec(spec) for name, spec in params.items()}
+    return validators
+
+
+_validators: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def load_validators(models_path: str = MODELS_YAML, cache_path: str = CACHE_PATH) -> Dict[str, Dict[str, Any]]:
+    """
+    Compiled validators, from a JSON cache keyed on models.yaml's mtime and size.
+
+    YAML is only parsed when models.yaml changed since the cache was written.
+    """
+    global _validators
+    if _validators is not None and models_path == MODELS_YAML:
+        return _validators
+
+    try:
+        stat = os.stat(models_path)
+    except OSError:
+        logger.warning(f"models.yaml not found at {models_path}; skipping input validation")
+        return {}
+    stamp = [stat.st_mtime, stat.st_size]
+
+    validators = None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("format") == CACHE_FORMAT and cached.get("source") == models_path \
+                and cached.get("stamp") == stamp:
+            validators = cached["validators"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if validators is None:
+        import yaml
+
+        with open(models_path, "r", encoding="utf-8") as f:
+            validators = compile_validators(yaml.safe_load(f) or {})
+        try:
+            atomic_write(cache_path, json.dumps({"format": CACHE_FORMAT, "source": models_path, "stamp": stamp,
+                                          "validators": validators}))
+        except OSError as e:
+            logger.debug(f"Could not write validator cache: {e}")
+
+    if models_path == MODELS_YAML:
+        _validators = validators
+    return validators
+
+
+def check_input(
+    params: Dict[str, Dict[str, Any]],
+    input_data: Dict[str, Any],
+    skip_value: Optional[Callable[[Any], bool]] = None
+) -> List[str]:
+    """Problems with input_data against one endpoint's compiled params (empty when valid)"""
+    problems = []
+    for name, spec in params.items():
+        if spec["required"] and input_data.get(name) is None:
+            problems.append(f"missing required '{name}'")
+
+    for name, value in input_data.items():
+        spec = params.get(name)
+        if spec is None or value is None or (skip_value and skip_value(value)):
+            continue
+
+        type_name = spec["type"]
+        if type_name and not TYPE_CHECKS[type_name](value):
+            problems.append(f"'{name}' must be {type_name}, got {type(value).__name__}")
+            continue
+        if type_name == "array" and spec["items"]:
+            check = TYPE_CHECKS[spec["items"]]
+            if not all(check(item) or (skip_value and skip_value(item)) for item in value):
+                problems.append(f"'{name}' must be an array of {spec['items']}")
+        if spec["choices"] is not None and value not in spec["choices"]:
+            problems.append(f"'{name}' must be one of {spec['choices']}, got {value!r}")
+    return problems
+
+
+def validate_input(
+    endpoint_id: str,
+    input_data: Dict[str, Any],
+    skip_value: Optional[Callable[[Any], bool]] = None
+):
+    """Raise InputValidationError if input_data breaks the endpoint's documented params"""
+    if not isinstance(input_data, dict):
+        raise InputValidationError(endpoint_id, ["input must be a JSON object"])
+    params = load_validators().get(endpoint_id)
+    if not params:
+        return
+    problems = check_input(params, input_data, skip_value)
+    if problems:
+        raise InputValidationError(endpoint_id, problems)
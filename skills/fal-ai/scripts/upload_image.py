@@ -7,7 +7,7 @@ Uses fal_client built-in upload functionality
 import sys
 import os
 from pathlib import Path
-from lib.utils import load_api_key
+from lib.api_client import FalAPIClient
 
 
 def upload_image(file_path: str) -> str:
@@ -40,20 +40,16 @@ def upload_image(file_path: str) -> str:
     if file_ext not in valid_extensions:
         raise ValueError(f"Invalid file format. Supported: {', '.join(valid_extensions)}")
 
-    # Load API key and set environment variable for fal_client
-    api_key = load_api_key()
-    os.environ['FAL_KEY'] = api_key
-
-    # Use fal_client's built-in upload
-    import fal_client
-    url = fal_client.upload_file(file_path)
+    # Upload with a client-scoped fal_client (no process-wide FAL_KEY)
+    client = FalAPIClient()
+    url = client.upload_file(file_path)
 
     return url
 
 
-if __name__ == "__main__":
+def main():
     if len(sys.argv) < 2:
-        print("Usage: python3 upload_image.py <file-path>", file=sys.stderr)
+        print("Usage: python3 upload_image.py <file-path> [--profile[=DIR]]", file=sys.stderr)
         sys.exit(1)
 
     try:
@@ -62,3 +58,8 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+
+
+if __name__ == "__main__":
+    from lib.profiling import run_profiled
+    run_profiled(main)